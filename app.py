@@ -1,40 +1,175 @@
-from flask import Flask, request, render_template, jsonify, session
+from flask import Flask, request, render_template, jsonify, session, Response, stream_with_context, g
 import os
+import time
 import uuid
 from dotenv import load_dotenv
-from langchain_community.chat_models import ChatOpenAI
-from langchain.agents import initialize_agent
-from langchain.agents.agent_types import AgentType
-from utils.slack_reporter import SlackReporter
-from rag_tool import build_rag_tool_from_drive
-from tools.practice_tool import create_practice_tool, PracticeSession, active_sessions
-from db.question_db import QuestionDatabase
+from utils.slack_outbox import SlackOutbox
+from rag_service import RAGService
+from tools.practice_tool import PracticeSession
+from tools.session_store import create_session_store
+from db.question_db import QuestionDatabase, normalize_user_id
+from db.analytics import AnalyticsQueries
+from utils.streaming import sse_event, stream_from_thread
+from utils import metrics
+from utils.llm_cache import get_llm_cache
 
 load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", os.urandom(24).hex())
 FOLDER_ID = os.getenv("GOOGLE_DRIVE_FOLDER_ID")
 
-llm = ChatOpenAI(
-    model_name="llama3-70b-8192",
-    temperature=0.7
-)
+# Practice sessions, shared between worker processes with the SQLite store
+session_store = create_session_store()
+
+# Session reports waiting to be posted to Slack, delivered by a background thread
+slack_outbox = SlackOutbox()
+
+# The index, LLM and agent are built in the background on first request
+service = RAGService(FOLDER_ID, session_store=session_store)
+
+@app.before_request
+def start_service():
+    service.start()
+    slack_outbox.start()
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.profile = metrics.start_profile()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    start, profile, method = g.request_start, g.profile, request.method
+
+    # Runs once the body is sent, so streamed responses are timed to the end
+    def finish():
+        metrics.observe_request(method, route, response.status_code, time.perf_counter() - start)
+        if profile:
+            metrics.stop_profile(profile, route)
 
-# Get both the RAG tool and the vectorstore
-rag_tool, vectorstore = build_rag_tool_from_drive(FOLDER_ID, return_vectorstore=True)
-practice_tool = create_practice_tool(llm)
-tools = [rag_tool, practice_tool]
-agent = initialize_agent(
-    tools,
-    llm,
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True
+    response.call_on_close(finish)
+    return response
+
+def cache_lookups():
+    lookups = {}
+    answers = service.answer_cache.stats()
+    lookups[("answer", "hit")] = answers["exact_hits"] + answers["semantic_hits"]
+    lookups[("answer", "miss")] = answers["misses"]
+    caches = [("llm", get_llm_cache()), ("embedding", getattr(service.answer_cache.embeddings, "cache", None))]
+    for name, cache in caches:
+        if cache is not None:
+            stats = cache.stats()
+            lookups[(name, "hit")] = stats["hits"]
+            lookups[(name, "miss")] = stats["misses"]
+    return lookups
+
+def cache_hit_rates():
+    rates = {}
+    for (name, result), count in cache_lookups().items():
+        hits, total = rates.get(name, (0, 0))
+        rates[name] = (hits + (count if result == "hit" else 0), total + count)
+    return {name: hits / total for name, (hits, total) in rates.items() if total}
+
+metrics.REGISTRY.gauge(
+    "learningbuddy_active_sessions", "Practice sessions in the session store",
+    lambda: session_store.stats().get("sessions")
 )
+metrics.REGISTRY.gauge(
+    "learningbuddy_cache_lookups_total", "Cache lookups by cache and result", cache_lookups,
+    ("cache", "result"), kind="counter"
+)
+metrics.REGISTRY.gauge("learningbuddy_cache_hit_rate", "Hit rate per cache", cache_hit_rates, ("cache",))
+metrics.REGISTRY.gauge("learningbuddy_index_ready", "1 once the document index is loaded", lambda: int(service.is_ready))
+metrics.REGISTRY.gauge(
+    "learningbuddy_slack_outbox_reports", "Slack reports by delivery status",
+    lambda: {status: slack_outbox.stats()[status] for status in ("pending", "sent", "failed")}, ("status",)
+)
+
+def not_ready_payload():
+    """Body and status code for requests that need the index before it is ready (shared with asgi.py)"""
+    if service.status == "error":
+        message = f"The document index could not be built: {service.error}"
+    else:
+        message = "Learning Buddy is still indexing your documents. Please try again in a moment."
+    return {
+        "status": "warming_up" if service.status != "error" else "error",
+        "error": message,
+        "health": service.health()
+    }, 503
+
+def not_ready_response():
+    payload, status = not_ready_payload()
+    return jsonify(payload), status
+
+# Practice requests may ask for num_questions questions, up to this many
+QUIZ_MAX_QUESTIONS = int(os.getenv("QUIZ_MAX_QUESTIONS", "20"))
+
+def requested_question_count(data):
+    try:
+        return max(1, min(int(data.get("num_questions", 5)), QUIZ_MAX_QUESTIONS))
+    except (TypeError, ValueError):
+        return 5
+
+NO_QUESTIONS_MESSAGE = "I couldn't generate practice questions on this topic from the available documents. Please try a different topic."
+
+def create_practice_session(user_message, user_id=None):
+    topic = user_message.replace("Generate practice:", "").strip()
+    user_id = normalize_user_id(user_id)
+    session = PracticeSession(
+        session_id=str(uuid.uuid4()),
+        topic=topic,
+        retriever=service.retriever(k=5),
+        llm=service.quiz_llm,
+        user_id=user_id,
+        dedup=service.question_dedup
+    )
+    session.db.add_session(session.session_id, user_id, topic)
+    return session
+
+def session_created_message(session, question_text):
+    return f"Practice session created! To answer, include 'session:{session.session_id} answer:X' in your response.\n\n{question_text}"
+
+def answer_practice_question(user_message):
+    """Check the answer in a 'session:<id> answer:X' message; returns the response body"""
+    session_id = user_message.split("session:")[1].split()[0]
+    answer = user_message.split("answer:")[1][0]
+
+    session = session_store.get(session_id)
+    if session is None:
+        return {"error": "Session expired or not found"}
+    response = session.check_answer(answer)
+    session_store.update_progress(session)
+    return {"response": response}
+
+def start_practice_session(user_message, user_id=None, num_questions=5):
+    """Create and store a practice session, serving questions from the bank first; returns the response body"""
+    session = create_practice_session(user_message, user_id)
+    if service.question_bank.fill_session(session, num_questions) == 0:
+        return {"response": NO_QUESTIONS_MESSAGE}
+    session_store.add(session)
+    response = session_created_message(session, session.get_current_question())
+    return {"response": response, "session_id": session.session_id}
 
 @app.route("/")
 def index():
     return render_template("index.html")
 
+@app.route("/health", methods=["GET"])
+def health():
+    info = service.health()
+    info["slack_outbox"] = slack_outbox.stats()
+    return jsonify(info)
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    info = service.health()
+    return jsonify(info), 200 if info["ready"] else 503
+
 @app.route("/chat", methods=["POST"])
 def chat():
     data = request.json
@@ -48,62 +183,132 @@ def chat():
         if mode == "practice":
             # Check if answering a question
             if "session:" in user_message.lower():
-                # Extract session ID and answer
-                session_id = user_message.split("session:")[1].split()[0]
-                answer = user_message.split("answer:")[1][0]
-                
-                if session_id in active_sessions:
-                    response = active_sessions[session_id].check_answer(answer)
-                    return jsonify({"response": response})
-                else:
-                    return jsonify({"error": "Session expired or not found"})
-                    
+                return jsonify(answer_practice_question(user_message))
+
             # Starting a new practice session
             else:
-                topic = user_message.replace("Generate practice:", "").strip()
-                session_id = str(uuid.uuid4())
-                
-                # Create a new practice session
-                session = PracticeSession(
-                    session_id=session_id,
-                    topic=topic,
-                    retriever=vectorstore.as_retriever(search_kwargs={"k": 5}),
-                    llm=llm
-                )
-                
-                # Generate questions
-                num_questions = session.generate_questions(5)
-                if num_questions == 0:
-                    return jsonify({
-                        "response": "I couldn't generate practice questions on this topic from the available documents. Please try a different topic."
-                    })
-                    
-                # Store session
-                active_sessions[session_id] = session
-                
-                # Return first question
-                first_question = session.get_current_question()
-                response = f"Practice session created! To answer, include 'session:{session_id} answer:X' in your response.\n\n{first_question}"
-                
-                return jsonify({"response": response, "session_id": session_id})
+                if not service.is_ready:
+                    return not_ready_response()
+                return jsonify(start_practice_session(user_message, data.get("user_id"), requested_question_count(data)))
         else:
             # Normal question answering
-            response = agent.run(user_message)
-            return jsonify({"response": response})
+            if not service.is_ready:
+                return not_ready_response()
+            response, timing = service.ask(user_message)
+            return jsonify({"response": response, "timing": timing})
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Server-Sent Events version of /chat for asking questions and starting practice sessions.
+
+    Ask mode emits "token" events as the LLM produces them; practice mode
+    emits "session" once the first question is ready and a "question" event
+    per parsed question. Both finish with a "done" event.
+    """
+    data = request.json
+    user_message = data.get("message")
+    mode = data.get("mode", "ask")
+
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+    if not service.is_ready:
+        return not_ready_response()
+
+    start = time.perf_counter()
+    first_event = {}
+
+    def emit_timed(emit, event, payload):
+        if "ttft_ms" not in first_event:
+            first_event["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        emit(event, payload)
+
+    if mode == "practice":
+        session = create_practice_session(user_message, data.get("user_id"))
+        num_requested = requested_question_count(data)
+
+        def produce(emit):
+            def on_question(index):
+                text = session.format_question(index, num_requested)
+                if index == 0:
+                    # The student can start answering while the rest are generated
+                    session_store.add(session)
+                    emit_timed(emit, "session", {"session_id": session.session_id})
+                    text = session_created_message(session, text)
+                else:
+                    session_store.update_questions(session)
+                emit_timed(emit, "question", {"index": index, "text": text})
+
+            num_questions = service.question_bank.fill_session(session, num_requested, on_question=on_question)
+            if num_questions:
+                # Picks up the database ids assigned once the batch was saved
+                session_store.update_questions(session)
+            if num_questions == 0:
+                emit("done", {"response": NO_QUESTIONS_MESSAGE, "ttft_ms": first_event.get("ttft_ms")})
+            else:
+                emit("done", {
+                    "session_id": session.session_id,
+                    "total": num_questions,
+                    "ttft_ms": first_event.get("ttft_ms")
+                })
+    else:
+        def produce(emit):
+            response, timing = service.ask(user_message, on_token=lambda token: emit_timed(emit, "token", token))
+            timing["ttft_ms"] = first_event.get("ttft_ms")
+            emit("done", {"response": response, "timing": timing})
+
+    def generate():
+        for event, payload in stream_from_thread(produce):
+            yield sse_event(event, payload)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route("/recommendations", methods=["GET"])
 def get_recommendations():
-    # Create a database connection
-    db = QuestionDatabase()
+    user_id = request.args.get("user_id")
     
-    # Get topic performance data
-    topic_data = db.get_topic_performance()
+    try:
+        if user_id:
+            # One learner's topics, optionally limited to a date range
+            topic_data = AnalyticsQueries().topic_performance(
+                user_id, since=request.args.get("since"), until=request.args.get("until")
+            )
+        else:
+            topic_data = QuestionDatabase().get_topic_performance()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     # Return the data
     return jsonify({"topics": topic_data})
+
+@app.route("/analytics", methods=["GET"])
+def analytics():
+    """
+    Answer rollups, e.g. /analytics?group_by=day&user_id=alice&since=2024-05-01
+    group_by is one of topic, user, day, user_topic or day_topic; results are
+    paginated with limit and offset (see next_offset in the response).
+    """
+    args = request.args
+    try:
+        result = AnalyticsQueries().rollup(
+            group_by=args.get("group_by", "topic"),
+            user_id=args.get("user_id"),
+            topic=args.get("topic"),
+            since=args.get("since"),
+            until=args.get("until"),
+            limit=args.get("limit", 100),
+            offset=args.get("offset", 0)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
         
 @app.route("/send_report", methods=["POST"])
 def send_report():
@@ -112,26 +317,41 @@ def send_report():
     channel = data.get("channel")
     user_name = data.get("user_name", "Anonymous")
     
-    if not session_id or session_id not in active_sessions:
+    session = session_store.get(session_id) if session_id else None
+    if session is None:
         return jsonify({"error": "Invalid or expired session ID"}), 400
         
     # Get session data
-    session = active_sessions[session_id]
     report_data = session.get_session_report()
     
     # Add user name if provided
     if user_name:
         report_data["user_name"] = user_name
     
-    # Create Slack reporter and send report
-    slack = SlackReporter()
-    result = slack.send_report(report_data, channel)
+    if not slack_outbox.reporter.is_configured():
+        return jsonify({
+            "success": False,
+            "message": "Slack credentials not configured. Please add SLACK_WEBHOOK_URL or SLACK_BOT_TOKEN to .env file",
+            "report_data": report_data
+        })
+    
+    # Delivered by the outbox's background thread, with retries
+    report_id = slack_outbox.enqueue(report_data, channel)
     
     return jsonify({
-        "success": "error" not in result,
-        "message": "Report sent successfully" if "error" not in result else result.get("error"),
+        "success": True,
+        "queued": True,
+        "report_id": report_id,
+        "message": "Report queued for Slack",
         "report_data": report_data
     })
+
+@app.route("/send_report/<int:report_id>", methods=["GET"])
+def report_status(report_id):
+    status = slack_outbox.get(report_id)
+    if status is None:
+        return jsonify({"error": "Unknown report ID"}), 404
+    return jsonify(status)
     
     
 if __name__ == "__main__":
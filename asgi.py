@@ -0,0 +1,187 @@
+"""
+Async serving mode for Learning Buddy.
+
+    uvicorn asgi:app --workers 2
+
+/chat and /chat/stream are handled by async views that await the LLM and
+retrieval calls, so one worker can hold many slow LLM requests at once
+(bounded by ASYNC_MAX_CONCURRENCY). Every other route is served by the
+regular Flask app.
+"""
+import asyncio
+import contextlib
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+import app as web
+from utils import metrics
+from utils.streaming import sse_event
+
+ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "32"))
+ASYNC_THREAD_WORKERS = int(os.getenv("ASYNC_THREAD_WORKERS", "16"))
+
+# Limits in-flight LLM work per worker; extra requests wait for a slot
+llm_slots = None
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global llm_slots
+    llm_slots = asyncio.Semaphore(ASYNC_MAX_CONCURRENCY)
+    # Blocking pieces (SQLite, question parsing, embeddings) run on this pool
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_THREAD_WORKERS))
+    web.service.start()
+    web.slack_outbox.start()
+    yield
+
+
+async def run_sync(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+def not_ready_response():
+    payload, status = web.not_ready_payload()
+    return JSONResponse(payload, status_code=status)
+
+
+def timed(handler):
+    """Record the async routes in the request histogram; the Flask routes record themselves"""
+    @functools.wraps(handler)
+    async def wrapper(request):
+        start = time.perf_counter()
+        response = await handler(request)
+        # Streamed responses are timed until the stream starts
+        metrics.observe_request(request.method, request.url.path, response.status_code, time.perf_counter() - start)
+        return response
+    return wrapper
+
+
+@timed
+async def chat(request: Request):
+    data = await request.json()
+    user_message = data.get("message")
+    mode = data.get("mode", "ask")
+
+    if not user_message:
+        return JSONResponse({"error": "No message provided"}, status_code=400)
+
+    try:
+        if mode == "practice" and "session:" in user_message.lower():
+            return JSONResponse(await run_sync(web.answer_practice_question, user_message))
+
+        if not web.service.is_ready:
+            return not_ready_response()
+
+        async with llm_slots:
+            if mode == "practice":
+                # Question parsing and SQLite writes are synchronous
+                return JSONResponse(await run_sync(
+                    web.start_practice_session, user_message, data.get("user_id"), web.requested_question_count(data)
+                ))
+
+            response, timing = await web.service.aask(user_message)
+            return JSONResponse({"response": response, "timing": timing})
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@timed
+async def chat_stream(request: Request):
+    data = await request.json()
+    user_message = data.get("message")
+    mode = data.get("mode", "ask")
+
+    if not user_message:
+        return JSONResponse({"error": "No message provided"}, status_code=400)
+    if not web.service.is_ready:
+        return not_ready_response()
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    start = time.perf_counter()
+    first_event = {}
+
+    def emit(event, payload):
+        if "ttft_ms" not in first_event and event != "done":
+            first_event["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        events.put_nowait((event, payload))
+
+    def emit_threadsafe(event, payload):
+        loop.call_soon_threadsafe(emit, event, payload)
+
+    def generate_practice():
+        session = web.create_practice_session(user_message, data.get("user_id"))
+        num_requested = web.requested_question_count(data)
+
+        def on_question(index):
+            text = session.format_question(index, num_requested)
+            if index == 0:
+                web.session_store.add(session)
+                emit_threadsafe("session", {"session_id": session.session_id})
+                text = web.session_created_message(session, text)
+            else:
+                web.session_store.update_questions(session)
+            emit_threadsafe("question", {"index": index, "text": text})
+
+        num_questions = web.service.question_bank.fill_session(session, num_requested, on_question=on_question)
+        if num_questions:
+            web.session_store.update_questions(session)
+        return session, num_questions
+
+    async def produce():
+        try:
+            async with llm_slots:
+                if mode == "practice":
+                    session, num_questions = await run_sync(generate_practice)
+                    if num_questions == 0:
+                        emit("done", {"response": web.NO_QUESTIONS_MESSAGE, "ttft_ms": first_event.get("ttft_ms")})
+                    else:
+                        emit("done", {
+                            "session_id": session.session_id,
+                            "total": num_questions,
+                            "ttft_ms": first_event.get("ttft_ms")
+                        })
+                else:
+                    response, timing = await web.service.aask(
+                        user_message, on_token=lambda token: emit("token", token)
+                    )
+                    timing["ttft_ms"] = first_event.get("ttft_ms")
+                    emit("done", {"response": response, "timing": timing})
+        except Exception as e:
+            emit("error", {"error": str(e)})
+        finally:
+            events.put_nowait(None)
+
+    async def generate():
+        task = asyncio.ensure_future(produce())
+        try:
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                yield sse_event(*item)
+        finally:
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+app = Starlette(
+    routes=[
+        Route("/chat", chat, methods=["POST"]),
+        Route("/chat/stream", chat_stream, methods=["POST"]),
+        Mount("/", app=WsgiToAsgi(web.app))
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,100 @@
+"""
+Latency of the /analytics rollups over a large multi-learner answer history.
+
+Fills a temporary database with --answers answers from --users learners
+spread over --days days, rebuilds answer_rollups the same way the schema
+migration does, then times typical queries.
+
+    python benchmarks/analytics_benchmark.py --answers 2000000 --users 5000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.analytics import AnalyticsQueries
+from db.question_db import QuestionDatabase, close_connection
+
+
+def populate(db, num_answers, num_users, num_days, num_topics, num_questions):
+    rng = random.Random(7)
+    today = datetime.date.today()
+    db.cursor.executemany(
+        "INSERT INTO questions (session_id, question_text, options, correct_answer, topic) VALUES (?, ?, ?, ?, ?)",
+        ((f"s{i // 5}", f"Question {i}", '["A", "B", "C", "D"]', "A", f"topic-{i % num_topics}") for i in range(num_questions))
+    )
+
+    def answers():
+        for _ in range(num_answers):
+            day = today - datetime.timedelta(days=rng.randrange(num_days))
+            yield (rng.randint(1, num_questions), "A", rng.random() < 0.6,
+                   f"user-{rng.randrange(num_users)}", f"{day.isoformat()} 12:00:00")
+
+    db.cursor.executemany(
+        "INSERT INTO user_answers (question_id, user_answer, is_correct, user_id, answered_at) VALUES (?, ?, ?, ?, ?)",
+        answers()
+    )
+    db._migrate_learner_rollups()
+    db.conn.commit()
+    db.cursor.execute("ANALYZE")
+
+
+def time_query(label, func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{label:<44} p50 {timings[len(timings) // 2] * 1000:7.2f} ms   "
+          f"max {timings[-1] * 1000:7.2f} ms   {len(result['rows'])} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--answers", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--topics", type=int, default=40)
+    parser.add_argument("--questions", type=int, default=50_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "question_data.db")
+        db = QuestionDatabase(path)
+        start = time.perf_counter()
+        populate(db, args.answers, args.users, args.days, args.topics, args.questions)
+        rollup_rows = db.cursor.execute("SELECT COUNT(*) FROM answer_rollups").fetchone()[0]
+        print(f"{args.answers:,} answers -> {rollup_rows:,} rollup rows in {time.perf_counter() - start:.1f}s\n")
+
+        analytics = AnalyticsQueries(path)
+        week_ago = (datetime.date.today() - datetime.timedelta(days=7)).isoformat()
+        month_ago = (datetime.date.today() - datetime.timedelta(days=30)).isoformat()
+        rng = random.Random(1)
+        user = lambda: f"user-{rng.randrange(args.users)}"
+
+        time_query("learner, per topic, all time", lambda: analytics.rollup("topic", user_id=user()), args.repeats)
+        time_query("learner, per topic, last 7 days",
+                   lambda: analytics.rollup("topic", user_id=user(), since=week_ago), args.repeats)
+        time_query("learner, per day, last 30 days",
+                   lambda: analytics.rollup("day", user_id=user(), since=month_ago), args.repeats)
+        time_query("topic, per day, last 30 days",
+                   lambda: analytics.rollup("day", topic="topic-3", since=month_ago), args.repeats)
+        time_query("topic, per learner, last 7 days (page 1)",
+                   lambda: analytics.rollup("user", topic="topic-3", since=week_ago, limit=50), args.repeats)
+        time_query("all learners, per day, last 7 days",
+                   lambda: analytics.rollup("day", since=week_ago), args.repeats)
+        time_query("all learners, per topic, all time",
+                   lambda: analytics.rollup("topic"), max(3, args.repeats // 5))
+        db.close()
+        close_connection(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Answers-per-second under parallel writers for QuestionDatabase.
+
+Compares the pooled WAL-mode QuestionDatabase with the previous behaviour
+(a new rollback-journal connection and schema check per session, commit per
+write), and times a 5-question insert as individual commits vs add_questions.
+
+    python benchmarks/db_benchmark.py --threads 1 4 8 --answers 2000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.models import Question
+from db.question_db import QuestionDatabase
+
+QUESTION = {
+    "question": "What does WAL stand for?",
+    "options": ["Write-ahead log", "Wide area link", "Write all lines", "Weighted average loss"],
+    "correct_answer": "Write-ahead log",
+    "topic": "databases",
+    "explanation": "SQLite's write-ahead logging journal mode."
+}
+
+
+class LegacyDatabase(QuestionDatabase):
+    """The pre-pooling access pattern: own connection, default journal, commit per call"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._cursor = self._conn.cursor()
+        self.create_tables()
+
+    conn = property(lambda self: self._conn)
+    cursor = property(lambda self: self._cursor)
+
+
+def run_writers(make_db, num_threads, answers_per_thread):
+    errors = []
+
+    def writer():
+        try:
+            db = make_db()
+            question_id = db.add_question("bench", QUESTION["question"], QUESTION["options"],
+                                          QUESTION["correct_answer"], QUESTION["topic"])
+            for i in range(answers_per_thread):
+                db.record_answer(question_id, "A", i % 2 == 0)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer) for _ in range(num_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return num_threads * answers_per_thread / elapsed, len(errors)
+
+
+def time_question_inserts(db, batches):
+    start = time.perf_counter()
+    for _ in range(batches):
+        for _ in range(5):
+            db.add_question("bench", QUESTION["question"], QUESTION["options"],
+                            QUESTION["correct_answer"], QUESTION["topic"], QUESTION["explanation"])
+    individual = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(batches):
+        db.add_questions("bench", [
+            Question.from_answer(QUESTION["question"], QUESTION["options"], QUESTION["correct_answer"],
+                                 QUESTION["explanation"], QUESTION["topic"])
+            for _ in range(5)
+        ])
+    batched = time.perf_counter() - start
+    return individual, batched
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--answers", type=int, default=2000, help="Total answers per run")
+    parser.add_argument("--batches", type=int, default=200, help="5-question generations to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'threads':>8} {'legacy ans/s':>13} {'pooled ans/s':>13}")
+        for num_threads in args.threads:
+            per_thread = max(1, args.answers // num_threads)
+            legacy_path = os.path.join(tmp, f"legacy_{num_threads}.db")
+            pooled_path = os.path.join(tmp, f"pooled_{num_threads}.db")
+            legacy_rate, legacy_errors = run_writers(lambda: LegacyDatabase(legacy_path), num_threads, per_thread)
+            pooled_rate, pooled_errors = run_writers(lambda: QuestionDatabase(pooled_path), num_threads, per_thread)
+            note = f"  ({legacy_errors} legacy / {pooled_errors} pooled errors)" if legacy_errors or pooled_errors else ""
+            print(f"{num_threads:>8} {legacy_rate:>13.0f} {pooled_rate:>13.0f}{note}")
+
+        individual, batched = time_question_inserts(QuestionDatabase(os.path.join(tmp, "batch.db")), args.batches)
+        print(f"\n5-question save: {individual / args.batches * 1000:.2f} ms as 5 commits, "
+              f"{batched / args.batches * 1000:.2f} ms with add_questions")
+
+
+if __name__ == "__main__":
+    main()
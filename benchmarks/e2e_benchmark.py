@@ -0,0 +1,398 @@
+"""
+Offline end-to-end benchmark of the Flask app.
+
+Runs app.py on a local port with the document folder, LLM and Slack
+swapped for offline stand-ins, then drives the HTTP endpoints the way
+the UI does:
+
+  ask              POST /chat in ask mode, questions about corpus terms
+  practice         POST /chat "Generate practice: <topic>"
+  answer           POST /chat "session:<id> answer:X" for each question
+  recommendations  GET /recommendations?user_id=...
+  send_report      POST /send_report for the practice sessions
+
+Documents come from a generated corpus (--docs files) or --corpus DIR,
+served through DRIVE_BACKEND=local. Embeddings are character trigram
+hashes (see retrieval_benchmark.py) and the LLM answers deterministically
+after --llm-ms, streaming its tokens; Slack is the stand-in from
+slack_outbox_benchmark.py. Everything lives in a temporary directory, so
+runs start cold and leave nothing behind.
+
+Reports index build time, throughput and p50/p99 latency per scenario and
+peak RSS. --json saves the results; --baseline compares against a saved
+run and exits 1 when throughput or p99 is more than --tolerance worse.
+
+    python benchmarks/e2e_benchmark.py
+    python benchmarks/e2e_benchmark.py --docs 200 --requests 200 --concurrency 16 --llm-ms 300
+    python benchmarks/e2e_benchmark.py --json baseline.json
+    python benchmarks/e2e_benchmark.py --baseline baseline.json --tolerance 0.2
+
+The LLM and semantic answer caches are off unless --caches is given, so
+repeated requests measure the full path rather than cache lookups.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from langchain_core.language_models.llms import LLM
+from retrieval_benchmark import COMMON, TOPICS, HashedNgramEmbeddings, make_name
+from slack_outbox_benchmark import StandInSlack
+
+SCENARIOS = ["ask", "practice", "answer", "recommendations", "send_report"]
+
+
+class SimulatedLLM(LLM):
+    """
+    Deterministic stand-in for the chat model: quizzes for quiz prompts,
+    a final answer for agent prompts and a short answer otherwise, after
+    llm_ms and streamed token by token.
+    """
+
+    llm_ms: float = 200
+    token_ms: float = 0
+
+    @property
+    def _llm_type(self):
+        return "simulated"
+
+    def _respond(self, prompt):
+        digest = hashlib.sha1(prompt.encode("utf-8")).digest()
+        rng = random.Random(digest)
+        match = re.search(r"create (\d+) multiple-choice", prompt)
+        if match:
+            questions = []
+            for i in range(int(match.group(1))):
+                # Distinct wording so the deduplicator keeps every question
+                words = " ".join(make_name(rng) for _ in range(3))
+                options = [make_name(rng) for _ in range(4)]
+                questions.append(
+                    f"QUESTION: Which term is linked to {words}?\n"
+                    + "".join(f"{letter}. {option}\n" for letter, option in zip("ABCD", options))
+                    + f"ANSWER: {rng.choice('ABCD')}\nEXPLANATION: See the passage on {words}.\n"
+                    f"TOPIC: {rng.choice(list(TOPICS))}\n"
+                )
+            return "\n".join(questions)
+        answer = " ".join(rng.choice(COMMON + TOPICS[rng.choice(list(TOPICS))]) for _ in range(40))
+        if "Final Answer" in prompt:
+            return f"Thought: I now know the final answer\nFinal Answer: {answer}"
+        return answer.capitalize() + "."
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.llm_ms / 1000)
+        text = self._respond(prompt)
+        if run_manager is not None:
+            for token in re.findall(r"\S+\s*", text):
+                if self.token_ms:
+                    time.sleep(self.token_ms / 1000)
+                run_manager.on_llm_new_token(token)
+        return text
+
+    async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.llm_ms / 1000)
+        text = self._respond(prompt)
+        if run_manager is not None:
+            for token in re.findall(r"\S+\s*", text):
+                if self.token_ms:
+                    await asyncio.sleep(self.token_ms / 1000)
+                await run_manager.on_llm_new_token(token)
+        return text
+
+
+def make_corpus(directory, num_docs, words_per_doc, rng):
+    """Text files of topic words and named terms; returns (term, topic) pairs to ask about"""
+    os.makedirs(directory, exist_ok=True)
+    terms = []
+    for i in range(num_docs):
+        topic = list(TOPICS)[i % len(TOPICS)]
+        words = []
+        while len(words) < words_per_doc:
+            term = make_name(rng)
+            terms.append((term, topic))
+            words.append(f"The {term} {rng.choice(['principle', 'effect', 'model'])} of {topic} states that")
+            words.extend(rng.choice(COMMON + TOPICS[topic]) for _ in range(rng.randint(15, 30)))
+            words[-1] += "."
+        with open(os.path.join(directory, f"{topic}-{i:04d}.txt"), "w") as f:
+            f.write(" ".join(words))
+    return terms
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process plus its (ingest worker) children, in MB"""
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    kb += resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return kb / 1024
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_scenario(calls, concurrency):
+    """Run the calls on concurrency threads; returns latencies (ms), errors and elapsed seconds"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def run(call):
+        nonlocal errors
+        if not hasattr(local, "http"):
+            local.http = requests.Session()
+        start = time.perf_counter()
+        try:
+            ok = call(local.http)
+        except requests.RequestException:
+            ok = False
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, calls))
+    return latencies, errors, time.perf_counter() - start
+
+
+def ok_json(response):
+    return response.status_code == 200 and "error" not in response.json()
+
+
+def summarize(latencies, errors, elapsed):
+    if not latencies:
+        return None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.5), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1)
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing regressions against a saved run"""
+    regressions = []
+    for name, result in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or not result:
+            continue
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput']} -> {result['throughput']} req/s")
+        if result["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {before['p99_ms']} -> {result['p99_ms']} ms")
+    if baseline.get("index_build_s") and results["index_build_s"] > baseline["index_build_s"] * (1 + tolerance):
+        regressions.append(f"index build {baseline['index_build_s']} -> {results['index_build_s']} s")
+    if baseline.get("peak_rss_mb") and results["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"peak RSS {baseline['peak_rss_mb']} -> {results['peak_rss_mb']} MB")
+    return regressions
+
+
+def configure_environment(tmp, docs_dir, slack_url, caches):
+    """Point every store at tmp; must run before app is imported, which reads these at import time"""
+    os.environ.pop("GOOGLE_DRIVE_FOLDER_ID", None)
+    os.environ.pop("SLACK_WEBHOOK_URL", None)
+    os.environ.update({
+        "DRIVE_BACKEND": "local",
+        "LOCAL_DOCS_DIR": docs_dir,
+        "RAG_INDEX_DIR": os.path.join(tmp, "faiss_index"),
+        "RAG_RERANKER": "none",
+        "EMBEDDING_CACHE_PATH": os.path.join(tmp, "embedding_cache.db"),
+        "SESSION_DB_PATH": os.path.join(tmp, "sessions.db"),
+        "SLACK_OUTBOX_PATH": os.path.join(tmp, "slack_outbox.db"),
+        "LLM_CACHE_PATH": os.path.join(tmp, "llm_cache.db"),
+        "SLACK_BOT_TOKEN": "xoxb-benchmark",
+        "SLACK_API_URL": slack_url,
+        "METRICS_PROFILE_SAMPLE": "0",
+    })
+    if not caches:
+        os.environ["LLM_CACHE"] = "none"
+        # Trigram embeddings rate unrelated questions as similar; only exact repeats would be safe hits
+        os.environ["ANSWER_CACHE_THRESHOLD"] = "1.01"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=50, help="Files in the generated corpus")
+    parser.add_argument("--doc-words", type=int, default=2000, help="Words per generated file")
+    parser.add_argument("--corpus", help="Directory of your own documents instead of the generated corpus")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-ms", type=float, default=200, help="Simulated LLM latency per call")
+    parser.add_argument("--token-ms", type=float, default=0, help="Simulated delay per streamed token")
+    parser.add_argument("--slack-ms", type=float, default=50, help="Stand-in Slack API latency")
+    parser.add_argument("--questions", type=int, default=5, help="Questions per practice session")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--caches", action="store_true", help="Keep the LLM and semantic answer caches on")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs --baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+    # Relative to where the benchmark was started, not the temporary directory it runs in
+    for name in ("corpus", "json", "baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    rng = random.Random(0)
+    slack = StandInSlack(latency=args.slack_ms / 1000)
+    tmp_dir = tempfile.TemporaryDirectory()
+    tmp = tmp_dir.name
+    # Sessions, answers and the question bank go to question_data.db in the working directory
+    os.chdir(tmp)
+
+    if args.corpus:
+        docs_dir = args.corpus
+        terms = [(word, word) for word in TOPICS]
+    else:
+        docs_dir = os.path.join(tmp, "corpus")
+        terms = make_corpus(docs_dir, args.docs, args.doc_words, rng)
+    configure_environment(tmp, docs_dir, slack.url, args.caches)
+
+    import rag_tool
+    import rag_service
+    from utils.embedding_cache import CachedEmbeddings, EmbeddingCache
+    from utils.llm_cache import get_llm_cache
+    from utils import metrics
+    from werkzeug.serving import make_server
+
+    rag_tool._embeddings = CachedEmbeddings(
+        HashedNgramEmbeddings(), EmbeddingCache(os.path.join(tmp, "embedding_cache.db")), model_name="hashed-ngram"
+    )
+    rag_service.make_chat_llm = lambda temperature=0.7, streaming=False, cache=True: SimulatedLLM(
+        llm_ms=args.llm_ms, token_ms=args.token_ms, cache=get_llm_cache() if cache else False,
+        callbacks=[metrics.llm_handler]
+    )
+
+    import app as web
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    # slack_reporter read SLACK_API_URL when slack_outbox_benchmark imported it
+    web.slack_outbox.reporter.api_url = slack.url
+    server = make_server("127.0.0.1", 0, web.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    start = time.perf_counter()
+    web.service.start()
+    if not web.service.wait_until_ready(timeout=3600) or web.service.status != "ready":
+        print(f"Index build failed: {web.service.error}")
+        sys.exit(1)
+    index_build = time.perf_counter() - start
+    chunks = web.service.vectorstore.index.ntotal
+
+    print(f"{len(os.listdir(docs_dir))} documents, {chunks} chunks, {args.llm_ms:.0f}ms per LLM call, "
+          f"concurrency {args.concurrency}, caches {'on' if args.caches else 'off'}")
+    print(f"index build {index_build:.2f}s, RSS after build {peak_rss_mb():.0f}MB")
+    print(f"{'scenario':<16} {'requests':>8} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+
+    users = [f"learner-{i}" for i in range(max(1, args.requests // 10))]
+    sessions = []  # (session id, user)
+    sessions_lock = threading.Lock()
+
+    def ask(term, topic):
+        def call(http):
+            message = f"What does the {term} principle of {topic} say?"
+            return ok_json(http.post(f"{url}/chat", json={"message": message, "mode": "ask"}))
+        return call
+
+    def practice(topic, user):
+        def call(http):
+            response = http.post(f"{url}/chat", json={
+                "message": f"Generate practice: {topic}", "mode": "practice",
+                "user_id": user, "num_questions": args.questions
+            })
+            if not ok_json(response) or "session_id" not in response.json():
+                return False
+            with sessions_lock:
+                sessions.append((response.json()["session_id"], user))
+            return True
+        return call
+
+    def answer(session_id, letter):
+        def call(http):
+            message = f"session:{session_id} answer:{letter}"
+            return ok_json(http.post(f"{url}/chat", json={"message": message, "mode": "practice"}))
+        return call
+
+    def recommendations(user):
+        def call(http):
+            return http.get(f"{url}/recommendations", params={"user_id": user}).status_code == 200
+        return call
+
+    def send_report(session_id, user):
+        def call(http):
+            response = http.post(f"{url}/send_report", json={"session_id": session_id, "user_name": user})
+            return response.status_code == 200 and response.json().get("success")
+        return call
+
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "baseline")},
+        "chunks": chunks,
+        "index_build_s": round(index_build, 2),
+        "scenarios": {}
+    }
+    topics = sorted({topic for _, topic in terms})
+    for name in args.scenarios:
+        if name == "ask":
+            calls = [ask(*rng.choice(terms)) for _ in range(args.requests)]
+        elif name == "practice":
+            calls = [practice(rng.choice(topics), rng.choice(users)) for _ in range(args.requests)]
+        elif name == "answer":
+            # Each session's answers in order, sessions interleaved across threads
+            calls = [answer(session_id, rng.choice("ABCD"))
+                     for _ in range(args.questions) for session_id, _ in sessions[:args.requests]]
+        elif name == "recommendations":
+            calls = [recommendations(rng.choice(users)) for _ in range(args.requests)]
+        else:
+            calls = [send_report(*session) for session in sessions[:args.requests]]
+        result = summarize(*run_scenario(calls, args.concurrency))
+        results["scenarios"][name] = result
+        if result is None:
+            print(f"{name:<16} skipped (run practice first)")
+            continue
+        print(f"{name:<16} {result['requests']:>8} {result['errors']:>7} {result['throughput']:>8.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+
+    if "send_report" in args.scenarios and sessions:
+        start = time.perf_counter()
+        while web.slack_outbox.stats().get("pending") and time.perf_counter() - start < 60:
+            time.sleep(0.05)
+        print(f"Slack: {slack.messages} reports delivered, outbox drained {time.perf_counter() - start:.2f}s "
+              f"after the last /send_report")
+
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    print(f"peak RSS {results['peak_rss_mb']:.0f}MB")
+    server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
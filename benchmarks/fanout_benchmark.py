@@ -0,0 +1,84 @@
+"""
+Quiz generation latency with and without fan-out.
+
+Uses a simulated LLM whose latency grows with the length of its answer
+(--ms-per-question per generated question plus --base-ms per call) and a
+small FAISS index with fake embeddings, so only the orchestration is
+measured. Compares one call for the whole quiz with concurrent groups of
+QUIZ_GROUP_SIZE questions.
+
+    python benchmarks/fanout_benchmark.py --questions 5 10 20 --ms-per-question 300
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.language_models.llms import LLM
+import tools.practice_tool as practice_tool
+from tools.practice_tool import PracticeSession
+
+
+class SimulatedQuizLLM(LLM):
+    """Answers the quiz prompt with well-formed questions after a length-dependent delay"""
+
+    base_ms: float = 300
+    ms_per_question: float = 300
+
+    @property
+    def _llm_type(self):
+        return "simulated-quiz"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        count = int(re.search(r"create (\d+) multiple-choice", prompt).group(1))
+        # Distinct text per call so fan-out groups don't produce repeats
+        salt = f"{time.perf_counter_ns()}"
+        text = "".join(
+            f"QUESTION: Which statement {salt}-{i} is supported?\nA. first\nB. second\nC. third\nD. fourth\n"
+            f"ANSWER: B\nEXPLANATION: Section {i}.\nTOPIC: benchmarks\n\n"
+            for i in range(count)
+        )
+        time.sleep((self.base_ms + self.ms_per_question * count) / 1000)
+        return text
+
+
+def run(session_factory, num_questions, group_size):
+    practice_tool.QUIZ_GROUP_SIZE = group_size
+    session = session_factory()
+    start = time.perf_counter()
+    session.generate_questions(num_questions)
+    return time.perf_counter() - start, len(session.questions)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--base-ms", type=float, default=300)
+    parser.add_argument("--ms-per-question", type=float, default=300)
+    parser.add_argument("--group-size", type=int, default=practice_tool.QUIZ_GROUP_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # generated questions are saved to question_data.db in the working directory
+        docs = [Document(page_content=f"Chunk {i} of the course material.") for i in range(200)]
+        vectorstore = FAISS.from_documents(docs, DeterministicFakeEmbedding(size=32))
+        llm = SimulatedQuizLLM(base_ms=args.base_ms, ms_per_question=args.ms_per_question)
+        factory = lambda: PracticeSession(None, "benchmarks", vectorstore.as_retriever(search_kwargs={"k": 5}), llm)
+
+        print(f"{'questions':>9} {'single call':>12} {'fan-out':>9} {'speedup':>8}")
+        for num_questions in args.questions:
+            single, single_count = run(factory, num_questions, group_size=10 ** 6)
+            fanout, fanout_count = run(factory, num_questions, group_size=args.group_size)
+            note = "" if single_count == fanout_count == num_questions else f"  ({single_count}/{fanout_count} generated)"
+            print(f"{num_questions:>9} {single:>11.2f}s {fanout:>8.2f}s {single / fanout:>7.1f}x{note}")
+
+
+if __name__ == "__main__":
+    main()
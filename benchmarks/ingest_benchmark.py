@@ -0,0 +1,74 @@
+"""
+Parsing/chunking throughput of rag_tool.iter_file_chunks for different worker counts.
+
+Generates a synthetic corpus of TXT files (or uses --corpus DIR) and reports
+files/s, chunks/s and peak RSS for each worker count.
+
+    python benchmarks/ingest_benchmark.py --files 200 --workers 1 2 4 8
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_tool import iter_file_chunks
+
+WORDS = ("learning retrieval vector index gradient entropy theorem proof matrix "
+         "network protein enzyme market demand supply history empire").split()
+
+
+def make_corpus(directory, num_files, words_per_file):
+    rng = random.Random(0)
+    paths = []
+    for i in range(num_files):
+        path = os.path.join(directory, f"doc_{i}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            for start in range(0, words_per_file, 12):
+                f.write(" ".join(rng.choice(WORDS) for _ in range(12)) + ".\n")
+        paths.append(path)
+    return paths
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return rss / scale, rss_children / scale
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="Directory of .pdf/.txt/.docx files to use instead of a synthetic corpus")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--words", type=int, default=5000, help="Words per synthetic file")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            paths = [os.path.join(args.corpus, name) for name in sorted(os.listdir(args.corpus))
+                     if name.endswith((".pdf", ".txt", ".docx"))]
+        else:
+            paths = make_corpus(tmp, args.files, args.words)
+
+        print(f"{len(paths)} files")
+        print(f"{'workers':>8} {'seconds':>8} {'files/s':>9} {'chunks/s':>10} {'rss MB':>8} {'child MB':>9}")
+        for workers in args.workers:
+            start = time.perf_counter()
+            num_chunks = 0
+            for _, chunks in iter_file_chunks(paths, workers=workers):
+                num_chunks += len(chunks)
+            elapsed = time.perf_counter() - start
+            rss, rss_children = peak_rss_mb()
+            print(f"{workers:>8} {elapsed:>8.2f} {len(paths) / elapsed:>9.1f} "
+                  f"{num_chunks / elapsed:>10.1f} {rss:>8.1f} {rss_children:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Repeated quiz generation and questions with and without the LLM cache.
+
+A class of --students each asks one of --topics questions through the
+RetrievalQA chain and generates a quiz on the same topic through
+PracticeSession.generate_questions. As in the app, only the question
+answering LLM is cached; quizzes always go to the LLM. The LLM is
+simulated (--llm-ms per call, output derived from the prompt) and the
+index uses fake embeddings, so the difference is the LLM calls the cache
+answers.
+
+    python benchmarks/llm_cache_benchmark.py --students 60 --topics 8 --llm-ms 800
+"""
+import argparse
+import hashlib
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.language_models.llms import LLM
+from rag_tool import build_qa_chain
+from tools.practice_tool import PracticeSession
+from utils.llm_cache import LLMCache
+
+
+class SimulatedLLM(LLM):
+    """Deterministic answers (quizzes for quiz prompts) after llm_ms"""
+
+    llm_ms: float = 800
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "simulated"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.llm_ms / 1000)
+        tag = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        match = re.search(r"create (\d+) multiple-choice", prompt)
+        if not match:
+            return f"The documents say {tag}."
+        return "".join(
+            f"QUESTION: Which statement {tag}-{i} is supported?\nA. first\nB. second\nC. third\nD. fourth\n"
+            f"ANSWER: B\nEXPLANATION: Section {i}.\nTOPIC: benchmarks\n\n"
+            for i in range(int(match.group(1)))
+        )
+
+
+def run(students, topics, llm, quiz_llm, vectorstore):
+    qa = build_qa_chain(vectorstore, llm, k=3, bm25=None)
+    latencies = []
+    start_all = time.perf_counter()
+    for topic in students:
+        start = time.perf_counter()
+        qa.invoke({"query": f"Explain {topics[topic]}"})
+        session = PracticeSession(None, topics[topic], vectorstore.as_retriever(search_kwargs={"k": 5}), quiz_llm)
+        session.generate_questions(5)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return time.perf_counter() - start_all, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=60)
+    parser.add_argument("--topics", type=int, default=8)
+    parser.add_argument("--llm-ms", type=float, default=800)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    topics = [f"topic {i}" for i in range(args.topics)]
+    # A few topics are popular, as when a class works through the same unit
+    students = rng.choices(range(args.topics), weights=[1 / (i + 1) for i in range(args.topics)], k=args.students)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # generated questions are saved to question_data.db in the working directory
+        docs = [Document(page_content=f"Chunk {i} about topic {i % args.topics}.") for i in range(200)]
+        vectorstore = FAISS.from_documents(docs, DeterministicFakeEmbedding(size=32))
+
+        print(f"{args.students} students, {args.topics} topics, {args.llm_ms:.0f}ms per LLM call")
+        print(f"{'mode':<10} {'total s':>8} {'p50 s':>7} {'p99 s':>7} {'LLM calls':>10} {'hit rate':>9}")
+
+        llm = SimulatedLLM(llm_ms=args.llm_ms)
+        total, p50, p99 = run(students, topics, llm, llm, vectorstore)
+        print(f"{'no cache':<10} {total:>8.2f} {p50:>7.2f} {p99:>7.2f} {llm.calls:>10} {'-':>9}")
+
+        cache = LLMCache(os.path.join(tmp, "llm_cache.db"))
+        llm = SimulatedLLM(llm_ms=args.llm_ms, cache=cache)
+        quiz_llm = SimulatedLLM(llm_ms=args.llm_ms, cache=False)
+        total, p50, p99 = run(students, topics, llm, quiz_llm, vectorstore)
+        calls = llm.calls + quiz_llm.calls
+        print(f"{'cache':<10} {total:>8.2f} {p50:>7.2f} {p99:>7.2f} {calls:>10} {cache.stats()['hit_rate']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
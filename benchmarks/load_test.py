@@ -0,0 +1,96 @@
+"""
+Concurrent load test for the /chat endpoints.
+
+Fires --requests requests at --concurrency parallel clients and reports
+throughput, latency percentiles and the peak number of requests the server
+had in flight at once. Run it against both serving modes to compare:
+
+    python app.py                                  # sync Flask dev server
+    gunicorn -w 1 --threads 4 app:app              # sync, 4 threads per worker
+    uvicorn asgi:app --workers 1                   # async mode
+
+    python benchmarks/load_test.py --url http://localhost:8000 --concurrency 50 --requests 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+
+async def run_load(url, mode, message, concurrency, total, stream, timeout):
+    latencies = []
+    errors = 0
+    in_flight = 0
+    peak_in_flight = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    endpoint = "/chat/stream" if stream else "/chat"
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        async def worker():
+            nonlocal errors, in_flight, peak_in_flight
+            while True:
+                try:
+                    i = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                payload = {"message": f"{message} #{i}", "mode": mode}
+                start = time.perf_counter()
+                in_flight += 1
+                peak_in_flight = max(peak_in_flight, in_flight)
+                try:
+                    response = await client.post(endpoint, json=payload)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                finally:
+                    in_flight -= 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return latencies, errors, elapsed, peak_in_flight
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--mode", default="ask", choices=["ask", "practice"])
+    parser.add_argument("--message", default="Summarize the main idea of the documents")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--stream", action="store_true", help="Use /chat/stream instead of /chat")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    latencies, errors, elapsed, peak = asyncio.run(run_load(
+        args.url, args.mode, args.message, args.concurrency, args.requests, args.stream, args.timeout
+    ))
+
+    print(f"requests:        {len(latencies)} ({errors} errors)")
+    print(f"concurrency:     {args.concurrency} (peak in flight {peak})")
+    print(f"elapsed:         {elapsed:.2f}s")
+    print(f"throughput:      {len(latencies) / elapsed:.2f} req/s")
+    print(f"latency p50:     {percentile(latencies, 50) * 1000:.0f} ms")
+    print(f"latency p99:     {percentile(latencies, 99) * 1000:.0f} ms")
+    print(f"latency mean:    {statistics.mean(latencies) * 1000:.0f} ms")
+    # With a fixed upstream latency L, throughput * L approximates how many
+    # requests the server actually processed concurrently
+    print(f"effective concurrency: {len(latencies) / elapsed * statistics.mean(latencies):.1f}")
+
+
+if __name__ == "__main__":
+    main()
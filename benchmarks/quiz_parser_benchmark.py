@@ -0,0 +1,244 @@
+"""
+Fuzz and speed check for the quiz output parser.
+
+Generates LLM-style quiz outputs, applies the kinds of drift seen in real
+responses (markdown, numbering, "A)" options, options that contain "A." or
+"B.", answers given as text or in a sentence, question text starting with
+"A.", "Question:" inside an explanation, wrapped lines, truncation, missing
+fields, ambiguous answers) and compares how many questions the previous
+split-based parser and tools/quiz_parser recover correctly, how many damaged
+ones each wrongly accepts, and how fast each one is.
+
+    python benchmarks/quiz_parser_benchmark.py --cases 2000 --seed 1
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.quiz_parser import QuizParseError, _answer_index, parse_questions
+
+WORDS = ("cell membrane chlorophyll enzyme glucose light energy reaction oxygen carbon water "
+         "stomata protein nucleus ribosome transport diffusion gradient pigment").split()
+
+
+def legacy_parse(text, default_topic):
+    """The previous parser: re.split on QUESTION: and split() per option"""
+    questions = []
+    for block in re.split(r'QUESTION:', text)[1:]:
+        try:
+            question_text = block.split('A.')[0].strip()
+            options = []
+            option_markers = ['A.', 'B.', 'C.', 'D.']
+            for i in range(len(option_markers)):
+                marker = option_markers[i]
+                next_marker = option_markers[i+1] if i < len(option_markers)-1 else 'ANSWER:'
+                options.append(block.split(marker)[1].split(next_marker)[0].strip())
+            answer_match = re.search(r'ANSWER:\s*([A-D])', block)
+            if not answer_match:
+                continue
+            correct_index = ord(answer_match.group(1)) - ord('A')
+            explanation_match = re.search(r'EXPLANATION:\s*(.*?)(?:TOPIC:|$)', block, re.DOTALL)
+            topic_match = re.search(r'TOPIC:\s*(.*?)$', block, re.DOTALL)
+            questions.append((question_text, options, correct_index,
+                              explanation_match.group(1).strip() if explanation_match else "",
+                              topic_match.group(1).strip() if topic_match else default_topic))
+        except Exception:
+            pass
+    return questions
+
+
+def sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def make_question(rng):
+    options = []
+    while len(options) < 4:
+        option = sentence(rng, rng.randint(1, 5))
+        if option not in options:
+            options.append(option)
+    # Some options legitimately contain "A." / "B." (initials, species names)
+    if rng.random() < 0.2:
+        options[rng.randrange(4)] += rng.choice([" (see Fig. A. 2)", " by J. B. Haldane", " in E. coli B. strain"])
+    return {
+        "text": sentence(rng, rng.randint(6, 14)) + "?",
+        "options": options,
+        "answer": rng.randrange(4),
+        "explanation": sentence(rng, rng.randint(5, 20)) + ".",
+        "topic": sentence(rng, 2)
+    }
+
+
+def render(q, rng, style):
+    """One question in the prompt's format, with formatting drift chosen by style"""
+    letters = "ABCD"
+    label = lambda name: f"**{name}:**" if style.get("bold") else (name.title() + ":" if style.get("title") else name + ":")
+    lines = []
+    prefix = f"{style['number']}. " if style.get("number") else ""
+    if style.get("lead_letter"):
+        # Question text on its own line, starting like an option
+        lines.append(f"{prefix}{label('QUESTION')}\n{q['text']}")
+    else:
+        lines.append(f"{prefix}{label('QUESTION')} {q['text']}")
+    for i, option in enumerate(q["options"]):
+        fmt = style.get("option", "{l}. {o}")
+        lines.append(fmt.format(l=letters[i], o=option))
+    answer = q["options"][q["answer"]] if style.get("answer_text") else letters[q["answer"]]
+    if style.get("answer_with_text"):
+        answer = f"{letters[q['answer']]}. {q['options'][q['answer']]}"
+    if style.get("answer_sentence"):
+        answer = f"The answer is {q['options'][q['answer']]}"
+    lines.append(f"{label('ANSWER')} {answer}")
+    explanation = q["explanation"].replace(" Question: ", "\nQuestion: ")
+    if style.get("wrap") and len(explanation) > 30:
+        cut = explanation.index(" ", 20) if " " in explanation[20:] else len(explanation)
+        explanation = explanation[:cut] + "\n" + explanation[cut + 1:]
+    lines.append(f"{label('EXPLANATION')} {explanation}")
+    lines.append(f"{label('TOPIC')} {q['topic']}")
+    return "\n".join(lines)
+
+
+STYLES = [
+    {},
+    {"bold": True},
+    {"title": True},
+    {"number": 1},
+    {"number": 1, "bold": True},
+    {"option": "{l}) {o}"},
+    {"option": "({l}) {o}"},
+    {"answer_text": True},
+    {"answer_with_text": True},
+    {"answer_sentence": True},
+    {"lead_letter": True},
+    {"explanation_question": True},
+    {"wrap": True},
+    {"bold": True, "option": "- {l}. {o}", "wrap": True}
+]
+
+
+def make_case(rng, num_questions=5):
+    """(LLM output text, questions that should be recoverable, damaged questions that should be dropped)"""
+    style = rng.choice(STYLES)
+    questions = [make_question(rng) for _ in range(num_questions)]
+    parts, expected, damaged = [], [], []
+    for i, q in enumerate(questions):
+        if style.get("lead_letter"):
+            q["text"] = "A. " + q["text"]
+        if style.get("explanation_question"):
+            q["explanation"] += f" Question: {sentence(rng, 4).lower()}? {sentence(rng, 5)}."
+        q_style = dict(style, number=i + 1) if "number" in style else style
+        text = render(q, rng, q_style)
+        damage = rng.random()
+        if damage < 0.05:
+            text = text.replace("D. ", "", 1).replace("D) ", "", 1).replace("(D) ", "", 1)  # missing option
+        elif damage < 0.10:
+            text = re.sub(r"(?im)^.*answer.*$", "", text)  # missing answer
+        elif damage < 0.13:
+            text = re.sub(r"(?im)^(.*answer.*?:\W*).*$", r"\1Both A and B are wrong; C", text)  # ambiguous answer
+            damaged.append(q)
+        else:
+            expected.append(q)
+        parts.append(text)
+    text = "\n\n".join(parts)
+    if rng.random() < 0.3:
+        text = "Here are the questions based on the documents:\n\n" + text
+    if rng.random() < 0.2:
+        text = text.replace("\n", "\r\n")
+    if rng.random() < 0.1 and expected:
+        # Truncated mid-way through the last question
+        text = text[:text.rfind("B")]
+        if expected[-1] is questions[-1]:
+            expected.pop()
+    return text, expected, damaged
+
+
+def matches(parsed, q):
+    text, options, correct_index, explanation, topic = parsed
+    return (text == q["text"] and list(options) == q["options"] and correct_index == q["answer"]
+            and " ".join(explanation.split()) == q["explanation"] and topic == q["topic"])
+
+
+def score(parser, cases):
+    correct = wrong = accepted = 0
+    start = time.perf_counter()
+    results = [parser(text) for text, _, _ in cases]
+    elapsed = time.perf_counter() - start
+    for parsed, (_, expected, damaged) in zip(results, cases):
+        by_text = {p[0]: p for p in parsed}
+        for q in expected:
+            p = by_text.get(q["text"])
+            if p and matches(p, q):
+                correct += 1
+            else:
+                wrong += 1
+        accepted += sum(q["text"] in by_text for q in damaged)
+    return correct, wrong, accepted, elapsed
+
+
+# (answer, options, expected index or None when the answer must be rejected)
+ANSWER_CASES = [
+    ("The answer is Vitamin D", ["Vitamin A", "Vitamin C", "Vitamin D", "Vitamin K"], 2),
+    ("A: Vitamin D", ["Vitamin A", "Vitamin C", "Vitamin D", "Vitamin K"], 2),
+    ("Both A and B are wrong; C", ["Vitamin A", "Vitamin C", "Vitamin D", "Vitamin K"], None),
+    ("Vitamin A and Vitamin C", ["Vitamin A", "Vitamin C", "Vitamin D", "Vitamin K"], None),
+    ("B) Vitamin C", ["Vitamin A", "Vitamin C", "Vitamin D", "Vitamin K"], 1),
+    ("Option C", ["Vitamin A", "Vitamin C", "Vitamin D", "Vitamin K"], 2),
+    ("d", ["Vitamin A", "Vitamin C", "Vitamin D", "Vitamin K"], 3),
+    ("Glucose and oxygen", ["Glucose", "Glucose and oxygen", "Water", "Light"], 1),
+]
+
+
+def check_answers():
+    """Grade the fixed ANSWER cases; returns the failures"""
+    failures = []
+    for answer, options, expected in ANSWER_CASES:
+        try:
+            got = _answer_index(answer, options)
+        except QuizParseError:
+            got = None
+        if got != expected:
+            failures.append(f"{answer!r}: expected {expected}, got {got}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = [make_case(rng) for _ in range(args.cases)]
+    total = sum(len(expected) for _, expected, _ in cases)
+    total_damaged = sum(len(damaged) for _, _, damaged in cases)
+
+    def new_parse(text):
+        questions, _ = parse_questions(text, "default")
+        return [(q.text, q.options, q.correct_index, q.explanation, q.topic) for q in questions]
+
+    print(f"{args.cases:,} outputs, {total:,} well-formed questions, {total_damaged:,} with ambiguous answers\n")
+    print(f"{'parser':<8} {'recovered':>10} {'missed/wrong':>13} {'misgraded':>10} {'outputs/s':>10}")
+    for name, parse in (("legacy", lambda text: legacy_parse(text, "default")), ("new", new_parse)):
+        correct, wrong, accepted, elapsed = score(parse, cases)
+        print(f"{name:<8} {correct / total:>10.1%} {wrong:>13,} {accepted:>10,} {args.cases / elapsed:>10,.0f}")
+
+    failures = check_answers()
+    print(f"\nANSWER grading: {len(ANSWER_CASES) - len(failures)}/{len(ANSWER_CASES)} cases")
+    for failure in failures:
+        print(f"  {failure}")
+
+    # Worst case for the old splitting: one long output
+    big = "\n\n".join(render(make_question(rng), rng, {}) for _ in range(500))
+    for name, parse in (("legacy", lambda text: legacy_parse(text, "default")), ("new", new_parse)):
+        start = time.perf_counter()
+        count = len(parse(big))
+        print(f"500-question output, {name}: {count} parsed in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Retrieval quality and latency: plain FAISS similarity vs the hybrid
+BM25 + vector retriever, with and without the cross-encoder reranker.
+
+By default it builds a synthetic corpus where every chunk has a section
+number and a named term (the exact matches dense retrieval tends to miss)
+and asks for each by "term" and by "section". To measure on real
+documents, pass --corpus DIR and --qrels FILE, a JSON lines file of
+{"query": ..., "answer": ...} where a chunk is relevant if it contains the
+answer text. Reports recall@k, MRR and per-query latency per retriever.
+
+    python benchmarks/retrieval_benchmark.py --chunks 5000 --queries 300
+    python benchmarks/retrieval_benchmark.py --corpus docs --qrels qrels.jsonl --embeddings huggingface --rerank
+
+--embeddings hashed (the default) uses character trigram hashing so the
+benchmark runs offline; use huggingface for numbers that match production.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from utils.hybrid_retriever import BM25Index, CrossEncoderReranker, HybridRetriever
+
+TOPICS = {
+    "physics": "force mass energy momentum velocity field charge wave particle motion friction pressure".split(),
+    "biology": "cell protein enzyme membrane gene tissue organism metabolism receptor signal growth".split(),
+    "economics": "market demand supply price cost elasticity equilibrium trade tax inflation output".split(),
+    "history": "empire treaty war dynasty revolution reform trade colony republic council border".split(),
+    "computing": "memory cache thread process graph tree hash queue compiler network latency".split(),
+}
+COMMON = "the of a and in is to that for as with by this which are also can be its".split()
+SYLLABLES = "ka lo ve ri dan mor sel tu bra quin hol vark zen pet lum gor".split()
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """Character trigram counts hashed into dim buckets; an offline stand-in for a sentence embedding model"""
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        text = f" {text.lower()} "
+        for i in range(len(text) - 2):
+            vector[hash(text[i:i + 3]) % self.dim] += 1
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def make_name(rng):
+    def word():
+        return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+    return f"{word()}-{word()}"
+
+
+def make_corpus(num_chunks, words_per_chunk, rng):
+    """Chunks plus (query, is_relevant) pairs for the "term" and "section" query sets"""
+    docs, term_queries, section_queries = [], [], []
+    kinds = ["theorem", "criterion", "equation", "effect", "principle", "model"]
+    for i in range(num_chunks):
+        topic = rng.choice(list(TOPICS))
+        section = f"{i // 20 + 1}.{i % 20 + 1}"
+        term = f"{make_name(rng)} {rng.choice(kinds)}"
+        body = [rng.choice(TOPICS[topic] if rng.random() < 0.6 else COMMON) for _ in range(words_per_chunk)]
+        body.insert(rng.randrange(len(body)), term)
+        docs.append(Document(
+            page_content=f"Section {section}: {term}\n" + " ".join(body),
+            metadata={"chunk": i}
+        ))
+        is_relevant = lambda doc, i=i: doc.metadata.get("chunk") == i
+        term_queries.append((f"What does the {term} say?", is_relevant))
+        section_queries.append((f"Summarize section {section}", is_relevant))
+    return docs, {"term": term_queries, "section": section_queries}
+
+
+def load_qrels(corpus, qrels_path):
+    """Chunks of the documents in corpus plus the queries in qrels_path"""
+    from rag_tool import load_documents
+    paths = [os.path.join(corpus, name) for name in sorted(os.listdir(corpus))
+             if name.endswith((".pdf", ".txt", ".docx"))]
+    queries = []
+    with open(qrels_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                answer = item["answer"].lower()
+                queries.append((item["query"], lambda doc, answer=answer: answer in doc.page_content.lower()))
+    return load_documents(paths), {"qrels": queries}
+
+
+def evaluate(retriever, queries, k):
+    latencies, hits, reciprocal_ranks = [], 0, []
+    for query, is_relevant in queries:
+        start = time.perf_counter()
+        docs = retriever.invoke(query)[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        ranks = [rank for rank, doc in enumerate(docs, 1) if is_relevant(doc)]
+        hits += bool(ranks)
+        reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+    latencies.sort()
+    return {
+        "recall": hits / len(queries),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="Directory of .pdf/.txt/.docx files (with --qrels)")
+    parser.add_argument("--qrels", help="JSON lines of {query, answer} for --corpus")
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--words", type=int, default=150, help="Words per chunk")
+    parser.add_argument("--queries", type=int, default=300, help="Queries per query set")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--embeddings", choices=["hashed", "huggingface"], default="hashed")
+    parser.add_argument("--rerank", action="store_true", help="Also run the hybrid retriever with the cross-encoder")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    if args.corpus:
+        docs, query_sets = load_qrels(args.corpus, args.qrels)
+    else:
+        docs, query_sets = make_corpus(args.chunks, args.words, rng)
+        query_sets = {name: rng.sample(queries, min(args.queries, len(queries))) for name, queries in query_sets.items()}
+
+    if args.embeddings == "huggingface":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings()
+    else:
+        embeddings = HashedNgramEmbeddings()
+
+    start = time.perf_counter()
+    vectorstore = FAISS.from_documents(docs, embeddings)
+    print(f"{len(docs)} chunks, FAISS build {time.perf_counter() - start:.1f}s", end=", ")
+    start = time.perf_counter()
+    bm25 = BM25Index.from_vectorstore(vectorstore)
+    print(f"BM25 build {time.perf_counter() - start:.2f}s")
+
+    retrievers = {
+        f"vector k={args.k}": vectorstore.as_retriever(search_kwargs={"k": args.k}),
+        f"vector k={args.k + 2}": vectorstore.as_retriever(search_kwargs={"k": args.k + 2}),
+        f"hybrid k={args.k}": HybridRetriever(vectorstore=vectorstore, bm25=bm25, k=args.k),
+    }
+    if args.rerank:
+        retrievers[f"hybrid+rerank k={args.k}"] = HybridRetriever(
+            vectorstore=vectorstore, bm25=bm25, reranker=CrossEncoderReranker(), k=args.k
+        )
+
+    print(f"{'retriever':<22} {'queries':<8} {'recall':>7} {'mrr':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, retriever in retrievers.items():
+        k = int(name.rsplit("=", 1)[1])
+        for set_name, queries in query_sets.items():
+            result = evaluate(retriever, queries, k)
+            print(f"{name:<22} {set_name:<8} {result['recall']:>7.3f} {result['mrr']:>6.3f} "
+                  f"{result['p50']:>8.2f} {result['p95']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Memory and serialized size of practice sessions.
+
+Builds --sessions sessions of --questions questions (with some answered)
+in the previous dict-based layout and with the slotted Question /
+SessionProgress types, and reports traced memory per 10k sessions and the
+average serialized state size.
+
+    python benchmarks/session_memory_benchmark.py --sessions 10000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.models import Question
+from db.question_db import QuestionDatabase
+from tools.practice_tool import PracticeSession
+
+
+class LegacySession:
+    """The previous layout: a dict per question, counters and a topics dict per session"""
+
+    def __init__(self, session_id, topic, db_path):
+        self.session_id = session_id
+        self.topic = topic
+        self.user_id = None
+        self.questions = []
+        self.current_index = 0
+        self.db = QuestionDatabase(db_path)
+        self._unsaved = []
+        self._save_lock = threading.Lock()
+        self.retriever = None
+        self.llm = None
+        self.start_time = time.time()
+        self.end_time = None
+        self.correct_answers = 0
+        self.incorrect_answers = 0
+        self.topics = {}
+
+    def add(self, question_id, text, options, letter, explanation):
+        self.questions.append({
+            'id': question_id,
+            'question': text,
+            'options': options,
+            'correct_answer': options[ord(letter) - 65],
+            'explanation': explanation,
+            'correct_letter': letter
+        })
+
+    def answer(self, is_correct):
+        self.correct_answers += is_correct
+        self.incorrect_answers += not is_correct
+        data = self.topics.setdefault(self.topic, {'correct': 0, 'total': 0})
+        data['total'] += 1
+        data['correct'] += is_correct
+        self.current_index += 1
+
+    def to_state(self):
+        return {
+            "session_id": self.session_id, "topic": self.topic, "user_id": self.user_id,
+            "start_time": self.start_time, "questions": self.questions,
+            "progress": {
+                "current_index": self.current_index, "correct_answers": self.correct_answers,
+                "incorrect_answers": self.incorrect_answers, "end_time": self.end_time, "topics": self.topics
+            }
+        }
+
+
+def question_fields(s, i):
+    # Fresh strings per session, as generated text would be
+    text = f"Session {s}: which statement about concept {i} is supported by the documents?"
+    options = [f"Option {letter} for concept {i} in session {s}" for letter in "ABCD"]
+    explanation = f"The documents describe concept {i} in section {s % 50}."
+    return s * 10 + i, text, options, "ABCD"[i % 4], explanation
+
+
+def build_legacy(num_sessions, num_questions, answered, db_path):
+    sessions = []
+    for s in range(num_sessions):
+        session = LegacySession(f"legacy-{s:08d}", "photosynthesis", db_path)
+        for i in range(num_questions):
+            session.add(*question_fields(s, i))
+        for i in range(answered):
+            session.answer(i % 2 == 0)
+        sessions.append(session)
+    return sessions
+
+
+def build_slotted(num_sessions, num_questions, answered):
+    sessions = []
+    for s in range(num_sessions):
+        session = PracticeSession(f"slotted-{s:08d}", "photosynthesis", None, None)
+        for i in range(num_questions):
+            question_id, text, options, letter, explanation = question_fields(s, i)
+            session.questions.append(Question(text, options, ord(letter) - 65, explanation, "photosynthesis", question_id))
+        for i in range(answered):
+            session.progress.record(i % 2 == 0)
+        sessions.append(session)
+    return sessions
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return sessions, used
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--answered", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # PracticeSession opens question_data.db in the working directory
+        db_path = os.path.join(tmp, "question_data.db")
+        QuestionDatabase(db_path)
+
+        per_10k = 10000 / args.sessions
+        legacy, legacy_bytes = measure(lambda: build_legacy(args.sessions, args.questions, args.answered, db_path))
+        legacy_json = sum(len(json.dumps(s.to_state(), separators=(",", ":"))) for s in legacy) / len(legacy)
+        del legacy
+
+        slotted, slotted_bytes = measure(lambda: build_slotted(args.sessions, args.questions, args.answered))
+        slotted_json = sum(len(json.dumps(s.to_state(), separators=(",", ":"))) for s in slotted) / len(slotted)
+
+        print(f"{args.sessions:,} sessions x {args.questions} questions ({args.answered} answered)\n")
+        print(f"{'':<10} {'MB per 10k sessions':>20} {'bytes per session':>18} {'serialized bytes':>17}")
+        print(f"{'legacy':<10} {legacy_bytes * per_10k / 2**20:>20.2f} {legacy_bytes / args.sessions:>18.0f} {legacy_json:>17.0f}")
+        print(f"{'slotted':<10} {slotted_bytes * per_10k / 2**20:>20.2f} {slotted_bytes / args.sessions:>18.0f} {slotted_json:>17.0f}")
+        print(f"\nSaved {(1 - slotted_bytes / legacy_bytes) * 100:.0f}% memory, "
+              f"{(1 - slotted_json / legacy_json) * 100:.0f}% serialized size")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Employee lookups and updates: full-sheet scans vs the SheetMirror copy.
+
+Fills an in-memory sheet with --rows employees and adds --latency seconds
+to every sheet API call (one round trip to Google). The "scan" mode does
+what google_sheets_tools used to: get_all_records() and a linear search
+per lookup, plus an update_cell() request per update. The "mirror" mode
+goes through utils.sheet_mirror.SheetMirror.
+
+    python benchmarks/sheets_benchmark.py --rows 100000
+    python benchmarks/sheets_benchmark.py --rows 100000 --latency 0.2 --updates 500
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.sheet_mirror import MemorySheet, SheetMirror, _numericise
+
+
+class SlowSheet(MemorySheet):
+    """MemorySheet that waits latency seconds per API call"""
+
+    def __init__(self, rows, latency):
+        super().__init__(rows=rows)
+        self.latency = latency
+
+    def get_all_values(self):
+        time.sleep(self.latency)
+        return super().get_all_values()
+
+    def append_rows(self, rows):
+        time.sleep(self.latency)
+        super().append_rows(rows)
+
+    def update_cells(self, cells):
+        time.sleep(self.latency)
+        super().update_cells(cells)
+
+    def version(self):
+        time.sleep(self.latency)
+        return super().version()
+
+
+def get_all_records(sheet):
+    values = sheet.get_all_values()
+    return [{field: _numericise(value) for field, value in zip(values[0], row)} for row in values[1:]]
+
+
+def scan_get(sheet, name):
+    for row in get_all_records(sheet):
+        if row["Name"].lower() == name.lower():
+            return row
+    return None
+
+
+def scan_update(sheet, name, field, value):
+    for i, row in enumerate(get_all_records(sheet)):
+        if row["Name"].lower() == name.lower():
+            sheet.update_cells([(i + 2, list(row.keys()).index(field) + 1, value)])
+            return True
+    return False
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def timed(calls):
+    latencies = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name, latencies, sheet):
+    print(f"{name:<16} {len(latencies):>6} {percentile(latencies, 0.5):>9.3f} {percentile(latencies, 0.99):>9.3f} "
+          f"{sum(latencies) / 1000:>8.2f} {sheet.reads:>6} {sheet.writes:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds added to every sheet API call")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--scan-lookups", type=int, default=20, help="Lookups for the (slow) scan mode")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    rows = [[f"employee-{i}", rng.choice(["Engineer", "Analyst", "Manager"]), rng.randint(21, 65)]
+            for i in range(args.rows)]
+    names = [f"employee-{rng.randrange(args.rows)}" for _ in range(max(args.lookups, args.updates))]
+
+    print(f"{args.rows} rows, {args.latency * 1000:.0f}ms per sheet API call")
+    print(f"{'mode':<16} {'calls':>6} {'p50 ms':>9} {'p99 ms':>9} {'total s':>8} {'reads':>6} {'writes':>7}")
+
+    sheet = SlowSheet(rows, args.latency)
+    report("scan get", timed(lambda name=name: scan_get(sheet, name) for name in names[:args.scan_lookups]), sheet)
+    sheet = SlowSheet(rows, args.latency)
+    report("scan update", timed(lambda name=name: scan_update(sheet, name, "Role", "Lead")
+                                for name in names[:args.scan_lookups]), sheet)
+
+    sheet = SlowSheet(rows, args.latency)
+    mirror = SheetMirror(lambda: sheet, ttl=3600, flush_seconds=0)
+    report("mirror get", timed(lambda name=name: mirror.get(name) for name in names[:args.lookups]), sheet)
+    report("mirror update", timed(lambda name=name: mirror.update(name, "Role", "Lead")
+                                  for name in names[:args.updates]), sheet)
+    start = time.perf_counter()
+    mirror.flush()
+    print(f"final flush {(time.perf_counter() - start) * 1000:.1f}ms, {mirror.stats()['flushes']} batched writes")
+
+
+if __name__ == "__main__":
+    main()
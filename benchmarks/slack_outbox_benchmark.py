@@ -0,0 +1,172 @@
+"""
+/send_report cost with inline Slack posts vs the SQLite outbox.
+
+Starts a local stand-in for the Slack API (chat.postMessage) with
+--latency seconds per request that answers every --rate-limit-every'th
+request with HTTP 429 and a Retry-After. Then:
+
+  inline  posts --reports reports one after another, as /send_report used
+          to (one requests.post per report, no session reuse)
+  outbox  enqueues them into a SlackOutbox (what /send_report waits for
+          now) and times the background thread until all are delivered,
+          optionally batched into digests with --digest
+
+    python benchmarks/slack_outbox_benchmark.py --reports 200 --latency 0.05
+    python benchmarks/slack_outbox_benchmark.py --reports 200 --digest 1
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.slack_outbox import SlackOutbox
+from utils.slack_reporter import SlackReporter
+
+
+class StandInSlack:
+    """Minimal chat.postMessage endpoint that counts what it receives"""
+
+    def __init__(self, latency=0.0, rate_limit_every=0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.requests = 0
+        self.messages = 0
+        self.blocks = 0
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Otherwise headers and body go out in separate segments and kept-alive connections stall on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(stand_in.latency)
+                with stand_in._lock:
+                    stand_in.requests += 1
+                    limited = stand_in.rate_limit_every and stand_in.requests % stand_in.rate_limit_every == 0
+                    if not limited:
+                        stand_in.messages += 1
+                        stand_in.blocks += len(body.get("blocks", []))
+                if limited:
+                    self._reply(429, {"ok": False, "error": "ratelimited"}, {"Retry-After": "1"})
+                else:
+                    self._reply(200, {"ok": True, "channel": body.get("channel")})
+
+            def _reply(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def make_reporter(url, session=None):
+    reporter = SlackReporter(session=session, timeout=5)
+    reporter.bot_token = "xoxb-benchmark"
+    reporter.webhook_url = None
+    reporter.api_url = url
+    return reporter
+
+
+def sample_report(i):
+    return {
+        "user_name": f"learner-{i}",
+        "end_time": time.time(),
+        "duration_minutes": 12,
+        "total_quizzes": 1,
+        "correct_answers": i % 5,
+        "total_questions": 5,
+        "topics": [{"name": "Thermodynamics", "score": 60}, {"name": "Optics", "score": 80}]
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_inline(stand_in, num_reports):
+    class OneShotSession:
+        # requests.post per call, like the original reporter
+        def post(self, *args, **kwargs):
+            return requests.post(*args, **kwargs)
+
+    reporter = make_reporter(stand_in.url, session=OneShotSession())
+    latencies, failures = [], 0
+    for i in range(num_reports):
+        start = time.perf_counter()
+        result = reporter.send_report(sample_report(i), "bench")
+        latencies.append(time.perf_counter() - start)
+        failures += not result.get("ok")
+    return latencies, failures
+
+
+def run_outbox(stand_in, num_reports, digest, channels, db_path):
+    outbox = SlackOutbox(make_reporter(stand_in.url), db_path=db_path, digest_seconds=digest,
+                         backoff_base=0.5, poll_interval=0.5)
+    outbox.start()
+    start_all = time.perf_counter()
+    latencies = []
+    for i in range(num_reports):
+        start = time.perf_counter()
+        outbox.enqueue(sample_report(i), f"bench-{i % channels}")
+        latencies.append(time.perf_counter() - start)
+    while outbox.stats()["pending"]:
+        time.sleep(0.05)
+    drain_seconds = time.perf_counter() - start_all
+    outbox.stop(timeout=5)
+    return latencies, outbox.stats(), drain_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stand-in Slack takes per request")
+    parser.add_argument("--rate-limit-every", type=int, default=25, help="Answer every Nth request with 429 (0: never)")
+    parser.add_argument("--digest", type=float, default=0, help="Digest window in seconds for the outbox run")
+    parser.add_argument("--channels", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{args.reports} reports, {args.latency * 1000:.0f}ms per Slack request, "
+          f"429 every {args.rate_limit_every or 'never'}")
+    print(f"{'mode':<14} {'p50 ms':>8} {'p99 ms':>8} {'delivered s':>12} {'messages':>9} {'lost':>5}")
+
+    stand_in = StandInSlack(args.latency, args.rate_limit_every)
+    start = time.perf_counter()
+    latencies, failures = run_inline(stand_in, args.reports)
+    print(f"{'inline':<14} {percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f} "
+          f"{time.perf_counter() - start:>12.2f} {stand_in.messages:>9} {failures:>5}")
+    stand_in.server.shutdown()
+
+    stand_in = StandInSlack(args.latency, args.rate_limit_every)
+    with tempfile.TemporaryDirectory() as tmp:
+        latencies, stats, drain_seconds = run_outbox(
+            stand_in, args.reports, args.digest, args.channels, os.path.join(tmp, "outbox.db")
+        )
+    name = f"outbox d={args.digest:g}s" if args.digest else "outbox"
+    print(f"{name:<14} {percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f} "
+          f"{drain_seconds:>12.2f} {stand_in.messages:>9} {stats['failed']:>5}")
+    stand_in.server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+/recommendations latency on a large answer history.
+
+Builds a pre-migration question_data.db (no indexes, no topic_stats) with
+--answers rows, times the original JOIN/GROUP BY query, runs the schema
+migration, then times get_topic_performance on the topic_stats table and
+the extra cost record_answer pays to keep it up to date.
+
+    python benchmarks/topic_stats_benchmark.py --answers 1000000 --topics 50
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.question_db import PRAGMAS, QuestionDatabase, close_connection
+
+JOIN_QUERY = """
+    SELECT 
+        q.topic, 
+        SUM(CASE WHEN ua.is_correct THEN 1 ELSE 0 END) as correct_count,
+        SUM(CASE WHEN ua.is_correct = 0 THEN 1 ELSE 0 END) as incorrect_count,
+        COUNT(*) as total_count,
+        ROUND(SUM(CASE WHEN ua.is_correct THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as accuracy
+    FROM questions q
+    JOIN user_answers ua ON q.id = ua.question_id
+    GROUP BY q.topic
+    ORDER BY accuracy ASC
+"""
+
+
+def build_legacy_db(path, num_answers, num_questions, num_topics):
+    """The schema as it was before SCHEMA_VERSION 1, filled with random history"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("""
+        CREATE TABLE questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, question_text TEXT,
+            options TEXT, correct_answer TEXT, topic TEXT, explanation TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""")
+    conn.execute("""
+        CREATE TABLE user_answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, question_id INTEGER, user_answer TEXT,
+            is_correct BOOLEAN, answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (question_id) REFERENCES questions (id)
+        )""")
+
+    rng = random.Random(42)
+    conn.executemany(
+        "INSERT INTO questions (session_id, question_text, options, correct_answer, topic) VALUES (?, ?, ?, ?, ?)",
+        ((f"s{i // 5}", f"Question {i}", '["A", "B", "C", "D"]', "A", f"topic-{i % num_topics}") for i in range(num_questions))
+    )
+    conn.executemany(
+        "INSERT INTO user_answers (question_id, user_answer, is_correct) VALUES (?, ?, ?)",
+        ((rng.randint(1, num_questions), "A", rng.random() < 0.6) for _ in range(num_answers))
+    )
+    conn.commit()
+    conn.close()
+
+
+def best_of(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def answer_rate(db, question_ids, count):
+    start = time.perf_counter()
+    for i in range(count):
+        db.record_answer(question_ids[i % len(question_ids)], "A", i % 3 != 0)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--answers", type=int, default=1_000_000)
+    parser.add_argument("--questions", type=int, default=50_000)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--writes", type=int, default=2000, help="record_answer calls to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "question_data.db")
+
+        start = time.perf_counter()
+        build_legacy_db(path, args.answers, args.questions, args.topics)
+        print(f"Built {args.answers:,} answers / {args.questions:,} questions in {time.perf_counter() - start:.1f}s")
+
+        conn = sqlite3.connect(path)
+        join_time, join_rows = best_of(lambda: conn.execute(JOIN_QUERY).fetchall(), args.repeats)
+        print(f"JOIN + GROUP BY (no indexes):  {join_time * 1000:9.1f} ms")
+
+        # Legacy record_answer: a single insert and commit, same pragmas as the pool
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        ids = list(range(1, args.questions + 1))
+        start = time.perf_counter()
+        for i in range(args.writes):
+            conn.execute("INSERT INTO user_answers (question_id, user_answer, is_correct) VALUES (?, ?, ?)",
+                         (ids[i % len(ids)], "A", i % 3 != 0))
+            conn.commit()
+        legacy_rate = args.writes / (time.perf_counter() - start)
+        conn.close()
+
+        start = time.perf_counter()
+        db = QuestionDatabase(path)
+        print(f"Migration (indexes + backfill): {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+        conn = sqlite3.connect(path)
+        indexed_time, _ = best_of(lambda: conn.execute(JOIN_QUERY).fetchall(), args.repeats)
+        print(f"JOIN + GROUP BY (indexed):     {indexed_time * 1000:9.1f} ms")
+        conn.close()
+
+        stats_time, stats_rows = best_of(db.get_topic_performance, args.repeats)
+        print(f"get_topic_performance:         {stats_time * 1000:9.1f} ms  ({join_time / stats_time:,.0f}x faster)")
+
+        migrated_rate = answer_rate(db, ids, args.writes)
+        print(f"record_answer: {legacy_rate:,.0f} answers/s before, {migrated_rate:,.0f} answers/s with topic_stats")
+
+        # The aggregate must agree with a fresh scan after the extra writes
+        conn = sqlite3.connect(path)
+        expected = {row[0]: row[1:4] for row in conn.execute(JOIN_QUERY)}
+        conn.close()
+        actual = {row["topic"]: (row["correct_count"], row["incorrect_count"], row["total_count"])
+                  for row in db.get_topic_performance()}
+        print("topic_stats matches JOIN:", expected == actual)
+        db.close()
+        close_connection(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Recall, query latency and memory of the RAG_INDEX_TYPE index types.
+
+Generates --vectors clustered random vectors (a rough stand-in for chunk
+embeddings), builds each index type through utils.vector_index, writes it
+to disk and memory-maps it back. Reports build time, recall@k against
+exact search, per-query latency, the time to reconstruct the k results
+(what max_marginal_relevance_search does after searching, so quiz
+generation depends on it), and per million chunks: the RAM the index
+takes when read into memory (its serialized size) and how much of the
+memory-mapped file was resident after running the queries.
+
+    python benchmarks/vector_index_benchmark.py --vectors 100000 --dim 384
+    python benchmarks/vector_index_benchmark.py --types flat ivf sq8 --nprobe 8 32
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import vector_index
+from utils.vector_index import INDEX_TYPES, train_index, tune_index
+
+
+def rss_mb():
+    # Resident set size from /proc (Linux); 0 where unavailable
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return 0.0
+
+
+def make_vectors(num, dim, rng, clusters=256):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, num)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((num, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall(found, truth, k):
+    return np.mean([len(set(f[:k]) & set(t[:k])) / k for f, t in zip(found, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[vector_index.IVF_NPROBE],
+                        help="IVF probe counts to compare")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(args.vectors, args.dim, rng)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)] + \
+        0.05 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    del exact
+
+    scale = 1_000_000 / args.vectors
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.queries} queries, k={args.k}")
+    print(f"{'index':<14} {'build s':>8} {'recall':>7} {'p50 ms':>7} {'p99 ms':>7} {'recon ms':>9} "
+          f"{'RAM MB/1M':>10} {'mapped MB/1M':>13}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for index_type in args.types:
+            start = time.perf_counter()
+            index = train_index(index_type, vectors)
+            index.add(vectors)
+            build_seconds = time.perf_counter() - start
+            path = os.path.join(tmp, f"{index_type}.faiss")
+            faiss.write_index(index, path)
+            del index
+
+            ram_mb = os.path.getsize(path) / (1024 * 1024)
+            before = rss_mb()
+            index = tune_index(faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY))
+
+            ivf = faiss.try_extract_index_ivf(index)
+            for nprobe in args.nprobe if ivf is not None else [None]:
+                if ivf is not None:
+                    ivf.nprobe = nprobe
+                latencies, found = [], []
+                for query in queries:
+                    start = time.perf_counter()
+                    _, ids = index.search(query[None, :], args.k)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    found.append(ids[0])
+                start = time.perf_counter()
+                for ids in found:
+                    for i in ids[ids >= 0]:
+                        index.reconstruct(int(i))
+                reconstruct_ms = (time.perf_counter() - start) * 1000 / len(found)
+                latencies.sort()
+                name = index_type if nprobe is None else f"{index_type} np={nprobe}"
+                print(f"{name:<14} {build_seconds:>8.1f} {recall(found, truth, args.k):>7.3f} "
+                      f"{latencies[len(latencies) // 2]:>7.3f} "
+                      f"{latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:>7.3f} {reconstruct_ms:>9.3f} "
+                      f"{ram_mb * scale:>10.0f} {(rss_mb() - before) * scale:>13.0f}")
+            del index
+
+
+if __name__ == "__main__":
+    main()
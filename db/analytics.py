@@ -0,0 +1,103 @@
+import re
+from db.question_db import QuestionDatabase, normalize_user_id
+
+DAY_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+MAX_PAGE_SIZE = 500
+
+# Group-by choices and the answer_rollups columns they return
+ROLLUPS = {
+    "topic": ("topic",),
+    "user": ("user_id",),
+    "day": ("day",),
+    "user_topic": ("user_id", "topic"),
+    "day_topic": ("day", "topic")
+}
+
+
+class AnalyticsQueries:
+    """
+    Read-only rollups of learner answers. Queries for one learner or
+    grouped by learner read answer_rollups; queries across all learners by
+    topic and day read the much smaller topic_daily table. Both are
+    maintained by QuestionDatabase.record_answer.
+
+    Every query can be narrowed to one learner, one topic and an inclusive
+    range of UTC days (YYYY-MM-DD) and is paginated with limit/offset.
+    """
+
+    def __init__(self, db_path="question_data.db"):
+        self.db = QuestionDatabase(db_path)
+
+    def rollup(self, group_by="topic", user_id=None, topic=None, since=None, until=None,
+               limit=100, offset=0):
+        """
+        Returns {"group_by", "rows", "limit", "offset", "next_offset"}.
+        Each row has the group_by columns plus correct_count, incorrect_count,
+        total_count and accuracy. Rows are ordered by day (newest first) for
+        day groupings and by lowest accuracy otherwise, matching /recommendations.
+        next_offset is None on the last page.
+        """
+        if group_by not in ROLLUPS:
+            raise ValueError(f"group_by must be one of: {', '.join(ROLLUPS)}")
+        for name, value in (("since", since), ("until", until)):
+            if value is not None and not DAY_PATTERN.match(value):
+                raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        offset = max(0, int(offset))
+
+        columns = ROLLUPS[group_by]
+        table = "answer_rollups" if user_id is not None or "user_id" in columns else "topic_daily"
+
+        conditions, params = [], []
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(normalize_user_id(user_id))
+        if topic is not None:
+            conditions.append("topic = ?")
+            params.append(topic)
+        if since is not None:
+            conditions.append("day >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("day <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        group = ", ".join(columns)
+        if "day" in columns:
+            order = f"day DESC{', topic' if 'topic' in columns else ''}"
+        else:
+            order = f"accuracy ASC, {group}"
+
+        # Fetch one extra row to know whether there is another page
+        self.db.cursor.execute(f"""
+            SELECT 
+                {group},
+                SUM(correct_count) as correct_count,
+                SUM(incorrect_count) as incorrect_count,
+                SUM(correct_count + incorrect_count) as total_count,
+                ROUND(SUM(correct_count) * 100.0 / SUM(correct_count + incorrect_count), 2) as accuracy
+            FROM {table}
+            {where}
+            GROUP BY {group}
+            ORDER BY {order}
+            LIMIT ? OFFSET ?
+        """, params + [limit + 1, offset])
+        rows = self.db.cursor.fetchall()
+
+        keys = columns + ("correct_count", "incorrect_count", "total_count", "accuracy")
+        return {
+            "group_by": group_by,
+            "rows": [dict(zip(keys, row)) for row in rows[:limit]],
+            "limit": limit,
+            "offset": offset,
+            "next_offset": offset + limit if len(rows) > limit else None
+        }
+
+    def topic_performance(self, user_id, since=None, until=None):
+        """
+        One learner's per-topic performance in the same shape as
+        QuestionDatabase.get_topic_performance, for /recommendations
+        """
+        result = self.rollup("topic", user_id=user_id, since=since, until=until, limit=MAX_PAGE_SIZE)
+        return result["rows"]
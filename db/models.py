@@ -0,0 +1,91 @@
+import hashlib
+import json
+import re
+import sys
+
+
+def normalize_text(text):
+    """Lowercase, punctuation-free, single-spaced text, for comparing questions"""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", (text or "").lower())).strip()
+
+
+def content_hash(text, correct_answer):
+    """Hash of the normalized question text and correct answer; equal for trivially reworded copies"""
+    content = f"{normalize_text(text)}\n{normalize_text(correct_answer)}"
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def topic_key(topic):
+    """Normalized topic a question was requested for"""
+    return re.sub(r"\s+", " ", (topic or "").lower()).strip()
+
+
+def encode_options(options):
+    """Options as stored in the questions table: a JSON list"""
+    return json.dumps(list(options), ensure_ascii=False)
+
+
+def decode_options(stored):
+    """Options from the questions table; rows written before JSON was used hold "|"-joined text"""
+    if stored.startswith("["):
+        try:
+            options = json.loads(stored)
+        except ValueError:
+            options = None
+        if isinstance(options, list):
+            return [str(option) for option in options]
+    return stored.split("|")
+
+
+class Question:
+    """
+    One multiple-choice question.
+
+    Only the index of the correct option is stored; the answer text and
+    letter are derived from it. Options are kept as a tuple and topic
+    strings are interned, since many questions share the same topic.
+    """
+
+    __slots__ = ("id", "text", "options", "correct_index", "explanation", "topic")
+
+    def __init__(self, text, options, correct_index, explanation="", topic=None, id=None):
+        self.id = id
+        self.text = text
+        self.options = tuple(options)
+        self.correct_index = correct_index
+        self.explanation = explanation
+        self.topic = sys.intern(topic) if topic else None
+
+    @classmethod
+    def from_answer(cls, text, options, correct_answer, explanation="", topic=None, id=None):
+        """Build from the stored answer text; raises ValueError if it is not one of the options"""
+        options = tuple(options)
+        return cls(text, options, options.index(correct_answer), explanation, topic, id)
+
+    @property
+    def correct_answer(self):
+        return self.options[self.correct_index]
+
+    @property
+    def correct_letter(self):
+        return chr(65 + self.correct_index)
+
+    def content_hash(self):
+        return content_hash(self.text, self.correct_answer)
+
+    def to_row(self):
+        """Compact positional form for JSON: [id, text, options, correct_index, explanation, topic]"""
+        return [self.id, self.text, list(self.options), self.correct_index, self.explanation, self.topic]
+
+    @classmethod
+    def from_row(cls, row):
+        question_id, text, options, correct_index, explanation, topic = row
+        return cls(text, options, correct_index, explanation, topic, question_id)
+
+    def __eq__(self, other):
+        if not isinstance(other, Question):
+            return NotImplemented
+        return self.to_row() == other.to_row()
+
+    def __repr__(self):
+        return f"Question(id={self.id!r}, text={self.text[:40]!r}, topic={self.topic!r})"
@@ -1,15 +1,76 @@
 import sqlite3
 import os
+import threading
+from db.models import Question, content_hash, decode_options, encode_options, topic_key as make_topic_key
+from utils import metrics
+
+# Connections are pooled per thread and per database file, so constructing a
+# QuestionDatabase is cheap and no sqlite3 connection is shared across threads
+_local = threading.local()
+_schema_lock = threading.Lock()
+_initialized_paths = set()
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # readers don't block the writer
+    "PRAGMA synchronous=NORMAL",    # safe with WAL, avoids an fsync per commit
+    "PRAGMA busy_timeout=5000",     # wait for other writers instead of failing
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000"      # ~20MB page cache per connection
+)
+
+# Bumped whenever a migration is added to QuestionDatabase.migrate
+SCHEMA_VERSION = 3
+
+# Learner id for answers recorded without one (including all pre-migration history)
+DEFAULT_USER_ID = "anonymous"
+
+def normalize_user_id(user_id):
+    """Trimmed learner id, capped at 64 characters, or DEFAULT_USER_ID when empty"""
+    user_id = (user_id or "").strip()[:64]
+    return user_id or DEFAULT_USER_ID
+
+def get_connection(db_path):
+    """Return this thread's (connection, cursor) for db_path, opening it on first use"""
+    pool = getattr(_local, "connections", None)
+    if pool is None:
+        pool = _local.connections = {}
+        
+    entry = pool.get(db_path)
+    if entry is None:
+        conn = sqlite3.connect(db_path, timeout=5)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        entry = pool[db_path] = (conn, conn.cursor())
+    return entry
+
+def close_connection(db_path):
+    """Close this thread's pooled connection to db_path, if any"""
+    pool = getattr(_local, "connections", {})
+    entry = pool.pop(db_path, None)
+    if entry:
+        entry[0].close()
 
 class QuestionDatabase:
     def __init__(self, db_path="question_data.db"):
-        db_dir = os.path.dirname(db_path)
-        if db_dir and not os.path.exists(db_dir):
-            os.makedirs(db_dir)
-            
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        self.create_tables()
+        self.db_path = db_path
+        
+        # Schema setup runs once per database file per process
+        if db_path not in _initialized_paths:
+            with _schema_lock:
+                if db_path not in _initialized_paths:
+                    db_dir = os.path.dirname(db_path)
+                    if db_dir and not os.path.exists(db_dir):
+                        os.makedirs(db_dir)
+                    self.create_tables()
+                    _initialized_paths.add(db_path)
+    
+    @property
+    def conn(self):
+        return get_connection(self.db_path)[0]
+    
+    @property
+    def cursor(self):
+        return get_connection(self.db_path)[1]
     
     def create_tables(self):
         self.cursor.execute('''
@@ -35,10 +96,162 @@ class QuestionDatabase:
             FOREIGN KEY (question_id) REFERENCES questions (id)
         )
         ''')
+        
+        # Pre-generated questions that no session has been served yet
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS question_bank (
+            question_id INTEGER PRIMARY KEY,
+            topic_key TEXT NOT NULL,
+            FOREIGN KEY (question_id) REFERENCES questions (id)
+        )
+        ''')
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_question_bank_topic ON question_bank (topic_key)")
         self.conn.commit()
+        self.migrate()
+    
+    def migrate(self):
+        """
+        Brings an existing database file up to SCHEMA_VERSION.
+        The version is kept in PRAGMA user_version and checked inside an
+        immediate transaction so concurrent processes only migrate once.
+        """
+        self.cursor.execute("BEGIN IMMEDIATE")
+        try:
+            version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                self._migrate_topic_stats()
+            if version < 2:
+                self._migrate_learner_rollups()
+            if version < 3:
+                self._migrate_question_dedup()
+            if version < SCHEMA_VERSION:
+                self.cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+    
+    def _migrate_topic_stats(self):
+        """Version 1: lookup indexes and the per-topic answer totals behind get_topic_performance"""
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_answers_question ON user_answers (question_id, is_correct)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions (topic)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_questions_session ON questions (session_id)")
+        
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS topic_stats (
+            topic TEXT PRIMARY KEY,
+            correct_count INTEGER NOT NULL DEFAULT 0,
+            incorrect_count INTEGER NOT NULL DEFAULT 0,
+            total_count INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        
+        # Backfill from the answers recorded before the table existed
+        self._rebuild_topic_stats()
+    
+    def _rebuild_topic_stats(self):
+        self.cursor.execute("DELETE FROM topic_stats")
+        self.cursor.execute("""
+            INSERT INTO topic_stats (topic, correct_count, incorrect_count, total_count)
+            SELECT 
+                IFNULL(q.topic, ''),
+                SUM(CASE WHEN ua.is_correct THEN 1 ELSE 0 END),
+                SUM(CASE WHEN ua.is_correct = 0 THEN 1 ELSE 0 END),
+                COUNT(*)
+            FROM questions q
+            JOIN user_answers ua ON q.id = ua.question_id
+            GROUP BY IFNULL(q.topic, '')
+        """)
+    
+    def _migrate_learner_rollups(self):
+        """Version 2: learner ids on sessions and answers, plus daily totals per topic with and without the learner"""
+        columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(user_answers)")]
+        if "user_id" not in columns:
+            self.cursor.execute("ALTER TABLE user_answers ADD COLUMN user_id TEXT")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_answers_user ON user_answers (user_id, answered_at)")
+        
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS practice_sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            topic TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_practice_sessions_user ON practice_sessions (user_id, created_at)")
+        
+        # One row per learner, UTC day and topic. The primary key serves
+        # per-learner queries and the covering index serves per-topic
+        # queries across learners without touching the table.
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS answer_rollups (
+            user_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            correct_count INTEGER NOT NULL DEFAULT 0,
+            incorrect_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, topic)
+        ) WITHOUT ROWID
+        ''')
+        self.cursor.execute("""CREATE INDEX IF NOT EXISTS idx_answer_rollups_topic
+            ON answer_rollups (topic, day, user_id, correct_count, incorrect_count)""")
+        
+        # The same totals without the learner, for queries across all learners
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS topic_daily (
+            day TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            correct_count INTEGER NOT NULL DEFAULT 0,
+            incorrect_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, topic)
+        ) WITHOUT ROWID
+        ''')
+        self._rebuild_rollups()
+    
+    def _rebuild_rollups(self):
+        self.cursor.execute("DELETE FROM answer_rollups")
+        self.cursor.execute("""
+            INSERT INTO answer_rollups (user_id, day, topic, correct_count, incorrect_count)
+            SELECT 
+                IFNULL(ua.user_id, ?),
+                date(ua.answered_at),
+                IFNULL(q.topic, ''),
+                SUM(CASE WHEN ua.is_correct THEN 1 ELSE 0 END),
+                SUM(CASE WHEN ua.is_correct = 0 THEN 1 ELSE 0 END)
+            FROM user_answers ua
+            JOIN questions q ON q.id = ua.question_id
+            GROUP BY 1, 2, 3
+        """, (DEFAULT_USER_ID,))
+        self.cursor.execute("DELETE FROM topic_daily")
+        self.cursor.execute("""
+            INSERT INTO topic_daily (day, topic, correct_count, incorrect_count)
+            SELECT day, topic, SUM(correct_count), SUM(incorrect_count)
+            FROM answer_rollups
+            GROUP BY day, topic
+        """)
+    
+    def _migrate_question_dedup(self):
+        """Version 3: normalized content hash and generation topic on questions, for duplicate detection"""
+        columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(questions)")]
+        if "content_hash" not in columns:
+            self.cursor.execute("ALTER TABLE questions ADD COLUMN content_hash TEXT")
+        if "topic_key" not in columns:
+            self.cursor.execute("ALTER TABLE questions ADD COLUMN topic_key TEXT")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_questions_dedup ON questions (topic_key, content_hash)")
+    
+    def rebuild_aggregates(self):
+        """Recompute topic_stats and the daily rollups from user_answers, e.g. after questions were merged"""
+        self.cursor.execute("BEGIN IMMEDIATE")
+        try:
+            self._rebuild_topic_stats()
+            self._rebuild_rollups()
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
     
     def add_question(self, session_id, question, options, correct_answer, topic, explanation=""):
-        options_str = "|".join(options)
+        options_str = encode_options(options)
         self.cursor.execute(
             """INSERT INTO questions 
                (session_id, question_text, options, correct_answer, topic, explanation) 
@@ -48,28 +261,238 @@ class QuestionDatabase:
         self.conn.commit()
         return self.cursor.lastrowid
         
-    def record_answer(self, question_id, user_answer, is_correct):
+    @metrics.span("db.add_questions")
+    def add_questions(self, session_id, questions, topic_key=None):
+        """
+        Inserts several Question objects in a single transaction
+        topic_key is the normalized topic they were generated for, used to find duplicates later
+        Sets each question's id and returns the new ids in the same order
+        """
+        ids = []
+        try:
+            for q in questions:
+                self.cursor.execute(
+                    """INSERT INTO questions 
+                       (session_id, question_text, options, correct_answer, topic, explanation, content_hash, topic_key) 
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (session_id, q.text, encode_options(q.options), q.correct_answer, q.topic, q.explanation,
+                     q.content_hash(), topic_key)
+                )
+                ids.append(self.cursor.lastrowid)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        for q, question_id in zip(questions, ids):
+            q.id = question_id
+        return ids
+        
+    @metrics.span("db.add_session")
+    def add_session(self, session_id, user_id, topic):
         self.cursor.execute(
-            "INSERT INTO user_answers (question_id, user_answer, is_correct) VALUES (?, ?, ?)",
-            (question_id, user_answer, is_correct)
+            "INSERT OR IGNORE INTO practice_sessions (session_id, user_id, topic) VALUES (?, ?, ?)",
+            (session_id, normalize_user_id(user_id), topic)
         )
         self.conn.commit()
         
+    @metrics.span("db.record_answer")
+    def record_answer(self, question_id, user_answer, is_correct, user_id=None):
+        if question_id is None:
+            # The topic totals and rollups join on the question, so the answer would be lost from them
+            raise ValueError("Cannot record an answer to a question that has not been saved")
+        user_id = normalize_user_id(user_id)
+        correct, incorrect = (1, 0) if is_correct else (0, 1)
+        try:
+            self.cursor.execute(
+                "INSERT INTO user_answers (question_id, user_answer, is_correct, user_id) VALUES (?, ?, ?, ?)",
+                (question_id, user_answer, is_correct, user_id)
+            )
+            # Keep the topic totals in step with user_answers in the same transaction
+            self.cursor.execute("""
+                INSERT INTO topic_stats (topic, correct_count, incorrect_count, total_count)
+                SELECT IFNULL(topic, ''), ?, ?, 1 FROM questions WHERE id = ?
+                ON CONFLICT (topic) DO UPDATE SET
+                    correct_count = correct_count + excluded.correct_count,
+                    incorrect_count = incorrect_count + excluded.incorrect_count,
+                    total_count = total_count + 1
+            """, (correct, incorrect, question_id))
+            self.cursor.execute("""
+                INSERT INTO answer_rollups (user_id, day, topic, correct_count, incorrect_count)
+                SELECT ?, date('now'), IFNULL(topic, ''), ?, ? FROM questions WHERE id = ?
+                ON CONFLICT (user_id, day, topic) DO UPDATE SET
+                    correct_count = correct_count + excluded.correct_count,
+                    incorrect_count = incorrect_count + excluded.incorrect_count
+            """, (user_id, correct, incorrect, question_id))
+            self.cursor.execute("""
+                INSERT INTO topic_daily (day, topic, correct_count, incorrect_count)
+                SELECT date('now'), IFNULL(topic, ''), ?, ? FROM questions WHERE id = ?
+                ON CONFLICT (day, topic) DO UPDATE SET
+                    correct_count = correct_count + excluded.correct_count,
+                    incorrect_count = incorrect_count + excluded.incorrect_count
+            """, (correct, incorrect, question_id))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+    def get_questions_for_topic(self, topic_key, limit):
+        """
+        The newest stored questions generated for topic_key
+        Returns (id, question_text, correct_answer, content_hash) rows
+        """
+        self.cursor.execute("""
+            SELECT id, question_text, correct_answer, content_hash FROM questions
+            WHERE topic_key = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (topic_key, limit))
+        return self.cursor.fetchall()
+        
+    def get_question_topic_keys(self):
+        self.cursor.execute("SELECT DISTINCT topic_key FROM questions WHERE topic_key IS NOT NULL")
+        return [row[0] for row in self.cursor.fetchall()]
+        
+    def backfill_dedup_keys(self):
+        """
+        Fills content_hash and topic_key for questions stored before they existed.
+        The topic is taken from the question bank or the practice session the
+        question was generated for, falling back to the question's own topic.
+        Returns the number of questions updated
+        """
+        self.cursor.execute("""
+            SELECT q.id, q.question_text, q.correct_answer, q.topic, b.topic_key, s.topic
+            FROM questions q
+            LEFT JOIN question_bank b ON b.question_id = q.id
+            LEFT JOIN practice_sessions s ON s.session_id = q.session_id
+            WHERE q.content_hash IS NULL OR q.topic_key IS NULL
+        """)
+        updates = [
+            (content_hash(text, answer), bank_key or make_topic_key(session_topic or topic), question_id)
+            for question_id, text, answer, topic, bank_key, session_topic in self.cursor.fetchall()
+        ]
+        self.cursor.executemany("UPDATE questions SET content_hash = ?, topic_key = ? WHERE id = ?", updates)
+        self.conn.commit()
+        return len(updates)
+        
+    def merge_questions(self, merges):
+        """
+        Folds duplicate questions into the question they duplicate
+        merges maps duplicate id -> kept id; answers are moved to the kept
+        question and the duplicates are removed from questions and the bank
+        """
+        pairs = list(merges.items())
+        self.cursor.execute("BEGIN IMMEDIATE")
+        try:
+            self.cursor.executemany(
+                "UPDATE user_answers SET question_id = ? WHERE question_id = ?",
+                [(kept, duplicate) for duplicate, kept in pairs]
+            )
+            self.cursor.executemany("DELETE FROM question_bank WHERE question_id = ?", [(d,) for d, _ in pairs])
+            self.cursor.executemany("DELETE FROM questions WHERE id = ?", [(d,) for d, _ in pairs])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+    @metrics.span("db.add_to_bank")
+    def add_to_bank(self, question_ids, topic_key):
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO question_bank (question_id, topic_key) VALUES (?, ?)",
+            [(question_id, topic_key) for question_id in question_ids]
+        )
+        self.conn.commit()
+        
+    def claim_questions(self, question_ids, session_id):
+        """
+        Mark stored questions as given to session_id: they leave the bank and
+        count as served, so no other session is handed them from stock
+        """
+        if not question_ids:
+            return
+        self.cursor.execute("BEGIN IMMEDIATE")
+        try:
+            self.cursor.executemany("DELETE FROM question_bank WHERE question_id = ?", [(i,) for i in question_ids])
+            self.cursor.executemany(
+                "UPDATE questions SET session_id = ? WHERE id = ? AND session_id IS NULL",
+                [(session_id, i) for i in question_ids]
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+    def unserved_question_ids(self, question_ids):
+        """The ids in question_ids that were never given to a practice session"""
+        served = set()
+        for start in range(0, len(question_ids), 500):
+            chunk = question_ids[start:start + 500]
+            self.cursor.execute(
+                f"SELECT id FROM questions WHERE session_id IS NOT NULL AND id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            served.update(row[0] for row in self.cursor.fetchall())
+        return [question_id for question_id in question_ids if question_id not in served]
+        
+    def count_bank_questions(self, topic_key):
+        self.cursor.execute("SELECT COUNT(*) FROM question_bank WHERE topic_key = ?", (topic_key,))
+        return self.cursor.fetchone()[0]
+        
+    @metrics.span("db.claim_bank_questions")
+    def claim_bank_questions(self, topic_key, session_id, limit):
+        """
+        Takes up to limit banked questions for a topic and assigns them to session_id.
+        Runs in one immediate transaction so two workers never serve the same question.
+        Returns a list of Question objects; rows whose correct answer is not one of
+        their options are claimed but skipped
+        """
+        self.cursor.execute("BEGIN IMMEDIATE")
+        try:
+            self.cursor.execute("""
+                SELECT q.id, q.question_text, q.options, q.correct_answer, q.explanation, q.topic
+                FROM question_bank b
+                JOIN questions q ON q.id = b.question_id
+                WHERE b.topic_key = ?
+                ORDER BY b.question_id
+                LIMIT ?
+            """, (topic_key, limit))
+            rows = self.cursor.fetchall()
+            
+            ids = [(row[0],) for row in rows]
+            self.cursor.executemany("DELETE FROM question_bank WHERE question_id = ?", ids)
+            self.cursor.executemany(
+                "UPDATE questions SET session_id = ? WHERE id = ?",
+                [(session_id, row[0]) for row in rows]
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+        questions = []
+        for row in rows:
+            try:
+                questions.append(Question.from_answer(row[1], decode_options(row[2]), row[3], row[4], row[5], row[0]))
+            except ValueError:
+                print(f"Skipping stored question {row[0]}: correct answer is not one of its options")
+        return questions
+        
+    @metrics.span("db.get_topic_performance")
     def get_topic_performance(self):
         """
         Retrieves user performance data grouped by topics
         Returns a list of dictionaries with topic, correct_count, incorrect_count, and accuracy
+        Reads the topic_stats totals maintained by record_answer, so the cost
+        depends on the number of topics rather than the number of answers
         """
         self.cursor.execute("""
             SELECT 
-                q.topic, 
-                SUM(CASE WHEN ua.is_correct THEN 1 ELSE 0 END) as correct_count,
-                SUM(CASE WHEN ua.is_correct = 0 THEN 1 ELSE 0 END) as incorrect_count,
-                COUNT(*) as total_count,
-                ROUND(SUM(CASE WHEN ua.is_correct THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as accuracy
-            FROM questions q
-            JOIN user_answers ua ON q.id = ua.question_id
-            GROUP BY q.topic
+                topic, 
+                correct_count,
+                incorrect_count,
+                total_count,
+                ROUND(correct_count * 100.0 / total_count, 2) as accuracy
+            FROM topic_stats
+            WHERE total_count > 0
             ORDER BY accuracy ASC
         """)
         
@@ -86,4 +509,4 @@ class QuestionDatabase:
         return results
     
     def close(self):
-        self.conn.close()
\ No newline at end of file
+        close_connection(self.db_path)
\ No newline at end of file
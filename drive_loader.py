@@ -1,21 +1,235 @@
-from pydrive.auth import GoogleAuth
-from pydrive.drive import GoogleDrive
+import hashlib
+import json
 import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 
-def fetch_files_from_drive(folder_id: str, download_dir: str = "docs"):
-    gauth = GoogleAuth()
-    gauth.CommandLineAuth()  # 🔄 Use this instead of LocalWebserverAuth
-    drive = GoogleDrive(gauth)
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".docx")
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+MANIFEST_NAME = ".drive_manifest.json"
+DOWNLOAD_WORKERS = int(os.getenv("DRIVE_DOWNLOAD_WORKERS", "4"))
 
+
+class GoogleDriveBackend:
+    """Lists and downloads files from Google Drive through PyDrive"""
+
+    def __init__(self):
+        from pydrive.auth import GoogleAuth
+        from pydrive.drive import GoogleDrive
+
+        self._GoogleAuth = GoogleAuth
+        self._GoogleDrive = GoogleDrive
+        self.gauth = GoogleAuth()
+        self.gauth.CommandLineAuth()  # 🔄 Use this instead of LocalWebserverAuth
+        self.drive = GoogleDrive(self.gauth)
+        self._local = threading.local()
+
+    def _thread_drive(self):
+        # httplib2 connections are not thread-safe, so every download thread
+        # gets its own authorized client sharing the same credentials
+        drive = getattr(self._local, "drive", None)
+        if drive is None:
+            gauth = self._GoogleAuth()
+            gauth.credentials = self.gauth.credentials
+            gauth.Authorize()
+            drive = self._GoogleDrive(gauth)
+            self._local.drive = drive
+        return drive
+
+    def list_files(self, folder_id, prefix=""):
+        """Recursively list files under folder_id, following every result page"""
+        files = []
+        query = {'q': f"'{folder_id}' in parents and trashed=false", 'maxResults': 1000}
+        for page in self.drive.ListFile(query):
+            for item in page:
+                rel_path = os.path.join(prefix, _safe_name(item['title']))
+                if item['mimeType'] == FOLDER_MIME_TYPE:
+                    files.extend(self.list_files(item['id'], rel_path))
+                else:
+                    files.append({
+                        "id": item['id'],
+                        "path": rel_path,
+                        "modified": item.get('modifiedDate'),
+                        "md5": item.get('md5Checksum')
+                    })
+        return files
+
+    def download(self, file_info, dest_path):
+        drive_file = self._thread_drive().CreateFile({'id': file_info["id"]})
+        drive_file.GetContentFile(dest_path)
+
+
+class LocalDirectoryBackend:
+    """Serves files from a local directory, for offline deployments and testing"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def list_files(self, folder_id=None):
+        base = os.path.join(self.root, folder_id) if folder_id else self.root
+        files = []
+        for dirpath, _, filenames in os.walk(base):
+            for name in sorted(filenames):
+                full_path = os.path.join(dirpath, name)
+                rel_path = os.path.relpath(full_path, base)
+                mtime = os.path.getmtime(full_path)
+                files.append({
+                    "id": rel_path,
+                    "path": rel_path,
+                    "modified": datetime.fromtimestamp(mtime, timezone.utc).isoformat(),
+                    "md5": _file_md5(full_path),
+                    "source": full_path
+                })
+        return files
+
+    def download(self, file_info, dest_path):
+        shutil.copyfile(file_info["source"], dest_path)
+
+
+def _safe_name(title):
+    """A Drive title as a single path component: titles may contain "/" or be ".." """
+    name = title.replace("/", "_").replace("\\", "_").strip()
+    if name.strip(".") == "":
+        name = name.replace(".", "_") or "_"
+    return name
+
+
+def _local_path(download_dir, rel_path):
+    """rel_path inside download_dir, or None if it would point outside it"""
+    root = os.path.abspath(download_dir)
+    path = os.path.abspath(os.path.join(root, rel_path))
+    if os.path.commonpath([root, path]) != root or path == root:
+        return None
+    return os.path.join(download_dir, os.path.relpath(path, root))
+
+
+def _disambiguate(remote_files, manifest):
+    """
+    Give files with the same path (same title in one folder) distinct paths:
+    all but one get their id added to the name. The one the manifest already
+    has at that path keeps it, so repeated syncs don't swap them.
+    """
+    by_path = {}
+    for file_info in remote_files:
+        by_path.setdefault(os.path.normcase(file_info["path"]), []).append(file_info)
+    for group in by_path.values():
+        if len(group) < 2:
+            continue
+        group.sort(key=lambda f: (manifest.get(f["id"], {}).get("path") != f["path"], f["id"]))
+        for file_info in group[1:]:
+            stem, ext = os.path.splitext(file_info["path"])
+            file_info["path"] = f"{stem} ({_safe_name(file_info['id'])}){ext}"
+
+
+def _file_md5(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_backend():
+    """Pick the storage backend from DRIVE_BACKEND ("google" or "local")"""
+    if os.getenv("DRIVE_BACKEND", "google") == "local":
+        return LocalDirectoryBackend(os.getenv("LOCAL_DOCS_DIR", "local_docs"))
+    return GoogleDriveBackend()
+
+
+def _load_manifest(download_dir):
+    path = os.path.join(download_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(download_dir, manifest):
+    path = os.path.join(download_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _is_unchanged(entry, file_info, local_path):
+    if not entry or entry["path"] != file_info["path"] or not os.path.exists(local_path):
+        return False
+    # Google Docs exports have no md5Checksum, fall back to modifiedDate
+    if file_info.get("md5"):
+        return entry.get("md5") == file_info["md5"]
+    return entry.get("modified") == file_info.get("modified")
+
+
+def fetch_files_from_drive(folder_id: str, download_dir: str = "docs", backend=None, max_workers=DOWNLOAD_WORKERS):
+    """
+    Sync supported files from a Drive folder (and its subfolders) into download_dir.
+    Files with the same title in one folder are kept apart by adding the
+    file id to the name of all but one.
+
+    Files whose md5Checksum/modifiedDate match the local manifest are not
+    downloaded again, and the manifest is saved after every completed file so
+    an interrupted sync resumes where it stopped. Returns the local paths of
+    all current files.
+    """
+    backend = backend or get_backend()
     os.makedirs(download_dir, exist_ok=True)
 
-    file_list = drive.ListFile({'q': f"'{folder_id}' in parents and trashed=false"}).GetList()
-    downloaded_files = []
+    manifest = _load_manifest(download_dir)
+    remote_files = [f for f in backend.list_files(folder_id) if f["path"].endswith(SUPPORTED_EXTENSIONS)]
+    _disambiguate(remote_files, manifest)
+
+    local_paths = []
+    to_download = []
+    for file_info in remote_files:
+        local_path = _local_path(download_dir, file_info["path"])
+        if local_path is None:
+            print(f"Skipping {file_info['path']}: path is outside {download_dir}")
+            continue
+        local_paths.append(local_path)
+        if not _is_unchanged(manifest.get(file_info["id"]), file_info, local_path):
+            to_download.append((file_info, local_path))
+
+    # Drop files that were removed from Drive since the last sync, and old copies of renamed ones
+    remote_paths = {f["id"]: f["path"] for f in remote_files}
+    for file_id in list(manifest):
+        old_path = manifest[file_id]["path"]
+        if remote_paths.get(file_id) == old_path:
+            continue
+        if file_id not in remote_paths:
+            del manifest[file_id]
+        stale_path = _local_path(download_dir, old_path)
+        if stale_path and os.path.exists(stale_path) and stale_path not in local_paths:
+            os.remove(stale_path)
+
+    lock = threading.Lock()
+
+    def download(file_info, local_path):
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        tmp_path = local_path + ".part"
+        backend.download(file_info, tmp_path)
+        os.replace(tmp_path, local_path)
+        with lock:
+            manifest[file_info["id"]] = {
+                "path": file_info["path"],
+                "modified": file_info.get("modified"),
+                "md5": file_info.get("md5")
+            }
+            _save_manifest(download_dir, manifest)
 
-    for file in file_list:
-        if file['title'].endswith((".pdf", ".txt", ".docx")):
-            file_path = os.path.join(download_dir, file['title'])
-            file.GetContentFile(file_path)
-            downloaded_files.append(file_path)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(download, info, path): info for info, path in to_download}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error downloading {futures[future]['path']}: {e}")
 
-    return downloaded_files
+    _save_manifest(download_dir, manifest)
+    print(f"Drive sync: {len(to_download)} downloaded, {len(local_paths) - len(to_download)} unchanged")
+    return [path for path in local_paths if os.path.exists(path)]
@@ -0,0 +1,197 @@
+import asyncio
+import functools
+import threading
+import time
+from langchain.agents import initialize_agent
+from langchain.agents.agent_types import AgentType
+from drive_loader import fetch_files_from_drive
+from rag_tool import (
+    load_or_update_vectorstore, build_qa_chain, build_rag_tool, build_retriever, get_embeddings, INDEX_DIR
+)
+from utils.hybrid_retriever import BM25Index
+from tools.practice_tool import create_practice_tool
+from tools.question_bank import QuestionBank
+from tools.question_dedup import QuestionDeduplicator
+from utils.answer_cache import AnswerCache
+from utils.index_manifest import IndexManifest
+from utils.query_router import QueryRouter
+from utils.llm_cache import get_llm_cache
+from utils.llm_clients import make_chat_llm
+from utils import metrics
+from utils.streaming import AsyncTokenCallbackHandler, TokenCallbackHandler
+
+
+class RAGService:
+    """
+    Owns the LLM, the document index and the agent.
+
+    Nothing heavy happens on construction: start() builds everything on a
+    background thread so the web app can serve requests (and report progress
+    on /health) while the index warms up.
+    """
+
+    def __init__(self, folder_id, session_store=None):
+        self.folder_id = folder_id
+        self.session_store = session_store
+        self.status = "idle"
+        self.stage = None
+        self.progress = {"done": 0, "total": 0}
+        self.error = None
+        self.started_at = None
+        self.ready_at = None
+
+        self.llm = None
+        self.quiz_llm = None  # uncached, so repeated quizzes on a topic get new questions
+        self.qa_chain = None
+        self.rag_tool = None
+        self.vectorstore = None
+        self.bm25 = None
+        self.agent = None
+        self.router = None
+        self.question_bank = None
+        self.index_version = None
+        self.answer_cache = AnswerCache()
+        self.question_dedup = QuestionDeduplicator()
+
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start building in the background; calling it again is a no-op"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.status = "starting"
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._build, name="rag-warmup", daemon=True)
+            self._thread.start()
+
+    def _report(self, stage, done, total):
+        self.stage = stage
+        self.progress = {"done": done, "total": total}
+
+    def _build(self):
+        try:
+            self.status = "indexing"
+            llm = make_chat_llm(temperature=0.7, streaming=True)
+            quiz_llm = make_chat_llm(temperature=0.7, streaming=True, cache=False)
+            self._report("fetching", 0, 0)
+            with metrics.span("drive_fetch"):
+                files = fetch_files_from_drive(self.folder_id)
+            with metrics.span("index_load"):
+                vectorstore = load_or_update_vectorstore(files, progress=self._report)
+            self._report("keyword index", 0, 0)
+            bm25 = BM25Index.from_vectorstore(vectorstore)
+            qa_chain = build_qa_chain(vectorstore, llm, bm25=bm25)
+            rag_tool = build_rag_tool(qa_chain)
+
+            self._report("agent", 0, 0)
+            practice_tool = create_practice_tool(quiz_llm, self.session_store)
+            agent = initialize_agent(
+                [rag_tool, practice_tool],
+                llm,
+                agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+                verbose=True
+            )
+
+            # Cached answers are only valid for the documents they came from
+            self.index_version = IndexManifest.load(INDEX_DIR).fingerprint()
+            self.answer_cache.embeddings = get_embeddings()
+            self.question_dedup.embeddings = get_embeddings()
+
+            self.llm = llm
+            self.quiz_llm = quiz_llm
+            self.qa_chain = qa_chain
+            self.rag_tool = rag_tool
+            self.vectorstore = vectorstore
+            self.bm25 = bm25
+            self.agent = agent
+            self.router = QueryRouter(qa_chain, agent)
+            self.question_bank = QuestionBank(
+                lambda: self.retriever(k=5), quiz_llm, dedup=self.question_dedup
+            )
+            self.stage = None
+            self.status = "ready"
+            self.ready_at = time.time()
+            self._ready.set()
+        except Exception as e:
+            print(f"Error building RAG index: {e}")
+            self.error = str(e)
+            self.status = "error"
+
+    def retriever(self, k):
+        """A retriever over the loaded index returning k chunks"""
+        return build_retriever(self.vectorstore, k, self.bm25)
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def ask(self, question, on_token=None):
+        """
+        Answer an "ask" mode question, returning (answer, timing); on_token
+        receives streamed tokens. Only document answers (the direct route)
+        are cached: agent replies such as practice feedback depend on state.
+        """
+        cacheable = self.router.route(question) == "direct"
+        vector = None
+        if cacheable:
+            answer, vector = self.answer_cache.get(question, self.index_version)
+            if answer is not None:
+                return answer, {"route": "cache", "llm_calls": 0}
+
+        stream_handler = TokenCallbackHandler(on_token) if on_token else None
+        answer, timing = self.router.run(question, stream_handler=stream_handler)
+        if cacheable and timing["route"] == "direct":
+            self.answer_cache.put(question, answer, self.index_version, vector)
+        return answer, timing
+
+    async def aask(self, question, on_token=None):
+        """Async version of ask() for the ASGI app"""
+        loop = asyncio.get_running_loop()
+        cacheable = self.router.route(question) == "direct"
+        vector = None
+        if cacheable:
+            # Cache lookups embed the question on the CPU, keep that off the event loop
+            answer, vector = await loop.run_in_executor(
+                None, self.answer_cache.get, question, self.index_version
+            )
+            if answer is not None:
+                return answer, {"route": "cache", "llm_calls": 0}
+
+        stream_handler = AsyncTokenCallbackHandler(on_token) if on_token else None
+        answer, timing = await self.router.arun(question, stream_handler=stream_handler)
+        if cacheable and timing["route"] == "direct":
+            await loop.run_in_executor(
+                None, functools.partial(self.answer_cache.put, question, answer, self.index_version, vector)
+            )
+        return answer, timing
+
+    def health(self):
+        """Status snapshot for the /health endpoint"""
+        info = {
+            "status": self.status,
+            "ready": self.is_ready,
+            "stage": self.stage,
+            "progress": self.progress
+        }
+        if self.error:
+            info["error"] = self.error
+        if self.is_ready:
+            info["answer_cache"] = self.answer_cache.stats()
+            info["router"] = self.router.stats()
+            info["question_bank"] = self.question_bank.stats()
+            info["question_dedup"] = self.question_dedup.stats()
+            llm_cache = get_llm_cache()
+            if llm_cache is not None:
+                info["llm_cache"] = llm_cache.stats()
+        if self.session_store is not None:
+            info["sessions"] = self.session_store.stats()
+        if self.started_at:
+            end = self.ready_at or time.time()
+            info["warmup_seconds"] = round(end - self.started_at, 2)
+        return info
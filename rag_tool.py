@@ -1,48 +1,278 @@
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from drive_loader import fetch_files_from_drive
 from langchain_community.document_loaders import PyPDFLoader, TextLoader, UnstructuredWordDocumentLoader
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain.chains import RetrievalQA
-from langchain_community.chat_models import ChatOpenAI
 from langchain.tools import Tool
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from utils.index_manifest import IndexManifest
+from utils.embedding_cache import EmbeddingCache, CachedEmbeddings
+from utils.hybrid_retriever import BM25Index, CrossEncoderReranker, HybridRetriever
+from utils.vector_index import (
+    INDEX_MMAP, INDEX_TRAIN_SIZE, INDEX_TYPE, build_index_vectorstore, delete_chunks, load_vectorstore,
+    needs_training
+)
+from utils.llm_clients import make_chat_llm
+from utils import metrics
 
-def load_documents(file_paths):
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", "faiss_index")
+CHUNK_SIZE = int(os.getenv("RAG_CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "150"))
+INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+RETRIEVER = os.getenv("RAG_RETRIEVER", "hybrid")  # "hybrid" (BM25 + vectors) or "vector"
+TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+FETCH_K = int(os.getenv("RAG_FETCH_K", "20"))  # candidates taken from each index before fusion
+RERANKER = os.getenv("RAG_RERANKER", "cross-encoder")  # or "none"
+RERANK_MODEL = os.getenv("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RAG_RERANK_CANDIDATES", "10"))
+
+_embeddings = None
+_reranker = None
+
+def get_embeddings():
+    """Shared embedding model, backed by the on-disk embedding cache"""
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = CachedEmbeddings(HuggingFaceEmbeddings(), EmbeddingCache())
+    return _embeddings
+
+def get_reranker():
+    """Shared cross-encoder reranker, or None when RAG_RERANKER=none"""
+    global _reranker
+    if RERANKER == "none":
+        return None
+    if _reranker is None:
+        _reranker = CrossEncoderReranker(RERANK_MODEL)
+    return _reranker
+
+def load_file(path):
+    """Parse a single PDF, TXT or DOCX file into page-level documents"""
+    if path.endswith(".pdf"):
+        return PyPDFLoader(path).load()
+    elif path.endswith(".txt"):
+        return TextLoader(path).load()
+    elif path.endswith(".docx"):
+        return UnstructuredWordDocumentLoader(path).load()
+    return []
+
+def split_documents(docs, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return splitter.split_documents(docs)
+
+def _parse_and_split(path, chunk_size, chunk_overlap):
+    # Runs inside a worker process, so it must stay a module-level function;
+    # the parse time is returned for the parent to record
+    start = time.perf_counter()
+    try:
+        return path, split_documents(load_file(path), chunk_size, chunk_overlap), time.perf_counter() - start
+    except Exception as e:
+        print(f"Error parsing {path}: {e}")
+        return path, [], time.perf_counter() - start
+
+def _parsed(result):
+    path, chunks, seconds = result
+    metrics.observe("parse", seconds)
+    return path, chunks
+
+def _worker_context():
+    """
+    Start parse workers from a clean process rather than forking this one:
+    the index is built on a background thread of a process that holds SQLite
+    connections, faiss and HTTP pools, and forking it can deadlock the
+    children. The fork server has this module imported already, so workers
+    start fast.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+def iter_file_chunks(file_paths, workers=INGEST_WORKERS, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Parse and split files in a process pool, yielding (path, chunks) as each file finishes.
+
+    At most two files per worker are in flight at once, so memory use depends
+    on the number of workers rather than on the size of the corpus.
+    """
+    file_paths = list(file_paths)
+    if workers <= 1 or len(file_paths) <= 1:
+        for path in file_paths:
+            yield _parsed(_parse_and_split(path, chunk_size, chunk_overlap))
+        return
+
+    pending_paths = iter(file_paths)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context()) as executor:
+        in_flight = set()
+        for path in pending_paths:
+            in_flight.add(executor.submit(_parse_and_split, path, chunk_size, chunk_overlap))
+            if len(in_flight) >= workers * 2:
+                break
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                next_path = next(pending_paths, None)
+                if next_path is not None:
+                    in_flight.add(executor.submit(_parse_and_split, next_path, chunk_size, chunk_overlap))
+                yield _parsed(future.result())
+
+def iter_chunk_batches(file_paths, batch_size=EMBED_BATCH_SIZE, **kwargs):
+    """Yield lists of at most batch_size chunks, streamed from iter_file_chunks"""
+    batch = []
+    for _, chunks in iter_file_chunks(file_paths, **kwargs):
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def load_documents(file_paths, **kwargs):
+    """Parse and split all files into retrieval-sized chunks"""
     docs = []
-    for path in file_paths:
-        if path.endswith(".pdf"):
-            docs.extend(PyPDFLoader(path).load())
-        elif path.endswith(".txt"):
-            docs.extend(TextLoader(path).load())
-        elif path.endswith(".docx"):
-            docs.extend(UnstructuredWordDocumentLoader(path).load())
+    for _, chunks in iter_file_chunks(file_paths, **kwargs):
+        docs.extend(chunks)
     return docs
 
-def build_vectorstore(documents):
-    embeddings = HuggingFaceEmbeddings()
-    return FAISS.from_documents(documents, embeddings)
+def build_vectorstore(documents, embeddings=None, ids=None, index_type=INDEX_TYPE):
+    """
+    Vector store over documents using a RAG_INDEX_TYPE index: "flat" is exact
+    float32 search; ivf, ivfpq, hnsw, pq and sq8 trade a little recall for
+    speed and/or memory (see utils/vector_index.py)
+    """
+    embeddings = embeddings or get_embeddings()
+    if index_type == "flat":
+        return FAISS.from_documents(documents, embeddings, ids=ids)
+    return build_index_vectorstore(documents, embeddings, ids, index_type)
+
+def load_or_update_vectorstore(file_paths, index_dir=INDEX_DIR, progress=None):
+    """
+    Load the FAISS index persisted in index_dir and bring it in line with file_paths.
 
-def build_rag_tool_from_drive(folder_id: str, return_vectorstore=False):
-    files = fetch_files_from_drive(folder_id)
-    docs = load_documents(files)
-    vectordb = build_vectorstore(docs)
+    Only files that are new or whose content changed since the last run are
+    parsed and embedded; chunks of changed or deleted files are removed.
+    progress, if given, is called as progress(stage, done, total).
 
-    llm = ChatOpenAI(
-    model_name="llama3-70b-8192",
-    temperature=0.7
+    An index that needs no changes is memory-mapped (RAG_INDEX_MMAP) rather
+    than read into RAM; an updated one is saved and then mapped the same way.
+    """
+    progress = progress or (lambda stage, done, total: None)
+    embeddings = get_embeddings()
+    manifest = IndexManifest.load(
+        index_dir, embeddings.model_name, chunking=[CHUNK_SIZE, CHUNK_OVERLAP], index_type=INDEX_TYPE
     )
-    
-    qa = RetrievalQA.from_chain_type(
+
+    has_index = bool(manifest.files) and os.path.exists(os.path.join(index_dir, "index.faiss"))
+    if not has_index:
+        manifest.files = {}
+
+    to_embed, stale_paths = manifest.diff(file_paths)
+    if not to_embed and not stale_paths:
+        if not has_index:
+            raise ValueError("No documents to index. Ensure your Drive folder has .pdf, .txt or .docx files.")
+        if manifest.stats_refreshed:
+            # So the next start doesn't hash the re-downloaded files again
+            manifest.save()
+        return load_vectorstore(index_dir, embeddings)
+
+    # Mapped indexes are read-only, load this one into RAM to change it
+    vectordb = load_vectorstore(index_dir, embeddings, mmap=False) if has_index else None
+    stale_ids = manifest.chunk_ids(stale_paths)
+    if vectordb is not None and stale_ids:
+        delete_chunks(vectordb, stale_ids)
+    manifest.forget(stale_paths)
+
+    # A new index that needs training is built once RAG_INDEX_TRAIN_SIZE chunks
+    # (or all of them) are collected, so it is trained on a useful sample
+    untrained = [] if vectordb is None and needs_training(INDEX_TYPE) else None
+    untrained_ids = []
+
+    sha_by_path = {path: (stat, sha) for path, stat, sha in to_embed}
+    progress("embedding", 0, len(sha_by_path))
+    for done, (path, chunks) in enumerate(iter_file_chunks(list(sha_by_path)), 1):
+        stat, sha = sha_by_path[path]
+        ids = []
+        # Embed in fixed-size batches so the embedder's memory use stays flat
+        for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+            batch = chunks[start:start + EMBED_BATCH_SIZE]
+            batch_ids = [uuid.uuid4().hex for _ in batch]
+            if untrained is not None:
+                untrained.extend(batch)
+                untrained_ids.extend(batch_ids)
+                if len(untrained) >= INDEX_TRAIN_SIZE:
+                    vectordb = build_vectorstore(untrained, embeddings, ids=untrained_ids)
+                    untrained = None
+            elif vectordb is None:
+                vectordb = build_vectorstore(batch, embeddings, ids=batch_ids)
+            else:
+                vectordb.add_documents(batch, ids=batch_ids)
+            ids.extend(batch_ids)
+        manifest.record(path, stat, sha, ids)
+        progress("embedding", done, len(sha_by_path))
+
+    if untrained:
+        vectordb = build_vectorstore(untrained, embeddings, ids=untrained_ids)
+
+    if vectordb is None:
+        raise ValueError("No documents to index. Ensure your Drive folder has .pdf, .txt or .docx files.")
+
+    print(f"Index updated: {len(to_embed)} file(s) embedded, {len(stale_ids)} stale chunk(s) removed")
+    vectordb.save_local(index_dir)
+    manifest.save()
+    if INDEX_MMAP:
+        return load_vectorstore(index_dir, embeddings)
+    return vectordb
+
+def build_retriever(vectordb, k=TOP_K, bm25=None):
+    """
+    Retriever returning the k best chunks, selected by RAG_RETRIEVER.
+    Pass bm25 to share one BM25Index between retrievers of the same store.
+    """
+    if RETRIEVER == "vector":
+        return vectordb.as_retriever(search_kwargs={"k": k})
+    return HybridRetriever(
+        vectorstore=vectordb,
+        bm25=bm25 or BM25Index.from_vectorstore(vectordb),
+        reranker=get_reranker(),
+        k=k,
+        fetch_k=max(FETCH_K, k),
+        rerank_candidates=max(RERANK_CANDIDATES, k)
+    )
+
+def build_qa_chain(vectordb, llm=None, k=TOP_K, bm25=None):
+    llm = llm or make_chat_llm(temperature=0.7)
+    return RetrievalQA.from_chain_type(
         llm=llm,
-        retriever=vectordb.as_retriever(search_kwargs={"k": 3}),
+        retriever=build_retriever(vectordb, k, bm25),
         chain_type="stuff"
     )
 
-    tool = Tool.from_function(
+def build_rag_tool(qa):
+    return Tool.from_function(
         func=lambda q: qa.run(q),
         name="DriveRAGTool",
         description="Answers questions from documents in a shared Google Drive folder."
     )
+
+def build_rag_tool_from_drive(folder_id: str, return_vectorstore=False, progress=None):
+    if progress:
+        progress("fetching", 0, 0)
+    with metrics.span("drive_fetch"):
+        files = fetch_files_from_drive(folder_id)
+    with metrics.span("index_load"):
+        vectordb = load_or_update_vectorstore(files, progress=progress)
+
+    qa = build_qa_chain(vectordb)
+    tool = build_rag_tool(qa)
     
     if return_vectorstore:
         return tool, vectordb
-    return tool
\ No newline at end of file
+    return tool
@@ -1,5 +1,16 @@
 let currentSessionId = null;
 let isThinking = false;
+const learnerId = getLearnerId();
+
+// Anonymous per-browser id so answers and recommendations are tracked per learner
+function getLearnerId() {
+    let id = localStorage.getItem('learnerId');
+    if (!id) {
+        id = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : `learner-${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        localStorage.setItem('learnerId', id);
+    }
+    return id;
+}
 
 document.addEventListener('DOMContentLoaded', () => {
     initializeUI();
@@ -104,7 +115,8 @@ function sendMessage() {
     // Prepare request data
     const requestData = {
         message: message,
-        mode: mode
+        mode: mode,
+        user_id: learnerId
     };
     
     // Add session ID if answering a practice question
@@ -114,37 +126,98 @@ function sendMessage() {
         requestData.message = `Generate practice: ${message}`;
     }
     
-    // Send request to backend
+    // Answers to quiz questions are quick lookups; everything else streams
+    if (requestData.message.startsWith('session:')) {
+        postChat(requestData, mode);
+    } else {
+        streamChat(requestData, mode);
+    }
+}
+
+function postChat(requestData, mode) {
     fetch("/chat", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(requestData)
     })
     .then(res => res.json())
-    .then(data => {
-        // Hide thinking indicator
+    .then(data => handleChatResponse(data, mode))
+    .catch(err => {
         showThinking(false);
-        
-        // Show response
-        if (data.error) {
-            appendMessage('bot', data.error, true);
+        appendMessage('bot', `Error: ${err.message}`, true);
+        scrollToBottom();
+    });
+}
+
+function handleChatResponse(data, mode) {
+    // Hide thinking indicator
+    showThinking(false);
+    
+    // Show response
+    if (data.status === 'warming_up') {
+        appendMessage('bot', data.error);
+    } else if (data.error) {
+        appendMessage('bot', data.error, true);
+    } else {
+        // Format quiz content if in practice mode
+        if (mode === 'practice') {
+            appendMessage('bot', formatQuizContent(data.response));
+            
+            // Store session ID if provided
+            if (data.session_id) {
+                currentSessionId = data.session_id;
+                updateSessionInfo(`Active quiz session: ${data.session_id.substring(0, 8)}...`);
+            }
         } else {
-            // Format quiz content if in practice mode
-            if (mode === 'practice') {
-                appendMessage('bot', formatQuizContent(data.response));
-                
-                // Store session ID if provided
-                if (data.session_id) {
-                    currentSessionId = data.session_id;
-                    updateSessionInfo(`Active quiz session: ${data.session_id.substring(0, 8)}...`);
-                }
-            } else {
+            appendMessage('bot', data.response);
+        }
+    }
+    
+    // Scroll to bottom
+    scrollToBottom();
+}
+
+function streamChat(requestData, mode) {
+    let answerElement = null;
+    let streamedText = '';
+    
+    readEventStream("/chat/stream", requestData, (event, data) => {
+        if (event === 'json') {
+            // Not a stream (e.g. still warming up), handle like /chat
+            handleChatResponse(data, mode);
+        } else if (event === 'token') {
+            if (!answerElement) {
+                showThinking(false);
+                answerElement = appendMessage('bot', '');
+            }
+            streamedText += data;
+            answerElement.textContent = streamedText;
+            scrollToBottom();
+        } else if (event === 'session') {
+            currentSessionId = data.session_id;
+        } else if (event === 'question') {
+            if (data.index === 0) {
+                // Show the first question as soon as it is parsed
+                showThinking(false);
+                appendMessage('bot', formatQuizContent(data.text));
+            }
+            updateSessionInfo(`Active quiz session: ${currentSessionId.substring(0, 8)}... (${data.index + 1} questions ready)`);
+        } else if (event === 'done') {
+            showThinking(false);
+            if (data.session_id) {
+                updateSessionInfo(`Active quiz session: ${data.session_id.substring(0, 8)}...`);
+            } else if (data.response && !answerElement) {
+                // Cached answers and empty quizzes arrive in one piece
                 appendMessage('bot', data.response);
+            } else if (answerElement && data.response) {
+                answerElement.textContent = data.response;
             }
+            scrollToBottom();
+        } else if (event === 'error') {
+            showThinking(false);
+            appendMessage('bot', data.error, true);
+            scrollToBottom();
         }
-        
-        // Scroll to bottom
-        scrollToBottom();
     })
     .catch(err => {
         showThinking(false);
@@ -153,6 +226,48 @@ function sendMessage() {
     });
 }
 
+async function readEventStream(url, body, onEvent) {
+    const res = await fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body)
+    });
+    
+    const contentType = res.headers.get('Content-Type') || '';
+    if (!contentType.includes('text/event-stream')) {
+        onEvent('json', await res.json());
+        return;
+    }
+    
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            onEvent(event, data ? JSON.parse(data) : null);
+        }
+    }
+}
+
 function appendMessage(sender, content, isError = false) {
     const chatBox = document.getElementById('chat-box');
     
@@ -208,6 +323,8 @@ function appendMessage(sender, content, isError = false) {
     
     chatBox.appendChild(messageDiv);
     scrollToBottom();
+    
+    return messageContent;
 }
 
 function formatQuizContent(content) {
@@ -305,7 +422,7 @@ function formatQuizContent(content) {
 function fetchRecommendations() {
     showThinking(true);
     
-    fetch("/recommendations")
+    fetch(`/recommendations?user_id=${encodeURIComponent(learnerId)}`)
         .then(res => res.json())
         .then(data => {
             showThinking(false);
@@ -517,7 +634,7 @@ function sendReportToSlack() {
                 appendMessage('bot', `
                     <div class="report-success">
                         <h3><i class="fas fa-check-circle"></i> Report Sent!</h3>
-                        <p>Your learning session report has been sent to Slack.</p>
+                        <p>Your learning session report is on its way to Slack.</p>
                     </div>
                 `);
             } else {
@@ -2,35 +2,203 @@ import uuid
 import re
 from typing import Dict, List, Any
 from langchain.tools import Tool
+from db.models import Question, topic_key
 from db.question_db import QuestionDatabase
 from langchain.chains import RetrievalQA
+from langchain.chains.question_answering import load_qa_chain
+from langchain_core.callbacks import BaseCallbackHandler
+from utils import metrics
+from tools.quiz_parser import QuizParseError, parse_question_block, question_block_starts, question_key, split_question_blocks
+import math
+import os
+import threading
 import time
-# Global session storage
-active_sessions = {}
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# LLM calls per generate_questions(); calls after the first only ask for the questions still missing
+QUIZ_GENERATION_ATTEMPTS = int(os.getenv("QUIZ_GENERATION_ATTEMPTS", "2"))
+# Requests for more than QUIZ_GROUP_SIZE questions are split into concurrent LLM calls
+QUIZ_GROUP_SIZE = int(os.getenv("QUIZ_GROUP_SIZE", "5"))
+QUIZ_FANOUT_WORKERS = int(os.getenv("QUIZ_FANOUT_WORKERS", "4"))
+QUIZ_CHUNKS_PER_GROUP = int(os.getenv("QUIZ_CHUNKS_PER_GROUP", "4"))
+
+class QuestionStreamHandler(BaseCallbackHandler):
+    """Hands each complete question block to on_block while the LLM is still streaming"""
+
+    def __init__(self, on_block):
+        self.on_block = on_block
+        self.buffer = ""
+        self.block_start = None
+        self.emitted = 0
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.buffer += token
+        if "\n" not in token:
+            # Labels and options are only recognised on complete lines
+            return
+        # Same block boundaries as split_question_blocks, rescanning from the block being streamed
+        starts = question_block_starts(self.buffer, self.block_start or 0, final=False)
+        if not starts:
+            return
+        if self.block_start is None:
+            self.block_start = starts[0]
+        for start in starts[1:]:
+            self.emitted += 1
+            self.on_block(self.buffer[self.block_start:start])
+            self.block_start = start
+
+class SessionProgress:
+    """
+    Answering progress through a session: one byte per answered question
+    (1 correct, 0 incorrect) plus the end time. The position and the
+    correct/incorrect counts are derived from it.
+    """
+
+    __slots__ = ("results", "end_time")
+
+    def __init__(self, results=b"", end_time=None):
+        self.results = bytearray(results)
+        self.end_time = end_time
+
+    @property
+    def current_index(self):
+        return len(self.results)
+
+    @property
+    def correct(self):
+        return self.results.count(1)
+
+    @property
+    def incorrect(self):
+        return len(self.results) - self.correct
+
+    def record(self, is_correct):
+        self.results.append(1 if is_correct else 0)
+
+    def to_state(self):
+        return {"r": "".join("1" if result else "0" for result in self.results), "e": self.end_time}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(bytes(int(result) for result in state["r"]), state["e"])
+
 
 class PracticeSession:
-    def __init__(self, session_id, topic, retriever, llm):
+    __slots__ = ("session_id", "topic", "user_id", "questions", "progress", "start_time",
+                 "db", "retriever", "llm", "dedup", "_unsaved", "_lock")
+
+    def __init__(self, session_id, topic, retriever, llm, user_id=None, dedup=None):
         self.session_id = session_id
         self.topic = topic
-        self.questions = []
-        self.current_index = 0
+        self.user_id = user_id
+        self.questions = []  # Question objects
+        self.progress = SessionProgress()
         self.db = QuestionDatabase()
+        self._unsaved = []  # Questions waiting for save_questions()
+        self._lock = threading.RLock()  # guards questions/_unsaved while groups generate in parallel
         self.retriever = retriever
         self.llm = llm
-        # Session metrics
+        self.dedup = dedup  # QuestionDeduplicator; repeats of stored questions reuse their ids
         self.start_time = time.time()
-        self.end_time = None
-        self.correct_answers = 0
-        self.incorrect_answers = 0
-        self.topics = {}  # Track performance by topic
-        
-    def generate_questions(self, num_questions=5):
-        qa = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            retriever=self.retriever,
-            chain_type="stuff"
-        )
+
+    @property
+    def current_index(self):
+        return self.progress.current_index
+
+    @property
+    def correct_answers(self):
+        return self.progress.correct
+
+    @property
+    def incorrect_answers(self):
+        return self.progress.incorrect
+
+    @property
+    def end_time(self):
+        return self.progress.end_time
         
+    @metrics.span("quiz_generation")
+    def generate_questions(self, num_questions=5, on_question=None, max_attempts=QUIZ_GENERATION_ATTEMPTS):
+        """
+        Generate questions from the retriever; on_question(index) is called as each one is added.
+        More than QUIZ_GROUP_SIZE questions are generated by concurrent calls
+        (see _generate_fanout). If some questions come back malformed or
+        repeated, follow-up calls ask only for the missing ones, up to
+        max_attempts rounds in total.
+        """
+        target = len(self.questions) + num_questions
+        first_new = len(self.questions)
+        seen = {question_key(q.text) for q in self.questions}
+        attempts = 0
+        
+        if num_questions > QUIZ_GROUP_SIZE:
+            self._generate_fanout(num_questions, on_question, seen)
+            attempts = 1
+        
+        qa = None
+        for attempt in range(attempts, max_attempts):
+            missing = target - len(self.questions)
+            if missing <= 0:
+                break
+            if qa is None:
+                qa = RetrievalQA.from_chain_type(
+                    llm=self.llm,
+                    retriever=self.retriever,
+                    chain_type="stuff"
+                )
+            prompt = self._generation_prompt(missing, [q.text for q in self.questions[first_new:]])
+            
+            # With a streaming LLM, questions are parsed and published as soon as
+            # the next QUESTION: label arrives instead of after the whole answer
+            handler = QuestionStreamHandler(lambda block: self._add_question_block(block, on_question, seen))
+            result = qa.run(prompt, callbacks=[handler])
+            
+            for block in split_question_blocks(result)[handler.emitted:]:
+                self._add_question_block(block, on_question, seen)
+        
+        self.save_questions()
+        return len(self.questions)
+
+    def _diverse_documents(self, k):
+        """k chunks about the topic, chosen by maximal marginal relevance when the retriever has a vector store"""
+        vectorstore = getattr(self.retriever, "vectorstore", None)
+        if vectorstore is not None:
+            return vectorstore.max_marginal_relevance_search(self.topic, k=k, fetch_k=k * 4)
+        return self.retriever.invoke(self.topic)[:k]
+
+    def _generate_fanout(self, num_questions, on_question, seen):
+        """
+        Generate num_questions with one LLM call per group of at most
+        QUIZ_GROUP_SIZE questions, running up to QUIZ_FANOUT_WORKERS at once.
+        Each group gets its own slice of diverse chunks, so latency is about
+        that of one small call and the groups cover different material.
+        Repeats across groups are dropped by _add_question_block.
+        """
+        num_groups = math.ceil(num_questions / QUIZ_GROUP_SIZE)
+        docs = self._diverse_documents(num_groups * QUIZ_CHUNKS_PER_GROUP)
+        if not docs:
+            return
+        num_groups = min(num_groups, len(docs))
+        # Round-robin so every group gets one of the most relevant chunks
+        groups = [docs[i::num_groups] for i in range(num_groups)]
+        counts = [num_questions // num_groups + (1 if i < num_questions % num_groups else 0) for i in range(num_groups)]
+        chain = load_qa_chain(self.llm, chain_type="stuff")
+        
+        def run_group(group_docs, count):
+            handler = QuestionStreamHandler(lambda block: self._add_question_block(block, on_question, seen))
+            result = chain.run(input_documents=group_docs, question=self._generation_prompt(count), callbacks=[handler])
+            for block in split_question_blocks(result)[handler.emitted:]:
+                self._add_question_block(block, on_question, seen)
+        
+        with ThreadPoolExecutor(max_workers=min(QUIZ_FANOUT_WORKERS, num_groups)) as pool:
+            futures = [pool.submit(run_group, group, count) for group, count in zip(groups, counts)]
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error generating question group: {e}")
+
+    def _generation_prompt(self, num_questions, existing=()):
         prompt = f"""
         Based ONLY on the provided documents, create {num_questions} multiple-choice questions about {self.topic}.
         Each question must:
@@ -48,62 +216,55 @@ class PracticeSession:
         EXPLANATION: [brief explanation]
         TOPIC: [specific subtopic]
         """
-        
-        result = qa.run(prompt)
-        question_blocks = re.split(r'QUESTION:', result)
-        
-        for block in question_blocks[1:]:  # Skip the first empty block
-            try:
-                # Extract question text
-                question_text = block.split('A.')[0].strip()
-                
-                # Extract options
-                options = []
-                option_markers = ['A.', 'B.', 'C.', 'D.']
-                for i in range(len(option_markers)):
-                    marker = option_markers[i]
-                    next_marker = option_markers[i+1] if i < len(option_markers)-1 else 'ANSWER:'
-                    option = block.split(marker)[1].split(next_marker)[0].strip()
-                    options.append(option)
-                
-                # Extract correct answer
-                answer_match = re.search(r'ANSWER:\s*([A-D])', block)
-                if not answer_match:
-                    continue
-                    
-                correct_letter = answer_match.group(1)
-                correct_index = ord(correct_letter) - ord('A')
-                correct_answer = options[correct_index]
-                
-                # Extract explanation
-                explanation_match = re.search(r'EXPLANATION:\s*(.*?)(?:TOPIC:|$)', block, re.DOTALL)
-                explanation = explanation_match.group(1).strip() if explanation_match else ""
-                
-                # Extract topic
-                topic_match = re.search(r'TOPIC:\s*(.*?)$', block, re.DOTALL)
-                subtopic = topic_match.group(1).strip() if topic_match else self.topic
-                
-                # Save question to database
-                question_id = self.db.add_question(
-                    self.session_id,
-                    question_text,
-                    options,
-                    correct_answer,
-                    subtopic,
-                    explanation
-                )
-                
-                self.questions.append({
-                    'id': question_id,
-                    'question': question_text,
-                    'options': options,
-                    'correct_answer': correct_answer,
-                    'explanation': explanation,
-                    'correct_letter': correct_letter
-                })
+        if existing:
+            asked = "\n".join(f"- {text}" for text in existing)
+            prompt += f"""
+        Do not repeat any of these questions:
+{asked}
+        """
+        return prompt
+
+    def save_questions(self):
+        """Write all newly parsed questions to the database in one transaction"""
+        with self._lock:
+            pending, self._unsaved = self._unsaved, []
+            if not pending:
+                return
+            # Both assign each question's id
+            if self.dedup is not None:
+                self.dedup.save(self.db, self.session_id, pending, self.topic)
+            else:
+                self.db.add_questions(self.session_id, pending, topic_key(self.topic))
+
+    def _add_question_block(self, block, on_question=None, seen=None):
+        try:
+            with metrics.span("quiz_parse"):
+                question = parse_question_block(block, default_topic=self.topic)
+        except QuizParseError as e:
+            print(f"Error parsing question: {e}")
+            return
+            
+        with self._lock:
+            if seen is not None:
+                key = question_key(question.text)
+                if key in seen:
+                    return
+                seen.add(key)
                 
-            except Exception as e:
-                print(f"Error parsing question: {e}")
+            # Saved to the database in one batch by save_questions()
+            self._unsaved.append(question)
+            self.questions.append(question)
+            
+            if on_question:
+                on_question(len(self.questions) - 1)
+        
+    def load_questions(self, questions, on_question=None):
+        """Add Question objects that were already stored in the database (e.g. from the question bank)"""
+        for question in questions:
+            self.questions.append(question)
+            
+            if on_question:
+                on_question(len(self.questions) - 1)
                 
         return len(self.questions)
         
@@ -111,10 +272,15 @@ class PracticeSession:
         if self.current_index >= len(self.questions):
             return None
             
-        q = self.questions[self.current_index]
-        options_text = "\n".join([f"{chr(65+i)}. {opt}" for i, opt in enumerate(q['options'])])
+        return self.format_question(self.current_index)
+
+    def format_question(self, index, total=None):
+        """Render question index; total defaults to the questions generated so far"""
+        q = self.questions[index]
+        total = total or len(self.questions)
+        options_text = "\n".join([f"{chr(65+i)}. {opt}" for i, opt in enumerate(q.options)])
         
-        return f"Question {self.current_index+1} of {len(self.questions)}:\n\n{q['question']}\n\n{options_text}"
+        return f"Question {index+1} of {total}:\n\n{q.text}\n\n{options_text}"
         
     def check_answer(self, user_answer):
         if self.current_index >= len(self.questions):
@@ -123,37 +289,28 @@ class PracticeSession:
         q = self.questions[self.current_index]
         user_letter = user_answer.strip().upper()[0] if user_answer.strip() else ""
         
-        is_correct = user_letter == q['correct_letter']
-        
-        # Record the answer in database
-        self.db.record_answer(q['id'], user_letter, is_correct)
+        is_correct = user_letter == q.correct_letter
         
-        if is_correct:
-            self.correct_answers += 1
-        else:
-            self.incorrect_answers += 1
-            
-        # Track topic performance
-        topic = q.get('topic', self.topic)
-        if topic not in self.topics:
-            self.topics[topic] = {'correct': 0, 'total': 0}
+        # A streamed question can be answered before its batch is saved
+        if q.id is None:
+            self.save_questions()
+        if q.id is None:
+            # Only the session that generated a question can save it; wait for its ids
+            return "This question is still being saved. Please send your answer again in a moment."
         
-        self.topics[topic]['total'] += 1
-        if is_correct:
-            self.topics[topic]['correct'] += 1
+        # Record the answer in database
+        self.db.record_answer(q.id, user_letter, is_correct, user_id=self.user_id)
+        self.progress.record(is_correct)
             
         # Prepare feedback message
         if is_correct:
-            feedback = f"✅ Correct! {q['explanation']}"
+            feedback = f"✅ Correct! {q.explanation}"
         else:
-            feedback = f"❌ Incorrect. The correct answer is {q['correct_letter']}. {q['explanation']}"
-            
-        # Move to the next question
-        self.current_index += 1
+            feedback = f"❌ Incorrect. The correct answer is {q.correct_letter}. {q.explanation}"
         
         # Check if we've completed all questions
         if self.current_index >= len(self.questions):
-            self.end_time = time.time()
+            self.progress.end_time = time.time()
             feedback += "\n\nYou've completed all the practice questions!"
         else:
             next_question = self.get_current_question()
@@ -161,23 +318,65 @@ class PracticeSession:
             
         return feedback
 
+    def topic_scores(self):
+        """{topic: [correct, total]} over the answered questions, in first-answered order"""
+        scores = {}
+        for q, result in zip(self.questions, self.progress.results):
+            score = scores.setdefault(q.topic or self.topic, [0, 0])
+            score[0] += result
+            score[1] += 1
+        return scores
+
+    def question_state(self):
+        """
+        The generated questions in Question.to_row() form. Unsaved questions
+        are saved first, so sessions loaded from this state have every id.
+        """
+        with self._lock:
+            self.save_questions()
+            return [q.to_row() for q in self.questions]
+
+    def progress_state(self):
+        return self.progress.to_state()
+
+    def to_state(self):
+        """
+        Compact JSON-serializable state; the retriever, LLM and database
+        handle are process-local and are not part of it
+        """
+        return {
+            "session_id": self.session_id,
+            "topic": self.topic,
+            "user_id": self.user_id,
+            "start_time": self.start_time,
+            "questions": self.question_state(),
+            "progress": self.progress_state()
+        }
+
+    @classmethod
+    def from_state(cls, state, retriever=None, llm=None):
+        """
+        Rebuild a session from to_state() output. Without a retriever and LLM
+        the session can still check answers and report, but not generate.
+        """
+        session = cls(state["session_id"], state["topic"], retriever, llm, user_id=state.get("user_id"))
+        session.start_time = state["start_time"]
+        session.questions = [Question.from_row(row) for row in state["questions"]]
+        session.progress = SessionProgress.from_state(state["progress"])
+        return session
+
     def get_session_report(self):
         """Generate a report of the current session"""
-        # Ensure end_time is set
-        if not self.end_time and self.current_index >= len(self.questions):
-            self.end_time = time.time()
-        elif not self.end_time:
-            self.end_time = time.time()  # For in-progress sessions
+        # In-progress sessions report up to now
+        end_time = self.end_time or time.time()
             
         # Calculate duration
-        duration_seconds = self.end_time - self.start_time
+        duration_seconds = end_time - self.start_time
         duration_minutes = round(duration_seconds / 60)
         
         # Format topic data
         topics_data = []
-        for topic_name, data in self.topics.items():
-            correct = data['correct']
-            total = data['total']
+        for topic_name, (correct, total) in self.topic_scores().items():
             score = round((correct / total) * 100) if total > 0 else 0
             topics_data.append({
                 "name": topic_name,
@@ -189,8 +388,9 @@ class PracticeSession:
         # Create report data
         report = {
             "session_id": self.session_id,
+            "user_id": self.user_id,
             "start_time": self.start_time,
-            "end_time": self.end_time,
+            "end_time": end_time,
             "duration_seconds": duration_seconds,
             "duration_minutes": duration_minutes,
             "total_quizzes": 1,  # Count each topic as a quiz
@@ -202,7 +402,7 @@ class PracticeSession:
         
         return report
     
-def create_practice_tool(llm):
+def create_practice_tool(llm, session_store=None):
     def handle_practice(query):
         # Check if it's an answer to an existing session
         session_match = re.search(r'session:([a-zA-Z0-9-]+)', query)
@@ -212,8 +412,11 @@ def create_practice_tool(llm):
             session_id = session_match.group(1)
             user_answer = answer_match.group(1)
             
-            if session_id in active_sessions:
-                return active_sessions[session_id].check_answer(user_answer)
+            session = session_store.get(session_id) if session_store is not None else None
+            if session is not None:
+                feedback = session.check_answer(user_answer)
+                session_store.update_progress(session)
+                return feedback
             else:
                 return "Session not found. Please start a new practice session."
                 
@@ -0,0 +1,112 @@
+import os
+import queue
+import threading
+from db.models import topic_key
+from db.question_db import QuestionDatabase
+from tools.practice_tool import PracticeSession
+
+QUESTION_BANK_MIN_STOCK = int(os.getenv("QUESTION_BANK_MIN_STOCK", "10"))
+QUESTION_BANK_REFILL_SIZE = int(os.getenv("QUESTION_BANK_REFILL_SIZE", "10"))
+
+
+class QuestionBank:
+    """
+    Serves practice sessions from pre-generated questions.
+
+    New sessions take unseen questions for their topic straight from the
+    question_bank table; only a shortfall is generated synchronously. Whenever
+    a topic's stock drops below min_stock, a background thread generates
+    another refill_size questions for it. With a QuestionDeduplicator,
+    refills only stock questions that no session has been given yet.
+    """
+
+    def __init__(self, retriever_factory, llm, db_path="question_data.db",
+                 min_stock=QUESTION_BANK_MIN_STOCK, refill_size=QUESTION_BANK_REFILL_SIZE, dedup=None):
+        self.retriever_factory = retriever_factory
+        self.llm = llm
+        self.dedup = dedup
+        self.db_path = db_path
+        self.min_stock = min_stock
+        self.refill_size = refill_size
+        self.db = QuestionDatabase(db_path)
+        self.served_from_bank = 0
+        self.generated_inline = 0
+
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._refill_loop, name="question-bank-refill", daemon=True)
+        self._worker.start()
+
+    def fill_session(self, session, num_questions=5, on_question=None):
+        """Give session num_questions questions, from stock where possible; returns the count"""
+        key = topic_key(session.topic)
+        stocked = self.db.claim_bank_questions(key, session.session_id, num_questions)
+        session.load_questions(stocked, on_question)
+        self.served_from_bank += len(session.questions)
+
+        shortfall = num_questions - len(session.questions)
+        if shortfall > 0:
+            def on_wanted(index):
+                # Extra questions the LLM returned go to stock, the learner never sees them
+                if index < num_questions:
+                    on_question(index)
+
+            before = len(session.questions)
+            session.generate_questions(shortfall, on_question=on_wanted if on_question else None)
+            self.generated_inline += len(session.questions) - before
+
+            # The LLM sometimes returns more than asked for, keep the extras in stock
+            surplus = session.questions[num_questions:]
+            if surplus:
+                del session.questions[num_questions:]
+                self.db.add_to_bank([q.id for q in surplus], key)
+
+        self.request_refill(session.topic)
+        return len(session.questions)
+
+    def request_refill(self, topic):
+        """Queue a background refill for topic if it is running low"""
+        key = topic_key(topic)
+        stock = self.db.count_bank_questions(key)
+        if stock >= self.min_stock:
+            return
+        with self._pending_lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._queue.put(topic)
+
+    def _refill_loop(self):
+        while True:
+            topic = self._queue.get()
+            key = topic_key(topic)
+            try:
+                self.refill(topic)
+            except Exception as e:
+                print(f"Error refilling question bank for '{topic}': {e}")
+            finally:
+                with self._pending_lock:
+                    self._pending.discard(key)
+
+    def refill(self, topic):
+        """Generate refill_size questions for topic and put them in stock"""
+        generator = PracticeSession(
+            session_id=None,
+            topic=topic,
+            retriever=self.retriever_factory(),
+            llm=self.llm,
+            dedup=self.dedup
+        )
+        generator.generate_questions(self.refill_size)
+        # Repeats of questions already served keep their old id, don't stock them again
+        question_ids = self.db.unserved_question_ids(list(dict.fromkeys(q.id for q in generator.questions)))
+        self.db.add_to_bank(question_ids, topic_key(topic))
+        return len(question_ids)
+
+    def stats(self):
+        return {
+            "served_from_bank": self.served_from_bank,
+            "generated_inline": self.generated_inline,
+            "refills_pending": len(self._pending)
+        }
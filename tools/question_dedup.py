@@ -0,0 +1,254 @@
+"""
+Near-duplicate detection for generated questions.
+
+QuestionDeduplicator checks questions as they are saved. Run as a script it
+deduplicates an existing database (see backfill()):
+
+    python -m tools.question_dedup --db question_data.db [--dry-run]
+"""
+import argparse
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from db.models import content_hash, topic_key
+from db.question_db import QuestionDatabase
+
+QUESTION_DEDUP_THRESHOLD = float(os.getenv("QUESTION_DEDUP_THRESHOLD", "0.9"))
+# Newest questions per topic kept in the in-memory index
+QUESTION_DEDUP_MAX_PER_TOPIC = int(os.getenv("QUESTION_DEDUP_MAX_PER_TOPIC", "2000"))
+# Topic indexes kept in memory; the least recently used is dropped and reloaded when needed
+QUESTION_DEDUP_MAX_TOPICS = int(os.getenv("QUESTION_DEDUP_MAX_TOPICS", "50"))
+
+
+def dedup_text(text, correct_answer):
+    """What gets embedded: the question together with its answer"""
+    return f"{text}\n{correct_answer}"
+
+
+def embed_normalized(embeddings, texts):
+    """Unit-length embeddings of texts, or a None per text without an embedding model"""
+    if embeddings is None or not texts:
+        return [None] * len(texts)
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return list(vectors / norms)
+
+
+class TopicIndex:
+    """
+    Questions of one topic: content hash -> key for exact repeats and a
+    matrix of normalized embeddings searched by cosine similarity for
+    reworded ones. Past max_entries the oldest questions are dropped.
+    """
+
+    def __init__(self, max_entries=QUESTION_DEDUP_MAX_PER_TOPIC):
+        self.max_entries = max_entries
+        self.by_hash = {}
+        self.entries = []  # [key, hash, vector], oldest first
+        self._matrix = None
+        self._matrix_keys = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, key, question_hash, vector=None):
+        self.by_hash[question_hash] = key
+        self.entries.append([key, question_hash, vector])
+        if len(self.entries) > self.max_entries:
+            _, old_hash, _ = self.entries.pop(0)
+            if self.by_hash.get(old_hash) == key:
+                del self.by_hash[old_hash]
+        self._matrix = None
+
+    def match(self, question_hash, vector, threshold):
+        """(key, "exact" | "near") of the question this one duplicates, or (None, None)"""
+        key = self.by_hash.get(question_hash)
+        if key is not None:
+            return key, "exact"
+        if vector is None:
+            return None, None
+
+        if self._matrix is None:
+            with_vectors = [entry for entry in self.entries if entry[2] is not None]
+            self._matrix_keys = [entry[0] for entry in with_vectors]
+            self._matrix = np.stack([entry[2] for entry in with_vectors]) if with_vectors else None
+        if self._matrix is None:
+            return None, None
+
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= threshold:
+            return self._matrix_keys[best], "near"
+        return None, None
+
+
+class QuestionDeduplicator:
+    """
+    Checks generated questions against the questions already stored for
+    their topic before they are inserted.
+
+    A question whose normalized text and answer hash matches a stored one,
+    or whose embedding is within threshold cosine similarity of one, is not
+    inserted again: it takes the stored question's id, so answers to both
+    count towards the same question. Each topic's index is loaded from the
+    database when the topic is used; at most max_topics are kept, least
+    recently used dropped first. Without embeddings only exact (normalized)
+    repeats are caught.
+    """
+
+    def __init__(self, embeddings=None, threshold=QUESTION_DEDUP_THRESHOLD,
+                 max_per_topic=QUESTION_DEDUP_MAX_PER_TOPIC, max_topics=QUESTION_DEDUP_MAX_TOPICS):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_per_topic = max_per_topic
+        self.max_topics = max_topics
+        self.exact_merges = 0
+        self.near_merges = 0
+        self.inserted = 0
+        self.topic_loads = 0
+        self.topic_evictions = 0
+
+        self._topics = OrderedDict()  # topic_key -> TopicIndex, least recently used first
+        self._lock = threading.Lock()
+
+    def _topic_index(self, db, key):
+        with self._lock:
+            index = self._topics.get(key)
+            if index is not None:
+                self._topics.move_to_end(key)
+                return index
+
+        # Newest first from the database, added oldest first
+        rows = db.get_questions_for_topic(key, self.max_per_topic)[::-1]
+        vectors = embed_normalized(self.embeddings, [dedup_text(text, answer) for _, text, answer, _ in rows])
+        index = TopicIndex(self.max_per_topic)
+        for (question_id, text, answer, question_hash), vector in zip(rows, vectors):
+            index.add(question_id, question_hash or content_hash(text, answer), vector)
+
+        with self._lock:
+            # Another thread may have loaded it in the meantime
+            index = self._topics.setdefault(key, index)
+            self._topics.move_to_end(key)
+            self.topic_loads += 1
+            while len(self._topics) > self.max_topics:
+                self._topics.popitem(last=False)
+                self.topic_evictions += 1
+            return index
+
+    def save(self, db, session_id, questions, topic):
+        """
+        Store questions generated for topic, merging duplicates into the
+        questions they repeat. Sets every question's id; returns the number
+        of questions that were actually inserted. Stored questions a session
+        repeats are claimed for it, so the bank doesn't serve them again.
+        """
+        if not questions:
+            return 0
+        key = topic_key(topic)
+        index = self._topic_index(db, key)
+        hashes = [q.content_hash() for q in questions]
+        # Embed outside the lock, it is by far the slowest step
+        vectors = embed_normalized(self.embeddings, [dedup_text(q.text, q.correct_answer) for q in questions])
+
+        with self._lock:
+            fresh = []  # questions to insert
+            batch = TopicIndex(len(questions))  # position in fresh, for repeats within this batch
+            repeats = []  # (question, position in fresh)
+            reused = []  # ids of stored questions
+            for question, question_hash, vector in zip(questions, hashes, vectors):
+                match, kind = index.match(question_hash, vector, self.threshold)
+                if match is not None:
+                    question.id = match
+                    reused.append(match)
+                else:
+                    match, kind = batch.match(question_hash, vector, self.threshold)
+                    if match is not None:
+                        repeats.append((question, match))
+                    else:
+                        batch.add(len(fresh), question_hash, vector)
+                        fresh.append((question, question_hash, vector))
+                        continue
+                if kind == "exact":
+                    self.exact_merges += 1
+                else:
+                    self.near_merges += 1
+
+            if fresh:
+                db.add_questions(session_id, [question for question, _, _ in fresh], key)
+            if session_id is not None:
+                db.claim_questions(list(dict.fromkeys(reused)), session_id)
+            for question, position in repeats:
+                question.id = fresh[position][0].id
+            for question, question_hash, vector in fresh:
+                index.add(question.id, question_hash, vector)
+            self.inserted += len(fresh)
+        return len(fresh)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "topics": len(self._topics),
+                "topic_loads": self.topic_loads,
+                "topic_evictions": self.topic_evictions,
+                "inserted": self.inserted,
+                "exact_merges": self.exact_merges,
+                "near_merges": self.near_merges
+            }
+
+
+def find_duplicates(db, embeddings=None, threshold=QUESTION_DEDUP_THRESHOLD):
+    """Map of duplicate question id -> id of the earliest question it repeats, per topic"""
+    merges = {}
+    for key in db.get_question_topic_keys():
+        rows = db.get_questions_for_topic(key, -1)[::-1]
+        vectors = embed_normalized(embeddings, [dedup_text(text, answer) for _, text, answer, _ in rows])
+        index = TopicIndex(len(rows))
+        for (question_id, text, answer, question_hash), vector in zip(rows, vectors):
+            match, _ = index.match(question_hash, vector, threshold)
+            if match is not None:
+                merges[question_id] = match
+            else:
+                index.add(question_id, question_hash, vector)
+    return merges
+
+
+def backfill(db_path="question_data.db", embeddings=None, threshold=QUESTION_DEDUP_THRESHOLD, dry_run=False):
+    """
+    Deduplicate an existing database: fill in the hash and topic of older
+    questions, fold every duplicate into the earliest copy (moving its
+    answers over and taking it out of the question bank) and rebuild the
+    answer aggregates. Returns the duplicate -> kept id map
+    """
+    db = QuestionDatabase(db_path)
+    filled = db.backfill_dedup_keys()
+    print(f"Filled dedup keys for {filled} questions")
+
+    merges = find_duplicates(db, embeddings, threshold)
+    print(f"Found {len(merges)} duplicate questions")
+    if merges and not dry_run:
+        db.merge_questions(merges)
+        db.rebuild_aggregates()
+        print(f"Merged {len(merges)} questions into {len(set(merges.values()))}")
+    return merges
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge duplicate questions in a question database")
+    parser.add_argument("--db", default="question_data.db")
+    parser.add_argument("--threshold", type=float, default=QUESTION_DEDUP_THRESHOLD,
+                        help="cosine similarity above which two questions count as the same")
+    parser.add_argument("--no-embeddings", action="store_true", help="only merge exact (normalized) repeats")
+    parser.add_argument("--dry-run", action="store_true", help="report duplicates without changing anything")
+    args = parser.parse_args()
+
+    embeddings = None
+    if not args.no_embeddings:
+        from rag_tool import get_embeddings
+        embeddings = get_embeddings()
+    backfill(args.db, embeddings, args.threshold, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Parser for the QUESTION / A.-D. / ANSWER / EXPLANATION / TOPIC format the
+practice prompt asks the LLM for.
+
+The text is read line by line and a label is only recognised at the start of
+a line, so option text containing "A." or "B." is left alone. It tolerates
+the usual drift in LLM output: markdown emphasis, numbering, lowercase
+labels, "A)" / "(A)" option styles, answers given as text instead of a
+letter, and wrapped lines. A question label only starts a new question
+once the previous one is past its options and options follow the label, so
+a "Question:" line inside an explanation stays part of it.
+"""
+import re
+from db.models import Question, normalize_text
+
+OPTION_LETTERS = "ABCD"
+
+# Start of a question: "QUESTION:", "**Question 3:**", "2. Question:" ...
+QUESTION_START = re.compile(r"^[\W_]*(?:\d+[.)][\W_]*)?question(?:\s*\d+)?\s*[:.)]", re.IGNORECASE | re.MULTILINE)
+
+# Lines that come after a question's options: its answer, explanation or topic
+CLOSING_LINE = re.compile(
+    r"^[\W_]*?(?:\d+[.)][\W_]*?)?(?:(?:correct\s+)?answer|explanation|sub-?topic|topic)\s*[:.)\]]", re.IGNORECASE | re.MULTILINE
+)
+OPTION_A_LINE = re.compile(r"^[\W_]*?a\s*[:.)\]]", re.IGNORECASE | re.MULTILINE)
+
+LABEL = re.compile(
+    r"^[\W_]*?(?:\d+[.)][\W_]*?)?"
+    r"(?P<label>question(?:\s*\d+)?|correct\s+answer|answer|explanation|sub-?topic|topic|[a-d])"
+    r"\s*[:.)\]]+(?P<rest>.*)$",
+    re.IGNORECASE
+)
+
+
+class QuizParseError(ValueError):
+    pass
+
+
+def clean(text):
+    """Drop surrounding whitespace and markdown emphasis"""
+    return text.strip().strip("*_`").strip()
+
+
+def question_key(text):
+    """Normalized question text, for spotting repeats"""
+    return normalize_text(text)
+
+
+def question_block_starts(text, pos=0, final=True):
+    """
+    Offsets of the question labels at or after pos that start a block. The
+    first one always does; a later one only if the block before it is past
+    its options (an answer, explanation or topic line) and an option A line
+    follows the label before the next one. With
+    final=False (text still streaming), stops at a label whose options may
+    not have arrived yet.
+    """
+    candidates = [match.start() for match in QUESTION_START.finditer(text, pos)]
+    starts = []
+    for i, start in enumerate(candidates):
+        if not starts:
+            starts.append(start)
+            continue
+        if not CLOSING_LINE.search(text, starts[-1], start):
+            continue
+        end = candidates[i + 1] if i + 1 < len(candidates) else len(text)
+        if OPTION_A_LINE.search(text, start, end):
+            starts.append(start)
+        elif not final and end == len(text):
+            break
+    return starts
+
+
+def split_question_blocks(text):
+    """Split LLM output into blocks that each start at a question label; text before the first is dropped"""
+    starts = question_block_starts(text)
+    return [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+
+
+def _contains_words(text, part):
+    """Whether part occurs in text without being glued to a longer word"""
+    start = text.find(part)
+    while start != -1:
+        end = start + len(part)
+        if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+            return True
+        start = text.find(part, start + 1)
+    return False
+
+
+def _answer_index(answer, options):
+    """
+    Index of the correct option from an ANSWER value: the option whose text it
+    contains (the longest, when one option's text is part of another's), else
+    a letter at its start ("B", "B) ...", "Option B"). Anything else, such as
+    an answer naming two options, raises QuizParseError.
+    """
+    lowered = " ".join(answer.lower().split()).rstrip(".")
+    found = {}
+    for i, option in enumerate(options):
+        option_text = " ".join(option.lower().split()).rstrip(".")
+        if option_text and _contains_words(lowered, option_text):
+            found[i] = option_text
+    found = [i for i, text in found.items() if not any(text != other and text in other for other in found.values())]
+    if len(found) == 1:
+        return found[0]
+    if found:
+        raise QuizParseError(f"answer '{answer}' names more than one option")
+
+    match = re.match(r"^[\W_]*(?:option\s+)?([A-D])(?:\s*[.):\],-]|\s*$)", answer, re.IGNORECASE)
+    if not match:
+        raise QuizParseError(f"answer '{answer}' is not a letter A-D or one of the options")
+    return OPTION_LETTERS.index(match.group(1).upper())
+
+
+def parse_question_block(block, default_topic=None):
+    """
+    Parse one question block into a Question (without an id).
+    Raises QuizParseError if the question text, any of the four options or
+    the answer is missing.
+    """
+    fields = {}
+    options = {}
+    current = None
+
+    for raw_line in block.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        match = LABEL.match(line)
+        if match:
+            label = match.group("label").lower()
+            rest = clean(match.group("rest"))
+            if len(label) == 1:
+                # Option letters only count before the answer and only once each
+                letter = label.upper()
+                # and once there is question text (which may itself start with "A. ...")
+                if "answer" not in fields and letter not in options and fields.get("question"):
+                    options[letter] = rest
+                    current = ("option", letter)
+                    continue
+            else:
+                if label.startswith("question"):
+                    label = "question"
+                    if "question" in fields and "answer" not in fields and options:
+                        # The previous question had no answer; don't grade it with this one's
+                        raise QuizParseError("question without an answer")
+                elif label.endswith("answer"):
+                    label = "answer"
+                elif label.endswith("topic"):
+                    label = "topic"
+                if label not in fields:
+                    fields[label] = rest
+                    current = ("field", label)
+                    continue
+
+        # Anything else continues the field or option above it
+        if current is None:
+            continue
+        kind, key = current
+        target = options if kind == "option" else fields
+        target[key] = f"{target[key]} {clean(line)}".strip()
+
+    text = fields.get("question", "")
+    if not text:
+        raise QuizParseError("missing question text")
+    missing = [letter for letter in OPTION_LETTERS if not options.get(letter)]
+    if missing:
+        raise QuizParseError(f"missing option(s) {', '.join(missing)}")
+    if not fields.get("answer"):
+        raise QuizParseError("missing answer")
+
+    option_list = [options[letter] for letter in OPTION_LETTERS]
+    return Question(
+        text,
+        option_list,
+        _answer_index(fields["answer"], option_list),
+        fields.get("explanation", ""),
+        fields.get("topic") or default_topic
+    )
+
+
+def parse_questions(text, default_topic=None):
+    """Parse every question in text; returns (questions, errors) where errors are the per-block messages"""
+    questions, errors = [], []
+    for block in split_question_blocks(text):
+        try:
+            questions.append(parse_question_block(block, default_topic))
+        except QuizParseError as e:
+            errors.append(str(e))
+    return questions, errors
@@ -0,0 +1,322 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from db.question_db import get_connection, close_connection
+from tools.practice_tool import PracticeSession
+
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite")  # "sqlite" or "memory"
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "21600"))  # idle seconds before a session expires
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_MAX_MEMORY_MB = float(os.getenv("SESSION_MAX_MEMORY_MB", "64"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "512"))
+
+
+def dumps(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+class SessionStore:
+    """
+    Where practice sessions live between requests.
+
+    Callers add() a session once it has its first question, then report
+    changes with update_questions() (more questions were generated) and
+    update_progress() (an answer was checked). The two updates are kept
+    separate so a session that is still being generated by one request can
+    be answered by another without either overwriting the other's changes.
+    """
+
+    def add(self, session):
+        raise NotImplementedError
+
+    def get(self, session_id):
+        """The session, or None if it is unknown or expired"""
+        raise NotImplementedError
+
+    def update_questions(self, session):
+        pass
+
+    def update_progress(self, session):
+        pass
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def stats(self):
+        return {}
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Live PracticeSession objects in this process, bounded three ways:
+    sessions idle for ttl seconds expire, and the least recently used are
+    evicted past max_entries or once their estimated size (the length of
+    their serialized state) exceeds max_bytes.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_entries=SESSION_MAX_ENTRIES,
+                 max_bytes=int(SESSION_MAX_MEMORY_MB * 1024 * 1024)):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # session_id -> [session, last_access, size]
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _size(self, session):
+        return len(dumps(session.to_state()))
+
+    def _expire(self, now):
+        # Entries are kept in access order, so expired ones are at the front
+        while self._entries:
+            session_id, (_, last_access, _) = next(iter(self._entries.items()))
+            if now - last_access <= self.ttl:
+                break
+            self._remove(session_id)
+            self.expirations += 1
+
+    def _remove(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry:
+            self._bytes -= entry[2]
+        return entry
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def add(self, session):
+        size = self._size(session)
+        with self._lock:
+            self._remove(session.session_id)
+            self._entries[session.session_id] = [session, time.time(), size]
+            self._bytes += size
+            self._expire(time.time())
+            self._evict()
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            entry[1] = now
+            self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def _resize(self, session):
+        size = self._size(session)
+        with self._lock:
+            entry = self._entries.get(session.session_id)
+            if entry and entry[0] is session:
+                self._bytes += size - entry[2]
+                entry[2] = size
+                self._evict()
+
+    def update_questions(self, session):
+        self._resize(session)
+
+    def update_progress(self, session):
+        self._resize(session)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._remove(session_id)
+
+    def session_ids(self):
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._entries),
+                "approx_bytes": self._bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions serialized to a shared SQLite file, so every worker process
+    sees the same sessions and they survive restarts.
+
+    Questions (Question.to_row() lists) and progress (SessionProgress
+    state) are stored as separate compact JSON columns. A
+    version number is bumped on every write; each process keeps recently
+    used sessions deserialized in a small MemorySessionStore and reuses them
+    while their version still matches the row. Expiry is by idle time and
+    the least recently used rows are deleted past max_entries.
+    """
+
+    def __init__(self, db_path=SESSION_DB_PATH, ttl=SESSION_TTL, max_entries=SESSION_MAX_ENTRIES,
+                 cache_size=SESSION_CACHE_SIZE):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.cache_hits = 0
+        self.loads = 0
+        # Live objects for sessions this process touched recently, keyed by id
+        self._cache = MemorySessionStore(ttl=ttl, max_entries=cache_size)
+        self._versions = {}
+        self._create_table()
+
+    @property
+    def conn(self):
+        return get_connection(self.db_path)[0]
+
+    def _create_table(self):
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS practice_session_state (
+            session_id TEXT PRIMARY KEY,
+            header TEXT NOT NULL,
+            questions TEXT NOT NULL,
+            progress TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            expires_at REAL NOT NULL
+        )
+        ''')
+        # Oldest expires_at is both the next to expire and the least recently used
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_session_state_expiry ON practice_session_state (expires_at)")
+        self.conn.commit()
+
+    def _remember(self, session, version):
+        self._cache.add(session)
+        self._versions[session.session_id] = version
+        if len(self._versions) > 2 * self._cache.max_entries:
+            cached = self._cache.session_ids()
+            self._versions = {session_id: self._versions.get(session_id) for session_id in cached}
+
+    def add(self, session):
+        state = session.to_state()
+        header = {key: state[key] for key in ("session_id", "topic", "user_id", "start_time")}
+        now = time.time()
+        conn = self.conn
+        conn.execute(
+            """INSERT OR REPLACE INTO practice_session_state
+               (session_id, header, questions, progress, version, expires_at) VALUES (?, ?, ?, ?, 1, ?)""",
+            (session.session_id, dumps(header), dumps(state["questions"]), dumps(state["progress"]), now + self.ttl)
+        )
+        conn.execute("DELETE FROM practice_session_state WHERE expires_at < ?", (now,))
+        excess = conn.execute("SELECT COUNT(*) FROM practice_session_state").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                """DELETE FROM practice_session_state WHERE session_id IN
+                   (SELECT session_id FROM practice_session_state ORDER BY expires_at LIMIT ?)""",
+                (excess,)
+            )
+            self.evictions += excess
+        conn.commit()
+        self._remember(session, 1)
+
+    def get(self, session_id):
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT version, expires_at FROM practice_session_state WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or row[1] < now:
+            self._cache.delete(session_id)
+            return None
+        version, expires_at = row
+
+        # Refresh the idle timer at most once a minute per session
+        if expires_at - now < self.ttl - 60:
+            self.conn.execute(
+                "UPDATE practice_session_state SET expires_at = ? WHERE session_id = ?", (now + self.ttl, session_id)
+            )
+            self.conn.commit()
+
+        session = self._cache.get(session_id)
+        if session is not None and self._versions.get(session_id) == version:
+            self.cache_hits += 1
+            return session
+
+        row = self.conn.execute(
+            "SELECT header, questions, progress, version FROM practice_session_state WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            state = json.loads(row[0])
+            state["questions"] = json.loads(row[1])
+            state["progress"] = json.loads(row[2])
+            session = PracticeSession.from_state(state)
+        except (ValueError, KeyError, TypeError) as e:
+            # Written by an incompatible version; treat it like an expired session
+            print(f"Discarding unreadable session {session_id}: {e}")
+            self.delete(session_id)
+            return None
+        self.loads += 1
+        self._remember(session, row[3])
+        return session
+
+    def _update(self, session, column, value):
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                f"""UPDATE practice_session_state SET {column} = ?, version = version + 1, expires_at = ?
+                    WHERE session_id = ?""",
+                (dumps(value), time.time() + self.ttl, session.session_id)
+            )
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return
+            version = conn.execute(
+                "SELECT version FROM practice_session_state WHERE session_id = ?", (session.session_id,)
+            ).fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        if version == self._versions.get(session.session_id, 0) + 1 and self._cache.get(session.session_id) is session:
+            self._remember(session, version)
+        else:
+            # Another process wrote the other half in between; reload on next get()
+            self._cache.delete(session.session_id)
+
+    def update_questions(self, session):
+        self._update(session, "questions", session.question_state())
+
+    def update_progress(self, session):
+        self._update(session, "progress", session.progress_state())
+
+    def delete(self, session_id):
+        self.conn.execute("DELETE FROM practice_session_state WHERE session_id = ?", (session_id,))
+        self.conn.commit()
+        self._cache.delete(session_id)
+
+    def stats(self):
+        return {
+            "backend": "sqlite",
+            "sessions": self.conn.execute("SELECT COUNT(*) FROM practice_session_state").fetchone()[0],
+            "cached": self._cache.stats()["sessions"],
+            "cache_hits": self.cache_hits,
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+    def close(self):
+        close_connection(self.db_path)
+
+
+def create_session_store():
+    """The store selected by SESSION_STORE"""
+    if SESSION_STORE == "memory":
+        return MemorySessionStore()
+    return SQLiteSessionStore()
@@ -0,0 +1,138 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+
+
+def normalize_question(text):
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class AnswerCache:
+    """
+    In-memory cache of answers to "ask" mode questions.
+
+    Lookups try the normalized question text first, then the nearest
+    previously answered question by cosine similarity of their embeddings.
+    Entries expire after ttl seconds, the least recently used are evicted
+    past max_entries, and the whole cache is dropped when the document index
+    version changes.
+    """
+
+    def __init__(self, embeddings=None, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 threshold=ANSWER_CACHE_THRESHOLD):
+        self.embeddings = embeddings
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.index_version = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # normalized question -> entry dict
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+
+    def _check_version(self, index_version):
+        if index_version != self.index_version:
+            self._entries.clear()
+            self._matrix = None
+            self.index_version = index_version
+
+    def _expire(self):
+        now = time.time()
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _embed(self, text):
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _nearest(self, vector):
+        if self._matrix is None:
+            self._matrix_keys = [key for key, entry in self._entries.items() if entry["vector"] is not None]
+            if not self._matrix_keys:
+                return None, 0.0
+            self._matrix = np.stack([self._entries[key]["vector"] for key in self._matrix_keys])
+        if not self._matrix_keys:
+            return None, 0.0
+
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        return self._matrix_keys[best], float(scores[best])
+
+    def get(self, question, index_version=None):
+        """Return (answer, vector) where answer is None on a miss; pass vector on to put()"""
+        key = normalize_question(question)
+        with self._lock:
+            self._check_version(index_version)
+            self._expire()
+
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry["answer"], entry["vector"]
+
+        if self.embeddings is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        # Embed outside the lock, it is by far the slowest step
+        vector = self._embed(question)
+        with self._lock:
+            match_key, score = self._nearest(vector)
+            if match_key is not None and score >= self.threshold and match_key in self._entries:
+                self._entries.move_to_end(match_key)
+                self.semantic_hits += 1
+                return self._entries[match_key]["answer"], vector
+            self.misses += 1
+        return None, vector
+
+    def put(self, question, answer, index_version=None, vector=None):
+        key = normalize_question(question)
+        if vector is None and self.embeddings is not None:
+            vector = self._embed(question)
+
+        with self._lock:
+            self._check_version(index_version)
+            self._entries[key] = {
+                "answer": answer,
+                "vector": vector,
+                "created_at": time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,168 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, List
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from utils import metrics
+
+WORD = re.compile(r"\w+")
+# Formula names, section numbers and hyphenated terms are also indexed whole: "3.2", "navier-stokes"
+COMPOUND = re.compile(r"\w+(?:[.\-/]\w+)+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how in is it of on or that the this to was what when "
+    "where which who why with".split()
+)
+
+
+def tokenize(text):
+    text = text.lower()
+    tokens = [token for token in WORD.findall(text) if token not in STOPWORDS]
+    tokens.extend(COMPOUND.findall(text))
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory inverted index over the chunks of a vector store, scored with
+    Okapi BM25. Postings are kept as numpy arrays of (chunk position, term
+    frequency), so a query only touches the chunks that contain its terms.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.documents = list(documents)
+        self.k1 = k1
+        self.b = b
+
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(len(self.documents), dtype=np.float32)
+        for position, doc in enumerate(self.documents):
+            counts = Counter(tokenize(doc.page_content))
+            lengths[position] = sum(counts.values())
+            for term, count in counts.items():
+                positions, frequencies = postings[term]
+                positions.append(position)
+                frequencies.append(count)
+
+        self._postings = {
+            term: (np.asarray(positions, dtype=np.int32), np.asarray(frequencies, dtype=np.float32))
+            for term, (positions, frequencies) in postings.items()
+        }
+        average = float(lengths.mean()) if len(lengths) else 0.0
+        # Per-chunk part of the BM25 denominator, computed once
+        self._norms = k1 * (1 - b + b * lengths / average) if average else lengths
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, **kwargs):
+        """Index every chunk stored in a FAISS vector store"""
+        docs = [vectorstore.docstore.search(doc_id) for doc_id in vectorstore.index_to_docstore_id.values()]
+        return cls([doc for doc in docs if isinstance(doc, Document)], **kwargs)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query, k=10):
+        """The k best matching chunks as (document, score), best first"""
+        if not self.documents:
+            return []
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            positions, frequencies = posting
+            idf = math.log(1 + (len(self.documents) - len(positions) + 0.5) / (len(positions) + 0.5))
+            scores[positions] += idf * frequencies * (self.k1 + 1) / (frequencies + self._norms[positions])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(self.documents[i], float(scores[i])) for i in matched]
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a small sentence-transformers
+    cross-encoder on the CPU. The model is loaded on first use; if it cannot
+    be loaded, rerank() keeps the order it was given.
+    """
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", max_length=512):
+        self.model_name = model_name
+        self.max_length = max_length
+        self._model = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None and not self._failed:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+                except Exception as e:
+                    print(f"Reranker unavailable, using fused ranking: {e}")
+                    self._failed = True
+        return self._model
+
+    def rerank(self, query, documents):
+        model = self._load()
+        if model is None or len(documents) < 2:
+            return documents
+        scores = model.predict([(query, doc.page_content) for doc in documents])
+        order = sorted(range(len(documents)), key=lambda i: -scores[i])
+        return [documents[i] for i in order]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Combines BM25 keyword matches with vector similarity.
+
+    fetch_k candidates come from each index and are merged by reciprocal
+    rank fusion, so chunks that name the exact term asked about are found
+    even when their embedding is not among the nearest. The best
+    rerank_candidates of those are reordered by the reranker, if any, and
+    the top k are returned. vectorstore stays reachable for callers that run
+    their own searches on it (e.g. MMR in the practice tool).
+    """
+
+    vectorstore: Any
+    bm25: Any
+    reranker: Any = None
+    k: int = 3
+    fetch_k: int = 20
+    rerank_candidates: int = 10
+    rrf_k: int = 60
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def fused(self, query):
+        """Candidates from both indexes, best first by reciprocal rank fusion"""
+        with metrics.span("embed_query"):
+            vector = self.vectorstore.embeddings.embed_query(query)
+        with metrics.span("vector_search"):
+            vector_docs = self.vectorstore.similarity_search_by_vector(vector, k=self.fetch_k)
+        with metrics.span("bm25_search"):
+            keyword_docs = [doc for doc, _ in self.bm25.search(query, self.fetch_k)]
+        ranked = [vector_docs, keyword_docs]
+        scores = defaultdict(float)
+        docs = {}
+        for results in ranked:
+            for rank, doc in enumerate(results):
+                key = doc.page_content
+                scores[key] += 1.0 / (self.rrf_k + rank + 1)
+                docs.setdefault(key, doc)
+        return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        candidates = self.fused(query)
+        if self.reranker is not None:
+            with metrics.span("rerank"):
+                head = self.reranker.rerank(query, candidates[:self.rerank_candidates])
+            candidates = head + candidates[self.rerank_candidates:]
+        return candidates[:self.k]
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Return the hex SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexManifest:
+    """
+    Tracks which source files are in a persisted FAISS index.
+
+    For every indexed file we keep its size, mtime, content hash and the ids of
+    the chunks it produced, so a later run can tell which files were added,
+    changed or removed and touch only those chunks in the index.
+    """
+
+    def __init__(self, index_dir, embedding_model=None, chunking=None, index_type=None):
+        self.index_dir = index_dir
+        self.path = os.path.join(index_dir, MANIFEST_NAME)
+        self.embedding_model = embedding_model
+        self.chunking = chunking
+        self.index_type = index_type
+        self.files = {}
+        self.stats_refreshed = False  # diff() updated stats that save() has not written yet
+
+    @classmethod
+    def load(cls, index_dir, embedding_model=None, chunking=None, index_type=None):
+        manifest = cls(index_dir, embedding_model, chunking, index_type)
+        if not os.path.exists(manifest.path):
+            return manifest
+
+        try:
+            with open(manifest.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable index manifest {manifest.path}: {e}")
+            return manifest
+
+        # A different embedding model, chunking setup, index type or manifest
+        # layout means none of the stored vectors can be reused
+        if data.get("version") != MANIFEST_VERSION:
+            return manifest
+        if embedding_model and data.get("embedding_model") != embedding_model:
+            return manifest
+        if chunking and data.get("chunking") != chunking:
+            return manifest
+        # Indexes written before index types were configurable are flat
+        if index_type and data.get("index_type", "flat") != index_type:
+            return manifest
+
+        manifest.files = data.get("files", {})
+        return manifest
+
+    def save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "embedding_model": self.embedding_model,
+            "chunking": self.chunking,
+            "index_type": self.index_type,
+            "files": self.files
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self.stats_refreshed = False
+
+    def diff(self, file_paths):
+        """
+        Compare the given files against the manifest.
+
+        Returns (to_embed, stale_paths) where to_embed is a list of
+        (path, stat, sha256) for new or changed files and stale_paths lists
+        manifest entries whose chunks must be removed from the index.
+        """
+        current = {os.path.normpath(p) for p in file_paths}
+        to_embed = []
+        stale_paths = [p for p in self.files if p not in current]
+
+        for path in sorted(current):
+            stat = os.stat(path)
+            entry = self.files.get(path)
+
+            # Cheap check first: same size and mtime means same file
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+
+            sha = file_sha256(path)
+            if entry and entry["sha256"] == sha:
+                # Re-downloaded but identical content, just refresh the stat
+                entry["size"] = stat.st_size
+                entry["mtime"] = stat.st_mtime
+                self.stats_refreshed = True
+                continue
+
+            if entry:
+                stale_paths.append(path)
+            to_embed.append((path, stat, sha))
+
+        return to_embed, stale_paths
+
+    def chunk_ids(self, paths):
+        ids = []
+        for path in paths:
+            ids.extend(self.files.get(path, {}).get("chunk_ids", []))
+        return ids
+
+    def record(self, path, stat, sha, chunk_ids):
+        self.files[path] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": sha,
+            "chunk_ids": list(chunk_ids)
+        }
+
+    def forget(self, paths):
+        for path in paths:
+            self.files.pop(path, None)
+
+    def fingerprint(self):
+        """Short hash identifying the indexed content, changes whenever a file does"""
+        digest = hashlib.sha256()
+        for path in sorted(self.files):
+            digest.update(f"{path}\0{self.files[path]['sha256']}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from db.question_db import get_connection
+
+LLM_CACHE = os.getenv("LLM_CACHE", "sqlite")  # or "none" to always call the LLM
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 86400)))
+
+
+def llm_params(llm_string):
+    """(model, temperature, stop) from a LangChain llm_string, or the whole string for models we can't parse"""
+    config, _, params = llm_string.partition("---")
+    try:
+        kwargs = json.loads(config).get("kwargs", {})
+    except ValueError:
+        return llm_string, None, None
+    model = kwargs.get("model_name") or kwargs.get("model") or config
+    return model, kwargs.get("temperature"), params
+
+
+def cache_key(model, temperature, prompt, stop=None):
+    """
+    Hash of what decides an LLM's answer. The prompt carries the retrieved
+    chunks' text, so the same question over changed chunks is a new key.
+    """
+    digest = hashlib.sha256()
+    for part in (model, repr(temperature), stop or "", prompt):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMCache(BaseCache):
+    """
+    SQLite-backed LangChain cache of LLM generations.
+
+    Entries are keyed by cache_key() over the model, temperature, stop
+    words and the full prompt (retrieved context included), so only calls
+    that would send identical requests are answered locally; other settings
+    such as streaming do not split the cache. The file is shared by all
+    worker processes. Entries expire after ttl seconds, and the least
+    recently used are evicted once there are more than max_entries or the
+    stored generations exceed max_mb.
+    """
+
+    def __init__(self, db_path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, max_mb=LLM_CACHE_MAX_MB,
+                 ttl=LLM_CACHE_TTL):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        conn = self.conn
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            generations TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+        conn.commit()
+
+    @property
+    def conn(self):
+        return get_connection(self.db_path)[0]
+
+    def _key(self, prompt, llm_string):
+        model, temperature, stop = llm_params(llm_string)
+        return cache_key(model, temperature, prompt, stop)
+
+    def lookup(self, prompt, llm_string):
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT generations FROM llm_cache WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+        ).fetchone()
+        generations = None
+        if row is not None:
+            try:
+                generations = [loads(generation) for generation in json.loads(row[0])]
+                for generation in generations:
+                    # Lets the metrics tell cached answers from real LLM calls
+                    generation.generation_info = dict(generation.generation_info or {}, llm_cache=True)
+            except Exception:
+                # Written by an incompatible LangChain version; the next call replaces it
+                pass
+        with self._lock:
+            if generations is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.conn.execute("UPDATE llm_cache SET hits = hits + 1, last_used = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        model, temperature, stop = llm_params(llm_string)
+        generations = json.dumps([dumps(generation) for generation in return_val])
+        now = time.time()
+        self.conn.execute(
+            """INSERT OR REPLACE INTO llm_cache (key, model, generations, size, created_at, last_used)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (cache_key(model, temperature, prompt, stop), model, generations, len(generations), now, now)
+        )
+        self.conn.commit()
+        self._evict(now)
+
+    def _evict(self, now):
+        conn = self.conn
+        expired = conn.execute("DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl,)).rowcount
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        excess = 0
+        if count > self.max_entries or size > self.max_bytes:
+            # Trim to 90% so we don't evict on every single insert
+            excess = max(count - int(self.max_entries * 0.9), 0)
+            if size > self.max_bytes * 0.9:
+                # Enough of the oldest entries to get under 90% of the size limit
+                target = size - int(self.max_bytes * 0.9)
+                freed = 0
+                rows = conn.execute("SELECT size FROM llm_cache ORDER BY last_used ASC").fetchall()
+                for position, (entry_size,) in enumerate(rows, 1):
+                    freed += entry_size
+                    if freed >= target:
+                        excess = max(excess, position)
+                        break
+            conn.execute(
+                """DELETE FROM llm_cache WHERE key IN
+                   (SELECT key FROM llm_cache ORDER BY last_used ASC LIMIT ?)""",
+                (excess,)
+            )
+        conn.commit()
+        with self._lock:
+            self.evictions += expired + excess
+
+    def clear(self, **kwargs):
+        self.conn.execute("DELETE FROM llm_cache")
+        self.conn.commit()
+
+    def stats(self):
+        count, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": count,
+            "size_mb": round(size / (1024 * 1024), 2),
+            "evictions": self.evictions
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """The process-wide LLM cache, or None when LLM_CACHE=none"""
+    global _cache
+    if LLM_CACHE == "none":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
@@ -0,0 +1,54 @@
+import os
+import threading
+import httpx
+import openai
+from langchain_community.chat_models import ChatOpenAI
+from utils.llm_cache import get_llm_cache
+from utils.metrics import llm_handler
+
+LLM_MODEL = "llama3-70b-8192"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def _pooled_clients():
+    """One sync and one async OpenAI client per process, each with a bounded connection pool"""
+    with _lock:
+        if not _clients:
+            limits = httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS
+            )
+            params = {
+                "api_key": os.getenv("OPENAI_API_KEY"),
+                "base_url": os.getenv("OPENAI_API_BASE"),
+                "timeout": LLM_TIMEOUT
+            }
+            _clients["sync"] = openai.OpenAI(
+                http_client=httpx.Client(limits=limits, timeout=LLM_TIMEOUT), **params
+            )
+            _clients["async"] = openai.AsyncOpenAI(
+                http_client=httpx.AsyncClient(limits=limits, timeout=LLM_TIMEOUT), **params
+            )
+        return _clients["sync"], _clients["async"]
+
+
+def make_chat_llm(temperature=0.7, streaming=False, cache=True):
+    """
+    ChatOpenAI that reuses the process-wide connection pools. With cache it
+    answers repeated prompts from the LLM cache; pass cache=False where a
+    fresh response is wanted for the same prompt, e.g. generating quizzes.
+    """
+    sync_client, async_client = _pooled_clients()
+    return ChatOpenAI(
+        model_name=LLM_MODEL,
+        temperature=temperature,
+        streaming=streaming,
+        client=sync_client.chat.completions,
+        async_client=async_client.chat.completions,
+        cache=get_llm_cache() if cache else False,
+        callbacks=[llm_handler]
+    )
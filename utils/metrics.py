@@ -0,0 +1,280 @@
+import bisect
+import contextlib
+import cProfile
+import os
+import random
+import threading
+import time
+import uuid
+from langchain_core.callbacks import BaseCallbackHandler
+
+METRICS_PROFILE_SAMPLE = float(os.getenv("METRICS_PROFILE_SAMPLE", "0"))  # fraction of requests to profile
+METRICS_PROFILE_DIR = os.getenv("METRICS_PROFILE_DIR", "profiles")
+
+# Seconds; wide enough for both SQLite writes and slow LLM calls
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination, as Prometheus expects"""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        labelnames = self.labelnames + ("le",)
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_label_text(labelnames, labels + (_number(bound),))} "
+                                 f"{cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, labels)} {_number(total)}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read at scrape time from a callback returning a number or a
+    {labels: number} dict. kind="counter" exposes totals that components
+    already keep (e.g. cache hits) as counters.
+    """
+
+    def __init__(self, name, help_text, callback, labelnames=(), kind="gauge"):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def render(self):
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Error reading metric {self.name}: {e}")
+            return []
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(values.items()):
+            labels = labels if isinstance(labels, tuple) else (labels,)
+            lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            # Re-registering (e.g. a reloaded module) replaces the old metric
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, callback, labelnames=(), kind="gauge"):
+        return self._add(Gauge(name, help_text, callback, labelnames, kind))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "learningbuddy_stage_seconds", "Time spent in each stage of handling requests and indexing", ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter("learningbuddy_stage_errors_total", "Stages that raised an exception", ("stage",))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "learningbuddy_http_request_seconds", "HTTP request latency", ("method", "route", "status")
+)
+LLM_TOKENS = REGISTRY.counter("learningbuddy_llm_tokens_total", "LLM tokens used", ("type",))
+
+
+def observe(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage)
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time the enclosed block as one observation of stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+
+
+def observe_request(method, route, status, seconds):
+    REQUEST_SECONDS.observe(seconds, method, route, str(status))
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Records every LLM call as the "llm" stage, or "llm_cached" when the LLM
+    cache answered it, and counts the tokens of real calls. Providers that
+    don't report usage while streaming get their streamed tokens counted as
+    completion tokens instead.
+    """
+
+    def __init__(self):
+        self._runs = {}  # run_id -> [start time, streamed tokens]
+        self._lock = threading.Lock()
+
+    def _start(self, run_id):
+        with self._lock:
+            self._runs[run_id] = [time.perf_counter(), 0]
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is not None:
+                run[1] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        generations = [generation for batch in response.generations for generation in batch]
+        if generations and all((generation.generation_info or {}).get("llm_cache") for generation in generations):
+            observe("llm_cached", time.perf_counter() - run[0])
+            return
+        observe("llm", time.perf_counter() - run[0])
+
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            LLM_TOKENS.inc("prompt", amount=usage.get("prompt_tokens", 0))
+            LLM_TOKENS.inc("completion", amount=usage.get("completion_tokens", 0))
+        elif run[1]:
+            LLM_TOKENS.inc("completion", amount=run[1])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None:
+            observe("llm", time.perf_counter() - run[0])
+            STAGE_ERRORS.inc("llm")
+
+
+llm_handler = LLMMetricsHandler()
+
+
+def start_profile():
+    """
+    Start profiling the current request for a METRICS_PROFILE_SAMPLE fraction
+    of requests; returns a handle for stop_profile() or None. Uses the
+    pyinstrument sampling profiler when it is installed, cProfile otherwise.
+    """
+    if METRICS_PROFILE_SAMPLE <= 0 or random.random() >= METRICS_PROFILE_SAMPLE:
+        return None
+    try:
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        return "pyinstrument", profiler
+    except ImportError:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except (ValueError, RuntimeError):
+            # Only one cProfile can run at a time; skip concurrent requests
+            return None
+        return "cprofile", profiler
+    except RuntimeError:
+        # pyinstrument is already profiling this thread
+        return None
+
+
+def stop_profile(handle, name):
+    """Stop a profile started by start_profile() and write it to METRICS_PROFILE_DIR"""
+    kind, profiler = handle
+    os.makedirs(METRICS_PROFILE_DIR, exist_ok=True)
+    slug = name.strip("/").replace("/", "_").replace("<", "").replace(">", "") or "index"
+    path = os.path.join(METRICS_PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{uuid.uuid4().hex[:6]}")
+    try:
+        if kind == "pyinstrument":
+            profiler.stop()
+            with open(path + ".html", "w") as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.disable()
+            profiler.dump_stats(path + ".prof")
+    except Exception as e:
+        print(f"Error writing profile {path}: {e}")
@@ -0,0 +1,125 @@
+import re
+import threading
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Requests that need the agent's other tools rather than a document lookup
+AGENT_PATTERN = re.compile(
+    r"\b(practice|quiz|quizzes|mcqs?|multiple[- ]choice)\b|session:|answer:|topic:",
+    re.IGNORECASE
+)
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts LLM round-trips made while handling one request"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.calls += 1
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.calls += 1
+
+
+class QueryRouter:
+    """
+    Sends plain document questions straight to the RetrievalQA chain.
+
+    The ReAct agent spends at least one extra LLM call deciding to use
+    DriveRAGTool and another to restate its answer, so it is only used for
+    requests that mention practice/quiz features or when the direct chain
+    fails.
+    """
+
+    def __init__(self, qa_chain, agent):
+        self.qa_chain = qa_chain
+        self.agent = agent
+        self._lock = threading.Lock()
+        self._stats = {
+            route: {"requests": 0, "llm_calls": 0, "seconds": 0.0}
+            for route in ("direct", "agent")
+        }
+
+    def route(self, question):
+        return "agent" if AGENT_PATTERN.search(question) else "direct"
+
+    def run(self, question, stream_handler=None):
+        """
+        Answer question, returning (answer, timing) for the route that was used.
+
+        stream_handler receives tokens on the direct route only; the agent's
+        intermediate thoughts are not meant for the user.
+        """
+        route = self.route(question)
+        counter = LLMCallCounter()
+        start = time.perf_counter()
+
+        if route == "direct":
+            try:
+                callbacks = [counter, stream_handler] if stream_handler else [counter]
+                answer = self.qa_chain.run(question, callbacks=callbacks)
+            except Exception as e:
+                print(f"Direct retrieval failed, falling back to agent: {e}")
+                route = "agent"
+
+        if route == "agent":
+            answer = self.agent.run(question, callbacks=[counter])
+
+        return answer, self._record(route, counter, start)
+
+    async def arun(self, question, stream_handler=None):
+        """Async version of run(); LLM and retrieval calls are awaited instead of blocking a thread"""
+        route = self.route(question)
+        counter = LLMCallCounter()
+        start = time.perf_counter()
+
+        if route == "direct":
+            try:
+                callbacks = [counter, stream_handler] if stream_handler else [counter]
+                answer = await self.qa_chain.arun(question, callbacks=callbacks)
+            except Exception as e:
+                print(f"Direct retrieval failed, falling back to agent: {e}")
+                route = "agent"
+
+        if route == "agent":
+            answer = await self.agent.arun(question, callbacks=[counter])
+
+        return answer, self._record(route, counter, start)
+
+    def _record(self, route, counter, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            stats = self._stats[route]
+            stats["requests"] += 1
+            stats["llm_calls"] += counter.calls
+            stats["seconds"] += elapsed
+
+        return {
+            "route": route,
+            "llm_calls": counter.calls,
+            "latency_ms": round(elapsed * 1000, 1)
+        }
+
+    def stats(self):
+        """Per-route averages plus the estimated LLM calls and time the direct route saved"""
+        with self._lock:
+            summary = {}
+            for route, stats in self._stats.items():
+                requests = stats["requests"]
+                summary[route] = {
+                    "requests": requests,
+                    "avg_llm_calls": round(stats["llm_calls"] / requests, 2) if requests else None,
+                    "avg_latency_ms": round(stats["seconds"] * 1000 / requests, 1) if requests else None
+                }
+
+        direct, agent = summary["direct"], summary["agent"]
+        if direct["requests"] and agent["requests"]:
+            summary["llm_calls_saved"] = round(
+                (agent["avg_llm_calls"] - direct["avg_llm_calls"]) * direct["requests"], 1
+            )
+            summary["seconds_saved"] = round(
+                (agent["avg_latency_ms"] - direct["avg_latency_ms"]) * direct["requests"] / 1000, 1
+            )
+        return summary
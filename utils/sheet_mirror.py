@@ -0,0 +1,278 @@
+import atexit
+import os
+import re
+import threading
+import time
+
+SHEETS_BACKEND = os.getenv("SHEETS_BACKEND", "google")  # or "memory" for an in-process sheet
+SHEETS_CREDENTIALS = os.getenv("SHEETS_CREDENTIALS", "credentials.json")
+SHEETS_NAME = os.getenv("SHEETS_NAME", "MySheet")
+SHEETS_CACHE_TTL = float(os.getenv("SHEETS_CACHE_TTL", "60"))  # seconds before the mirror checks the sheet again
+SHEETS_FLUSH_SIZE = int(os.getenv("SHEETS_FLUSH_SIZE", "50"))  # buffered writes that trigger a flush
+SHEETS_FLUSH_SECONDS = float(os.getenv("SHEETS_FLUSH_SECONDS", "2"))  # longest a write waits in the buffer
+
+
+class GoogleSheetBackend:
+    """First worksheet of a Google spreadsheet, through gspread"""
+
+    def __init__(self, name=SHEETS_NAME, credentials_file=SHEETS_CREDENTIALS):
+        import gspread
+        from google.oauth2.service_account import Credentials
+
+        self._gspread = gspread
+        creds = Credentials.from_service_account_file(
+            credentials_file, scopes=["https://www.googleapis.com/auth/spreadsheets"]
+        )
+        self.spreadsheet = gspread.authorize(creds).open(name)
+        self.worksheet = self.spreadsheet.sheet1
+
+    def get_all_values(self):
+        return self.worksheet.get_all_values()
+
+    def append_rows(self, rows):
+        self.worksheet.append_rows(rows)
+
+    def update_cells(self, cells):
+        """Write (row, col, value) cells, 1-based, in one request"""
+        # USER_ENTERED like worksheet.update_cell, so numbers and dates aren't stored as text
+        self.worksheet.update_cells(
+            [self._gspread.Cell(row, col, value) for row, col, value in cells], value_input_option="USER_ENTERED"
+        )
+
+    def version(self):
+        # Drive's modified time is one small request instead of reading the sheet;
+        # None (older gspread) makes the mirror reload every time its TTL expires
+        get_update_time = getattr(self.spreadsheet, "get_lastUpdateTime", None)
+        return get_update_time() if get_update_time else None
+
+
+class MemorySheet:
+    """
+    Sheet kept in process memory, with the same methods as
+    GoogleSheetBackend. Used with SHEETS_BACKEND=memory and by the
+    benchmark; counts calls so batching can be checked.
+    """
+
+    def __init__(self, header=("Name", "Role", "Age"), rows=()):
+        self.values = [list(header)] + [[str(value) for value in row] for row in rows]
+        self._version = 0
+        self.reads = 0
+        self.writes = 0
+
+    def get_all_values(self):
+        self.reads += 1
+        return [list(row) for row in self.values]
+
+    def append_rows(self, rows):
+        self.writes += 1
+        self.values.extend([str(value) for value in row] for row in rows)
+        self._version += 1
+
+    def update_cells(self, cells):
+        self.writes += 1
+        for row, col, value in cells:
+            target = self.values[row - 1]
+            target.extend([""] * (col - len(target)))
+            target[col - 1] = str(value)
+        self._version += 1
+
+    def version(self):
+        return self._version
+
+
+def get_backend():
+    """Pick the sheet backend from SHEETS_BACKEND ("google" or "memory")"""
+    if SHEETS_BACKEND == "memory":
+        return MemorySheet()
+    return GoogleSheetBackend()
+
+
+def _numericise(value):
+    # get_all_records turns numeric cells into numbers; keep that for callers
+    if isinstance(value, str) and re.fullmatch(r"-?\d+(\.\d+)?", value.strip()):
+        return float(value) if "." in value else int(value)
+    return value
+
+
+class SheetMirror:
+    """
+    Local copy of a sheet with an index from the key column to rows.
+
+    The sheet client is created on first use. Reads are served from the
+    copy, which is refreshed once it is older than ttl seconds, and only
+    reloaded if the sheet's version changed since. Writes are applied to the
+    copy straight away and buffered: cell updates to the same cell replace
+    each other, updates to rows not yet appended change the pending row,
+    and the buffer goes out as one update and one append request when it
+    holds flush_size writes, after flush_seconds, before a reload and at
+    exit.
+    """
+
+    def __init__(self, backend_factory=get_backend, key="Name", ttl=SHEETS_CACHE_TTL,
+                 flush_size=SHEETS_FLUSH_SIZE, flush_seconds=SHEETS_FLUSH_SECONDS):
+        self.backend_factory = backend_factory
+        self.key = key
+        self.ttl = ttl
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.reloads = 0
+        self.flushes = 0
+
+        self._backend = None
+        self.header = []
+        self._rows = []
+        self._index = {}  # lowercased key -> position in _rows
+        self._remote_rows = 0  # rows of _rows that exist on the sheet
+        self._loaded_at = None
+        self._version = None
+        self._pending_cells = {}  # (row, col) on the sheet -> value
+        self._timer = None
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    @property
+    def backend(self):
+        with self._lock:
+            if self._backend is None:
+                self._backend = self.backend_factory()
+            return self._backend
+
+    def _load(self):
+        values = self.backend.get_all_values()
+        self.header = values[0] if values else []
+        self._rows = [row + [""] * (len(self.header) - len(row)) for row in values[1:]]
+        self._remote_rows = len(self._rows)
+        self._index = {}
+        if self.key in self.header:
+            column = self.header.index(self.key)
+            for position, row in enumerate(self._rows):
+                # First match wins, as with a top-down scan
+                self._index.setdefault(row[column].lower(), position)
+        self.reloads += 1
+
+    def refresh(self, force=False):
+        """Bring the copy up to date if it is older than ttl (or always with force)"""
+        with self._lock:
+            now = time.time()
+            if not force and self._loaded_at is not None and now - self._loaded_at < self.ttl:
+                return
+            if not self.flush():
+                # Reloading would drop the unsent writes, so serve the copy (which has them) until they go through
+                self._loaded_at = now
+                return
+            version = self.backend.version()
+            if force or self._loaded_at is None or version is None or version != self._version:
+                self._load()
+            self._version = version
+            self._loaded_at = now
+
+    def _record(self, position):
+        return {field: _numericise(value) for field, value in zip(self.header, self._rows[position])}
+
+    def get(self, key_value):
+        """Row whose key column matches key_value (case-insensitive) as a dict, or None"""
+        with self._lock:
+            self.refresh()
+            position = self._index.get(str(key_value).lower())
+            return None if position is None else self._record(position)
+
+    def append(self, row):
+        with self._lock:
+            self.refresh()
+            # Values are sent as given, so numbers stay numbers on the sheet
+            row = list(row)
+            self._rows.append(row + [""] * (len(self.header) - len(row)))
+            if self.key in self.header:
+                self._index.setdefault(str(row[self.header.index(self.key)]).lower(), len(self._rows) - 1)
+            self._buffered()
+
+    def update(self, key_value, field, value):
+        """Set one field of the matching row; returns False if there is no such row"""
+        with self._lock:
+            self.refresh()
+            position = self._index.get(str(key_value).lower())
+            if position is None:
+                return False
+            column = self.header.index(field)
+            row = self._rows[position]
+            old_key = str(row[self.header.index(self.key)]).lower()
+            row[column] = str(value)
+            if field == self.key:
+                self._reindex(old_key, position)
+            # Rows still waiting to be appended already carry the new value
+            if position < self._remote_rows:
+                self._pending_cells[(position + 2, column + 1)] = str(value)
+            self._buffered()
+            return True
+
+    def _reindex(self, old_key, position):
+        column = self.header.index(self.key)
+        if self._index.get(old_key) == position:
+            del self._index[old_key]
+            # A later row with the old key, if any, becomes the match
+            for other, row in enumerate(self._rows):
+                if str(row[column]).lower() == old_key:
+                    self._index[old_key] = other
+                    break
+        new_key = str(self._rows[position][column]).lower()
+        if self._index.get(new_key, position) >= position:
+            self._index[new_key] = position
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending_cells) + len(self._rows) - self._remote_rows
+
+    def _buffered(self):
+        if self.pending() >= self.flush_size:
+            self.flush()
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._timer is None and self.flush_seconds > 0:
+            self._timer = threading.Timer(self.flush_seconds, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """
+        Send buffered writes to the sheet. Returns False if that failed; the
+        writes then stay buffered and are retried after flush_seconds.
+        """
+        with self._lock:
+            try:
+                self._flush()
+                return True
+            except Exception as e:
+                print(f"Error writing to Google Sheets: {e}")
+                self._schedule_flush()
+                return False
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        wrote = False
+        if self._pending_cells:
+            cells = [(row, col, value) for (row, col), value in self._pending_cells.items()]
+            self.backend.update_cells(cells)
+            self._pending_cells = {}
+            wrote = True
+        if len(self._rows) > self._remote_rows:
+            self.backend.append_rows(self._rows[self._remote_rows:])
+            self._remote_rows = len(self._rows)
+            wrote = True
+        if wrote:
+            self.flushes += 1
+            if self._version is not None:
+                # Our own writes change the sheet's version; the copy already has them
+                self._version = self.backend.version()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": len(self._rows),
+                "pending_writes": self.pending(),
+                "reloads": self.reloads,
+                "flushes": self.flushes
+            }
@@ -0,0 +1,259 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from db.question_db import get_connection
+from utils.slack_reporter import SlackReporter
+
+SLACK_OUTBOX_PATH = os.getenv("SLACK_OUTBOX_PATH", "slack_outbox.db")
+SLACK_MAX_ATTEMPTS = int(os.getenv("SLACK_MAX_ATTEMPTS", "8"))
+SLACK_BACKOFF_BASE = float(os.getenv("SLACK_BACKOFF_BASE", "2"))  # seconds before the first retry, doubling after
+SLACK_BACKOFF_MAX = float(os.getenv("SLACK_BACKOFF_MAX", "300"))
+# With a digest window, reports to the same channel are gathered for that many seconds and sent as one message
+SLACK_DIGEST_SECONDS = float(os.getenv("SLACK_DIGEST_SECONDS", "0"))
+SLACK_DIGEST_MAX_REPORTS = int(os.getenv("SLACK_DIGEST_MAX_REPORTS", "20"))
+SLACK_OUTBOX_RETENTION = float(os.getenv("SLACK_OUTBOX_RETENTION", str(7 * 86400)))  # seconds to keep sent reports
+
+
+class SlackOutbox:
+    """
+    Durable queue of session reports waiting to be posted to Slack.
+
+    enqueue() only writes a row to a SQLite file and returns; a background
+    thread delivers due reports through SlackReporter. Reports that fail
+    with a rate limit, server error or timeout are retried with exponential
+    backoff (or after Slack's Retry-After) up to max_attempts times; other
+    failures are kept with their error. Workers claim reports by pushing
+    their next attempt time past the send timeout, so several processes can
+    drain the same file without posting a report twice, and a report
+    claimed by a process that died is picked up again.
+
+    With digest_seconds > 0, reports for the same channel are held until
+    the oldest is digest_seconds old (or max_digest reports are waiting)
+    and then sent together as one message.
+    """
+
+    def __init__(self, reporter=None, db_path=SLACK_OUTBOX_PATH, max_attempts=SLACK_MAX_ATTEMPTS,
+                 backoff_base=SLACK_BACKOFF_BASE, backoff_max=SLACK_BACKOFF_MAX,
+                 digest_seconds=SLACK_DIGEST_SECONDS, max_digest=SLACK_DIGEST_MAX_REPORTS,
+                 retention=SLACK_OUTBOX_RETENTION, poll_interval=5.0):
+        self.reporter = reporter or SlackReporter()
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.digest_seconds = digest_seconds
+        self.max_digest = max_digest
+        self.retention = retention
+        self.poll_interval = poll_interval
+        # How long a claimed report stays invisible to other workers
+        self.lease = self.reporter.timeout * 2 + 30
+        self.sent = 0
+        self.retries = 0
+        self.failures = 0
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._create_table()
+
+    @property
+    def conn(self):
+        return get_connection(self.db_path)[0]
+
+    def _create_table(self):
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS slack_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT,
+            report TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            sent_at REAL,
+            last_error TEXT
+        )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_slack_outbox_due ON slack_outbox (status, next_attempt_at)")
+        self.conn.commit()
+
+    def start(self):
+        """Start the delivery thread; calling it again is a no-op"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="slack-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def enqueue(self, report_data, channel=None):
+        """Queue a session report for delivery; returns its id"""
+        now = time.time()
+        cursor = self.conn.execute(
+            "INSERT INTO slack_outbox (channel, report, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+            (channel or self.reporter.default_channel, json.dumps(report_data), now, now)
+        )
+        self.conn.commit()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def get(self, report_id):
+        """Delivery status of a queued report, or None if unknown"""
+        row = self.conn.execute(
+            "SELECT id, channel, status, attempts, created_at, sent_at, last_error FROM slack_outbox WHERE id = ?",
+            (report_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "channel", "status", "attempts", "created_at", "sent_at", "last_error")
+        return dict(zip(keys, row))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                wait = self.drain()
+            except Exception as e:
+                print(f"Error delivering Slack reports: {e}")
+                wait = self.poll_interval
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def _claim(self, now):
+        """Lease the reports that are due; returns a list of (channel, [(id, report, attempts)]) batches"""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """SELECT id, channel, report, attempts, created_at FROM slack_outbox
+                   WHERE status = 'pending' AND next_attempt_at <= ?
+                   ORDER BY id LIMIT 1000""",
+                (now,)
+            ).fetchall()
+
+            by_channel = OrderedDict()
+            for row in rows:
+                by_channel.setdefault(row[1], []).append(row)
+
+            batches = []
+            for channel, channel_rows in by_channel.items():
+                if self.digest_seconds <= 0:
+                    batches.extend((channel, [row]) for row in channel_rows)
+                    continue
+                # Hold a channel's reports until its digest window closes or it is full
+                while channel_rows and (len(channel_rows) >= self.max_digest
+                                        or channel_rows[0][4] <= now - self.digest_seconds):
+                    batches.append((channel, channel_rows[:self.max_digest]))
+                    channel_rows = channel_rows[self.max_digest:]
+
+            claimed = [(now + self.lease, row[0]) for _, batch in batches for row in batch]
+            conn.executemany("UPDATE slack_outbox SET next_attempt_at = ? WHERE id = ?", claimed)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        # Reports are decoded in _deliver, so a malformed one fails like any other delivery
+        return [(channel, [(row[0], row[2], row[3]) for row in batch]) for channel, batch in batches]
+
+    def _next_due(self, now):
+        """Seconds until the delivery thread should look again"""
+        row = self.conn.execute(
+            "SELECT MIN(next_attempt_at), MIN(created_at) FROM slack_outbox WHERE status = 'pending'"
+        ).fetchone()
+        if row[0] is None:
+            return self.poll_interval
+        due = row[0]
+        if self.digest_seconds > 0:
+            # The oldest held report's digest window
+            due = max(due, row[1] + self.digest_seconds)
+        return min(self.poll_interval, max(0.05, due - now))
+
+    def backoff(self, attempts, retry_after=None):
+        """Delay before the next attempt after attempts failures, with jitter"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        delay *= random.uniform(0.5, 1.0)
+        return max(delay, retry_after or 0)
+
+    def _send(self, channel, batch):
+        reports = [json.loads(report) for _, report, _ in batch]
+        if len(reports) == 1:
+            blocks = self.reporter._format_report_blocks(reports[0])
+            return self.reporter.deliver(blocks, channel)
+        blocks = self.reporter._format_digest_blocks(reports)
+        return self.reporter.deliver(blocks, channel, text=f"Learning Buddy Digest: {len(reports)} sessions")
+
+    def _deliver(self, channel, batch):
+        try:
+            result = self._send(channel, batch)
+        except Exception as e:
+            # e.g. a malformed report; retried with backoff until it is marked failed, never left leased
+            result = {"ok": False, "retryable": True, "error": f"{type(e).__name__}: {e}"}
+
+        now = time.time()
+        attempts = max(row_attempts for _, _, row_attempts in batch) + 1
+        ids = [(report_id,) for report_id, _, _ in batch]
+        result["next_attempt_at"] = None
+        if result.get("ok"):
+            self.conn.executemany(
+                "UPDATE slack_outbox SET status = 'sent', attempts = ?, sent_at = ?, last_error = NULL WHERE id = ?",
+                [(attempts, now, report_id) for (report_id,) in ids]
+            )
+            self.sent += len(batch)
+        elif result.get("retryable") and attempts < self.max_attempts:
+            next_attempt = now + self.backoff(attempts, result.get("retry_after"))
+            result["next_attempt_at"] = next_attempt
+            self.conn.executemany(
+                "UPDATE slack_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                [(attempts, next_attempt, result.get("error"), report_id) for (report_id,) in ids]
+            )
+            self.retries += 1
+        else:
+            self.conn.executemany(
+                "UPDATE slack_outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                [(attempts, result.get("error"), report_id) for (report_id,) in ids]
+            )
+            self.failures += len(batch)
+            print(f"Giving up on {len(batch)} Slack report(s) for {channel}: {result.get('error')}")
+        self.conn.commit()
+        return result
+
+    def drain(self):
+        """Deliver every report that is due; returns seconds until the next one is"""
+        now = time.time()
+        batches = self._claim(now)
+        for position, (channel, batch) in enumerate(batches):
+            result = self._deliver(channel, batch)
+            if result.get("error") == "ratelimited" and result["next_attempt_at"]:
+                # Hold the rest of this round until the rate limit has passed instead of hammering Slack
+                self.conn.executemany(
+                    "UPDATE slack_outbox SET next_attempt_at = ? WHERE id = ?",
+                    [(result["next_attempt_at"], report_id)
+                     for _, rest in batches[position + 1:] for report_id, _, _ in rest]
+                )
+                self.conn.commit()
+                break
+        self.conn.execute(
+            "DELETE FROM slack_outbox WHERE status = 'sent' AND sent_at < ?", (now - self.retention,)
+        )
+        self.conn.commit()
+        return self._next_due(time.time())
+
+    def stats(self):
+        counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM slack_outbox GROUP BY status").fetchall())
+        return {
+            "pending": counts.get("pending", 0),
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0),
+            "delivered": self.sent,
+            "retries": self.retries,
+            "gave_up": self.failures,
+            "digest_seconds": self.digest_seconds
+        }
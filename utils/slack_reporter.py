@@ -1,17 +1,49 @@
 import requests
 import json
 import os
+import threading
 from datetime import datetime
 import time
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from utils import metrics
 
 load_dotenv()
 
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api")
+SLACK_TIMEOUT = float(os.getenv("SLACK_TIMEOUT", "10"))
+SLACK_POOL_SIZE = int(os.getenv("SLACK_POOL_SIZE", "4"))
+
+# Slack API errors that are worth retrying later
+RETRYABLE_ERRORS = {"ratelimited", "internal_error", "service_unavailable", "request_timeout", "fatal_error"}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def pooled_session():
+    """Process-wide requests session, so reports reuse kept-alive connections to Slack"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=SLACK_POOL_SIZE, pool_maxsize=SLACK_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
 class SlackReporter:
-    def __init__(self):
+    def __init__(self, session=None, timeout=SLACK_TIMEOUT):
         self.webhook_url = os.getenv("SLACK_WEBHOOK_URL")
         self.bot_token = os.getenv("SLACK_BOT_TOKEN")
         self.default_channel = os.getenv("SLACK_DEFAULT_CHANNEL", "learning-buddy-reports")
+        self.api_url = SLACK_API_URL
+        self.session = session or pooled_session()
+        self.timeout = timeout
+    
+    def is_configured(self):
+        return bool(self.webhook_url or self.bot_token)
     
     def send_report(self, session_data, channel=None):
         """
@@ -22,22 +54,56 @@ class SlackReporter:
             channel (str): Optional channel override
         
         Returns:
-            dict: Response from Slack API
+            dict: Response from Slack API (see deliver())
+        """
+        return self.deliver(self._format_report_blocks(session_data), channel)
+    
+    @metrics.span("slack_post")
+    def deliver(self, blocks, channel=None, text="Learning Buddy Session Report"):
+        """
+        Post blocks to Slack.
+        
+        Returns a dict with "ok"; failures also have "error", "retryable"
+        (rate limits, server errors, timeouts) and, when Slack sent one,
+        "retry_after" in seconds
         """
-        if not self.webhook_url and not self.bot_token:
-            return {"error": "Slack credentials not configured. Please add SLACK_WEBHOOK_URL or SLACK_BOT_TOKEN to .env file"}
+        if not self.is_configured():
+            return {"ok": False, "retryable": False,
+                    "error": "Slack credentials not configured. Please add SLACK_WEBHOOK_URL or SLACK_BOT_TOKEN to .env file"}
+        
+        try:
+            # If we have a bot token, use the chat.postMessage API (more features)
+            if self.bot_token:
+                response = self._send_with_bot(blocks, channel or self.default_channel, text)
+            else:
+                # Otherwise fall back to webhook
+                response = self._send_with_webhook(blocks, text)
+        except requests.RequestException as e:
+            return {"ok": False, "error": f"Slack request failed: {e}", "retryable": True}
         
-        # Format the report blocks for Slack
-        blocks = self._format_report_blocks(session_data)
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            return {"ok": False, "error": "ratelimited", "retryable": True,
+                    "retry_after": float(retry_after) if retry_after else None}
+        if response.status_code >= 500:
+            return {"ok": False, "error": f"Slack returned HTTP {response.status_code}", "retryable": True}
         
-        # If we have a bot token, use the chat.postMessage API (more features)
         if self.bot_token:
-            return self._send_with_bot(blocks, channel or self.default_channel)
+            try:
+                result = response.json()
+            except ValueError:
+                result = {"ok": False, "error": f"HTTP {response.status_code}: {response.text[:200]}"}
+            if not result.get("ok"):
+                result.setdefault("error", "unknown_error")
+                result["retryable"] = result["error"] in RETRYABLE_ERRORS
+            return result
         
-        # Otherwise fall back to webhook
-        return self._send_with_webhook(blocks)
+        if response.status_code == 200:
+            return {"ok": True, "status": response.status_code, "text": response.text}
+        return {"ok": False, "status": response.status_code, "retryable": False,
+                "error": f"HTTP {response.status_code}: {response.text[:200]}"}
     
-    def _send_with_bot(self, blocks, channel):
+    def _send_with_bot(self, blocks, channel, text):
         """Send message using Slack Bot API"""
         headers = {
             "Authorization": f"Bearer {self.bot_token}",
@@ -46,32 +112,30 @@ class SlackReporter:
         
         payload = {
             "channel": channel,
-            "text": "Learning Buddy Session Report",
+            "text": text,
             "blocks": blocks
         }
         
-        response = requests.post(
-            "https://slack.com/api/chat.postMessage",
+        return self.session.post(
+            f"{self.api_url}/chat.postMessage",
             headers=headers,
-            data=json.dumps(payload)
+            data=json.dumps(payload),
+            timeout=self.timeout
         )
-        
-        return response.json()
     
-    def _send_with_webhook(self, blocks):
+    def _send_with_webhook(self, blocks, text):
         """Send message using Slack Webhook"""
         payload = {
-            "text": "Learning Buddy Session Report",
+            "text": text,
             "blocks": blocks
         }
         
-        response = requests.post(
+        return self.session.post(
             self.webhook_url,
             data=json.dumps(payload),
-            headers={'Content-Type': 'application/json'}
+            headers={'Content-Type': 'application/json'},
+            timeout=self.timeout
         )
-        
-        return {"status": response.status_code, "text": response.text}
     
     def _format_report_blocks(self, session_data):
         """Format session data into Slack blocks"""
@@ -172,4 +236,37 @@ class SlackReporter:
                 ]
             })
         
-        return blocks
\ No newline at end of file
+        return blocks
+    
+    def _format_digest_blocks(self, reports):
+        """One message summarising several session reports, one line each"""
+        blocks = [
+            {
+                "type": "header",
+                "text": {
+                    "type": "plain_text",
+                    "text": f"📚 Learning Buddy Digest: {len(reports)} sessions",
+                    "emoji": True
+                }
+            }
+        ]
+        for session_data in reports:
+            timestamp = datetime.fromtimestamp(session_data.get("end_time", time.time()))
+            correct_answers = session_data.get("correct_answers", 0)
+            total_questions = session_data.get("total_questions", 0)
+            accuracy = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+            topics = ", ".join(
+                f"{topic.get('name', 'Unknown')} {topic.get('score', 0)}%" for topic in session_data.get("topics", [])
+            ) or "no topic data"
+            blocks.append({
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": (
+                        f"*{session_data.get('user_name', 'Anonymous')}* · {timestamp.strftime('%b %d, %I:%M %p')} · "
+                        f"{correct_answers}/{total_questions} ({accuracy:.1f}%) in "
+                        f"{session_data.get('duration_minutes', 0)} min\n{topics}"
+                    )
+                }
+            })
+        return blocks
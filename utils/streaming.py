@@ -0,0 +1,62 @@
+import json
+import queue
+import threading
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+
+_DONE = object()
+
+
+class TokenCallbackHandler(BaseCallbackHandler):
+    """Forwards every streamed LLM token to on_token"""
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+
+    def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self.on_token(token)
+
+
+class AsyncTokenCallbackHandler(AsyncCallbackHandler):
+    """Async counterpart of TokenCallbackHandler, runs on the event loop"""
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+
+    async def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self.on_token(token)
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_from_thread(target):
+    """
+    Run target(emit) on a worker thread and yield the (event, data) pairs it emits.
+
+    LangChain callbacks fire on the thread doing the LLM call, so the work
+    runs in the background and the response generator just drains a queue.
+    An exception in target is yielded as an "error" event.
+    """
+    events = queue.Queue()
+
+    def emit(event, data):
+        events.put((event, data))
+
+    def run():
+        try:
+            target(emit)
+        except Exception as e:
+            events.put(("error", {"error": str(e)}))
+        finally:
+            events.put(_DONE)
+
+    threading.Thread(target=run, name="chat-stream", daemon=True).start()
+    while True:
+        item = events.get()
+        if item is _DONE:
+            return
+        yield item
@@ -0,0 +1,140 @@
+import math
+import os
+import pickle
+import random
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat")  # flat, ivf, ivfpq, hnsw, pq or sq8
+IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))  # 0: about 4 * sqrt(training chunks)
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+PQ_M = int(os.getenv("RAG_PQ_M", "0"))  # bytes per vector; 0: dimension / 8
+INDEX_TRAIN_SIZE = int(os.getenv("RAG_INDEX_TRAIN_SIZE", "50000"))
+INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "true").lower() in ("1", "true", "yes")
+
+INDEX_TYPES = ("flat", "ivf", "ivfpq", "hnsw", "pq", "sq8")
+
+
+def needs_training(index_type):
+    return index_type in ("ivf", "ivfpq", "pq", "sq8")
+
+
+def _pq_m(dim):
+    # Sub-quantizers must divide the dimension
+    m = PQ_M or max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def index_spec(index_type, dim, num_training):
+    """faiss.index_factory description for index_type, sized for num_training vectors"""
+    nlist = IVF_NLIST or int(4 * math.sqrt(max(num_training, 1)))
+    # k-means wants at least ~39 training points per list
+    nlist = max(1, min(nlist, num_training // 39))
+    # 8-bit codes need 256 training points per sub-quantizer; small corpora get fewer bits
+    pq = f"PQ{_pq_m(dim)}x{max(1, min(8, int(math.log2(max(num_training, 2)))))}"
+    specs = {
+        "flat": "Flat",
+        "ivf": f"IVF{nlist},Flat",
+        "ivfpq": f"IVF{nlist},{pq}",
+        "hnsw": f"HNSW{HNSW_M}",
+        "pq": pq,
+        "sq8": "SQ8",
+    }
+    if index_type not in specs:
+        raise ValueError(f"Unknown RAG_INDEX_TYPE '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+    return specs[index_type]
+
+
+def tune_index(index):
+    """
+    Apply the search-time settings (IVF probes, HNSW beam width) to a built
+    or loaded index. IVF indexes also get a direct map so stored vectors can
+    be reconstructed, which max_marginal_relevance_search needs.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = IVF_NPROBE
+        ivf.make_direct_map()
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def train_index(index_type, vectors):
+    """New empty index of index_type, trained on a random sample of vectors"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    sample = vectors
+    if len(vectors) > INDEX_TRAIN_SIZE:
+        sample = vectors[sorted(random.Random(0).sample(range(len(vectors)), INDEX_TRAIN_SIZE))]
+    index = faiss.index_factory(vectors.shape[1], index_spec(index_type, vectors.shape[1], len(sample)))
+    if not index.is_trained:
+        index.train(sample)
+    return tune_index(index)
+
+
+def build_index_vectorstore(documents, embeddings, ids=None, index_type=INDEX_TYPE):
+    """
+    FAISS vector store over documents backed by an index_type index.
+    Indexes that need training are trained on (a sample of) these documents'
+    vectors, so pass enough of them: IVF needs ~39 per list.
+    """
+    texts = [doc.page_content for doc in documents]
+    vectors = embeddings.embed_documents(texts)
+    index = train_index(index_type, vectors)
+    vectordb = FAISS(embeddings, index, InMemoryDocstore(), {})
+    vectordb.add_embeddings(
+        list(zip(texts, vectors)), metadatas=[doc.metadata for doc in documents], ids=ids
+    )
+    return vectordb
+
+
+def delete_chunks(vectordb, ids):
+    """
+    Remove chunks by id. HNSW cannot remove vectors and IVF keeps the removed
+    positions as gaps (FAISS.delete expects the rest to shift down), so both
+    are rebuilt from the vectors they keep.
+    """
+    ivf = faiss.try_extract_index_ivf(vectordb.index)
+    if ivf is None:
+        try:
+            vectordb.delete(ids)
+            return
+        except RuntimeError:
+            if not hasattr(vectordb.index, "hnsw"):
+                raise
+
+    stale = set(ids)
+    keep = [(position, doc_id) for position, doc_id in sorted(vectordb.index_to_docstore_id.items())
+            if doc_id not in stale]
+    vectors = vectordb.index.reconstruct_n(0, vectordb.index.ntotal)[[position for position, _ in keep]]
+    if ivf is not None:
+        # Keeps the trained quantizer
+        index = vectordb.index
+        index.reset()
+    else:
+        index = tune_index(faiss.index_factory(vectordb.index.d, index_spec("hnsw", vectordb.index.d, len(keep))))
+    index.add(vectors)
+    stored = set(vectordb.index_to_docstore_id.values())
+    vectordb.docstore.delete([doc_id for doc_id in stale if doc_id in stored])
+    vectordb.index = index
+    vectordb.index_to_docstore_id = {i: doc_id for i, (_, doc_id) in enumerate(keep)}
+
+
+def load_vectorstore(index_dir, embeddings, mmap=INDEX_MMAP):
+    """
+    Load a vector store written by FAISS.save_local. With mmap the index
+    data is memory-mapped read-only instead of read into RAM, so it must not
+    be modified: load without mmap to update it.
+    """
+    flags = (faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY) if mmap else 0
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"), flags)
+    # Our own file, written by save_local next to the index
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, tune_index(index), docstore, index_to_docstore_id)